@@ -13,9 +13,13 @@ DEFAULTS = {
     'adhocracy.allow_registration': True,
     'adhocracy.allow_organization': False,
     'adhocracy.behind_proxy': False,
+    'adhocracy.cache.local_size': 0,
+    'adhocracy.cache.local_ttl': 60,
     'adhocracy.create_initial_instance_page': True,
     'adhocracy.customize_footer': False,
     'adhocracy.delay_update_queue_seconds': 1,
+    'adhocracy.delta_storage': False,
+    'adhocracy.delta_storage.snapshot_interval': 20,
     'adhocracy.demo_users': [],
     'adhocracy.enable_gender': False,
     'adhocracy.export_personal_email': False,
@@ -46,6 +50,7 @@ DEFAULTS = {
     # an arbitrary list of u'events'
     'adhocracy.instance_overview_sidebar_contents': [u'events'],
 
+    'adhocracy.instance_registry_ttl': 60,
     'adhocracy.instance_stylesheets': [],
     'adhocracy.instance_themes': [],
     'adhocracy.milestone.allow_show_all_proposals': False,
@@ -63,6 +68,9 @@ DEFAULTS = {
     'adhocracy.redirect_startpage_to_instance': u'',
     'adhocracy.relative_urls': False,
     'adhocracy.require_email': True,
+    'adhocracy.requestlog.buffer_size': 10000,
+    'adhocracy.requestlog.file': None,
+    'adhocracy.requestlog.flush_interval': 5,
     'adhocracy.session.implementation': 'beaker',
     'adhocracy.set_display_name_on_register': False,
     'adhocracy.shibboleth.display_name.force_update': False,
@@ -78,12 +86,20 @@ DEFAULTS = {
     'adhocracy.show_instance_overview_proposals_all': False,
     'adhocracy.show_instance_overview_stats': True,
     'adhocracy.show_social_buttons': True,
+    'adhocracy.smtp.batch_size': 100,
+    'adhocracy.smtp.pool_size': 4,
+    'adhocracy.smtp.retries': 3,
+    'adhocracy.smtp.retry_delay': 1,
+    'adhocracy.solr.batch_seconds': 5,
+    'adhocracy.solr.batch_size': 100,
+    'adhocracy.solr.commit_within': 1000,
     'adhocracy.show_stats_on_frontpage': True,
     'adhocracy.startpage.instances.list_length': 0,
     'adhocracy.startpage.proposals.list_length': 0,
     'adhocracy.static_agree_text': None,
     'adhocracy.store_notification_events': True,
     'adhocracy.tagcloud_facet': False,
+    'adhocracy.tally.incremental': False,
     'adhocracy.themed': False,
     'adhocracy.use_avatars': True,
     'adhocracy.use_feedback_instance': False,
@@ -18,6 +18,7 @@ from adhocracy.config.routing import make_map
 from adhocracy.model import init_model
 from adhocracy.lib.search import init_search
 from adhocracy.lib.democracy import init_democracy
+from adhocracy.lib.text.render import init_render
 from adhocracy.lib.util import create_site_subdirectory
 from adhocracy.lib import init_site
 from adhocracy.lib.queue import RQConfig
@@ -79,6 +80,7 @@ def load_environment(global_conf, app_conf, with_db=True):
     init_site(config)
     if with_db:
         init_search()
+        init_render()
     init_democracy()
     RQConfig.setup_from_config(config)
 
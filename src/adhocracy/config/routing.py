@@ -487,6 +487,10 @@ def make_map(config):
     map.connect('/stats/', controller='stats')
 
     map.connect('/admin', controller='admin', action="index")
+    map.connect('/admin/cache_stats', controller='admin',
+                action="cache_stats")
+    map.connect('/admin/mail_stats', controller='admin',
+                action="mail_stats")
     map.connect('/admin/users/import{.format}', controller='admin',
                 action="user_import", conditions=dict(method=['POST']))
     map.connect('/admin/users/import{.format}', controller='admin',
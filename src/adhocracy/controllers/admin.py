@@ -12,7 +12,9 @@ from adhocracy.lib.auth.csrf import RequireInternalRequest
 from adhocracy.lib.auth.welcome import can_welcome
 from adhocracy.lib.base import BaseController
 from adhocracy.lib.helpers import base_url, flash
-from adhocracy.lib.templating import render, ret_abort
+from adhocracy.lib.cache.util import stats as cache_stats
+from adhocracy.lib.mail import stats as mail_stats
+from adhocracy.lib.templating import render, render_json, ret_abort
 from adhocracy.lib.search import index
 from adhocracy.lib.user_import import user_import, get_user_import_state
 import adhocracy.lib.importexport
@@ -84,9 +86,25 @@ class AdminController(BaseController):
             if hasattr(entity_type, "all"):
                 for entity in entity_type.all():
                     index.update(entity)
+        index.flush()
         flash(_('Solr index updated.'), 'success')
         redirect(base_url('/admin'))
 
+    @guard.perm("global.admin")
+    def cache_stats(self):
+        """
+        Hit and miss counters of the memoize caches in the process
+        serving the request.
+        """
+        return render_json(cache_stats())
+
+    @guard.perm("global.admin")
+    def mail_stats(self):
+        """
+        Delivery counters and throughput of the mail delivery jobs.
+        """
+        return render_json(mail_stats())
+
     @guard.perm("global.admin")
     def fix_autojoin(self):
         config_autojoin = config.get('adhocracy.instances.autojoin')
@@ -278,7 +278,7 @@ class CommentController(BaseController):
                                "is not part of this comment's history"),
                              code=400, format=format)
 
-        model.meta.Session.delete(revision)
+        revision.purge()
         model.meta.Session.commit()
         return ret_success(message=_("The comment revision has been deleted."),
                            entity=c.comment, format=format)
@@ -20,11 +20,13 @@ class EventController(BaseController):
 
     @guard.perm('event.index_all')
     def all(self, format='html'):
-        events = model.Event.all_q(
+        count = min(int(request.params.get('count', 50)), 100)
+        query = model.Event.all_q(
             include_hidden=False,
-            event_filter=request.params.getall('event_filter'))\
-            .order_by(model.Event.time.desc())\
-            .limit(min(int(request.params.get('count', 50)), 100)).all()
+            event_filter=request.params.getall('event_filter'))
+        events = model.Event.feed(
+            query, limit=count,
+            before=model.Event.parse_cursor(request.params.get('before')))
 
         if format == 'rss':
             return event.rss_feed(events,
@@ -43,10 +45,18 @@ class EventController(BaseController):
             more_url = h.base_url(instance=None,
                                   member='event/all',
                                   query_params=query_params)
+            model.Event.prefetch(events)
             return render_def('/event/tiles.html', 'carousel',
                               events=events, more_url=more_url)
         else:
             c.event_pager = pager.events(events, count=50)
+            c.events_more_url = None
+            if len(events) == count:
+                query_params = request.params.copy()
+                query_params['before'] = events[-1].cursor
+                c.events_more_url = h.base_url(instance=None,
+                                               member='event/all',
+                                               query_params=query_params)
 
             if format == 'overlay':
                 return render('/event/all.html', overlay=True,
@@ -331,11 +331,13 @@ class InstanceController(BaseController):
         if format == 'sline':
             ret_abort(u'Sparkline data is not available anymore.', code=410)
 
-        events = model.Event.all_q(
+        count = min(int(request.params.get('count', 50)), 100)
+        query = model.Event.all_q(
             instance=c.page_instance,
-            event_filter=request.params.getall('event_filter'))\
-            .order_by(model.Event.time.desc())\
-            .limit(min(int(request.params.get('count', 50)), 100)).all()
+            event_filter=request.params.getall('event_filter'))
+        events = model.Event.feed(
+            query, limit=count,
+            before=model.Event.parse_cursor(request.params.get('before')))
 
         if format == 'rss':
             return event.rss_feed(events,
@@ -353,11 +355,19 @@ class InstanceController(BaseController):
             more_url = h.entity_url(c.page_instance,
                                     member='activity',
                                     query=query_params)
+            model.Event.prefetch(events)
             return render_def('/event/tiles.html', 'carousel',
                               events=events, more_url=more_url)
 
         c.tile = tiles.instance.InstanceTile(c.page_instance)
         c.events_pager = pager.events(events)
+        c.events_more_url = None
+        if len(events) == count:
+            query_params = request.params.copy()
+            query_params['before'] = events[-1].cursor
+            c.events_more_url = h.entity_url(c.page_instance,
+                                             member='activity',
+                                             query=query_params)
 
         if format == 'overlay':
             return render("/instance/activity.html", overlay=True,
@@ -79,9 +79,11 @@ class PollController(BaseController):
         model.meta.Session.commit()
 
         if not asbool(config.get('adhocracy.hide_individual_votes', 'false')):
-            for vote in votes:
-                event.emit(event.T_VOTE_CAST, vote.user, instance=c.instance,
-                           topics=[c.poll.scope], vote=vote, poll=c.poll)
+            with event.batch():
+                for vote in votes:
+                    event.emit(event.T_VOTE_CAST, vote.user,
+                               instance=c.instance, topics=[c.poll.scope],
+                               vote=vote, poll=c.poll)
 
         if format == 'json':
             vdetail = votedetail.calc_votedetail_dict(c.instance, c.poll)\
@@ -123,9 +125,11 @@ class PollController(BaseController):
         model.meta.Session.commit()
 
         if not asbool(config.get('adhocracy.hide_individual_votes', 'false')):
-            for vote in votes:
-                event.emit(event_type, vote.user, instance=c.instance,
-                           topics=[c.poll.scope], vote=vote, poll=c.poll)
+            with event.batch():
+                for vote in votes:
+                    event.emit(event_type, vote.user, instance=c.instance,
+                               topics=[c.poll.scope], vote=vote,
+                               poll=c.poll)
 
         if format == 'json':
             vdetail = votedetail.calc_votedetail_dict(c.instance, c.poll)\
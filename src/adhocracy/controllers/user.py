@@ -113,6 +113,8 @@ class UserSettingsNotificationsForm(formencode.Schema):
                                     if_missing=3)
     email_messages = validators.StringBool(not_empty=False, if_empty=False,
                                            if_missing=False)
+    email_digest = validators.OneOf(
+        [u''] + model.User.DIGEST_FREQUENCIES, if_missing=u'')
 
 
 class UserSettingsAdvancedForm(formencode.Schema):
@@ -469,6 +471,18 @@ class UserController(BaseController):
         self._settings_all(id)
         c.settings_menu = settings_menu(c.page_user, 'notifications')
 
+        # digests are sent from the stored notifications
+        if config.get_bool('adhocracy.store_notification_events'):
+            c.digest_frequencies = [
+                {'value': u'', 'label': _(u'Immediately')},
+                {'value': model.User.DIGEST_HOURLY,
+                 'label': _(u'Hourly summary')},
+                {'value': model.User.DIGEST_DAILY,
+                 'label': _(u'Daily summary')},
+            ]
+        else:
+            c.digest_frequencies = None
+
         return render("/user/settings_notifications.html",
                       overlay=format == u'overlay')
 
@@ -481,6 +495,7 @@ class UserController(BaseController):
                 'email': c.page_user.email,
                 'email_priority': c.page_user.email_priority,
                 'email_messages': c.page_user.email_messages,
+                'email_digest': c.page_user.email_digest or u'',
                 '_tok': token_id()})
 
     @validate(schema=UserSettingsNotificationsForm(),
@@ -496,6 +511,10 @@ class UserController(BaseController):
                                     ['email',
                                      'email_priority',
                                      'email_messages'])
+        email_digest = self.form_result.get('email_digest') or None
+        if email_digest != c.page_user.email_digest:
+            c.page_user.email_digest = email_digest
+            updated = True
         model.meta.Session.commit()
 
         email = self.form_result.get("email")
@@ -873,23 +892,13 @@ class UserController(BaseController):
                                   include_hidden=False,
                                   event_filter=event_filter)
         query = query.filter(model.Event.user == c.page_user)
-        query = query.order_by(model.Event.time.desc())
-        if nr_events is not None:
-            query = query.limit(nr_events)
-        return query.all()
+        return model.Event.feed(query, limit=nr_events)
 
     def _get_notifications(self, nr_notifications=None, event_filter=[]):
         """get notifications for this user"""
-        q = model.meta.Session.query(model.Notification)
-        q = q.filter(model.Notification.user == c.user)
-        q = q.join(model.Event).order_by(model.Event.time.desc())
-        if event_filter:
-            q = q.filter(model.Notification.event_type.in_(event_filter))
-        if c.instance:
-            q = q.filter(model.Event.instance == c.instance)
-        if nr_notifications is not None:
-            q = q.limit(nr_notifications)
-        return q.all()
+        return model.Notification.timeline(c.user, instance=c.instance,
+                                           event_filter=event_filter,
+                                           limit=nr_notifications)
 
     def _show_common(self, id, user, events):
         """
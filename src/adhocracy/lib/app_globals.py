@@ -3,6 +3,8 @@ import logging
 
 import memcache
 
+from adhocracy import config as aconfig
+from adhocracy.lib.cache.util import LocalCache
 
 log = logging.getLogger(__name__)
 
@@ -29,6 +31,16 @@ class Globals(object):
             log.warn("Skipped memcache, no results caching will take place.")
             self.cache = None
 
+        local_size = aconfig.get_int('adhocracy.cache.local_size',
+                                     config=config)
+        if self.cache is not None and local_size > 0:
+            self.local_cache = LocalCache(
+                size=local_size,
+                ttl=aconfig.get_int('adhocracy.cache.local_ttl',
+                                    config=config))
+        else:
+            self.local_cache = None
+
         if 'adhocracy.instance' in config:
             self.single_instance = config.get('adhocracy.instance')
         else:
@@ -123,8 +123,7 @@ class RecursiveAuthWrapper(object):
 
     def check(self, *a, **kw):
 
-        auth_check = authorization.AuthCheck(method=self.obj.__name__)
-        self.obj(auth_check, *a, **kw)
+        auth_check = authorization.evaluate(self.obj, a, kw)
 
         if self.raise_type == RETURN_AUTH_CHECK:
             return auth_check
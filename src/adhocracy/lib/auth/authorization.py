@@ -57,6 +57,30 @@ class InstanceGroupSourceAdapter(SqlGroupsAdapter):
             raise SourceError("No such user: %s" % item_name)
 
 
+def permissions(environ):
+    """
+    The names of the permissions of the current user, computed once per
+    request: For logged in users from the ``repoze.what`` credentials
+    (which include the permissions of the anonymous group), otherwise
+    from the anonymous group.
+    """
+    user_id = c.user.id if c.user else None
+    cached = environ.get('adhocracy.permissions')
+    if cached is None or cached[0] != user_id:
+        if c.user:
+            credentials = environ.get('repoze.what.credentials') or {}
+            names = credentials.get('permissions') or ()
+        else:
+            if environ.get('anonymous_permissions') is None:
+                anon_group = model.Group.by_code(model.Group.CODE_ANONYMOUS)
+                environ['anonymous_permissions'] = [
+                    p.permission_name for p in anon_group.permissions]
+            names = environ['anonymous_permissions']
+        cached = (user_id, frozenset(names))
+        environ['adhocracy.permissions'] = cached
+    return cached[1]
+
+
 class has_permission(what_has_permission):
     """
     This modified version of ``repoze.what``'s ``has_permission`` will
@@ -66,15 +90,8 @@ class has_permission(what_has_permission):
     """
 
     def evaluate(self, environ, credentials):
-        if c.user:
-            super(has_permission, self).evaluate(environ, credentials)
-        else:
-            if environ.get('anonymous_permissions') is None:
-                anon_group = model.Group.by_code(model.Group.CODE_ANONYMOUS)
-                environ['anonymous_permissions'] = [p.permission_name for p in
-                                                    anon_group.permissions]
-            if not self.permission_name in environ['anonymous_permissions']:
-                self.unmet()
+        if self.permission_name not in permissions(environ):
+            self.unmet()
 
 
 class has_default_permission(what_has_permission):
@@ -97,10 +114,60 @@ class has_default_permission(what_has_permission):
 
 
 def has(permission):
-    #return permission in request.environ.get('repoze.what.credentials',
-    #{}).get('permissions', [])
-    p = has_permission(permission)
-    return p.is_met(request.environ)
+    return permission in permissions(request.environ)
+
+
+def _argument_key(value):
+    if value is None or isinstance(value, (basestring, int, long, bool)):
+        return value
+    id_ = getattr(value, 'id', None)
+    if id_ is None:
+        raise TypeError("Can't memoize auth checks on %r" % value)
+    return (type(value).__name__, id_)
+
+
+def _check_key(method, args, kwargs):
+    """
+    The key of an auth check for the memoized checks of the request, or
+    `None` if it can't be memoized: The arguments have to be entities
+    or simple values, and the session must not have pending changes
+    which could affect the result. Checks done before changes were
+    flushed are not reused either.
+    """
+    session = model.meta.Session
+    if session.new or session.dirty or session.deleted:
+        return None
+    try:
+        return (method.__module__, method.__name__,
+                tuple(_argument_key(a) for a in args),
+                tuple(sorted((k, _argument_key(v))
+                             for k, v in kwargs.items())),
+                _argument_key(c.user), _argument_key(c.instance),
+                session.info.get('flushes', 0))
+    except TypeError:
+        return None
+
+
+def evaluate(method, args, kwargs):
+    """
+    Run the authorisation check *method* with the given arguments and
+    return the :class:`AuthCheck`. Within a request the results are
+    memoized, so that e.g. the rows of a list reuse the checks of the
+    entities they have in common.
+    """
+    try:
+        checks = request.environ.setdefault('adhocracy.auth_checks', {})
+    except TypeError:
+        # not within a request
+        checks = None
+    key = _check_key(method, args, kwargs) if checks is not None else None
+    if key is not None and key in checks:
+        return checks[key]
+    auth_check = AuthCheck(method=method.__name__)
+    method(auth_check, *args, **kwargs)
+    if key is not None:
+        checks[key] = auth_check
+    return auth_check
 
 
 class AuthCheck(object):
@@ -3,10 +3,11 @@ import logging
 import adhocracy.model as model
 
 from util import memoize
-from invalidate import (invalidate_user, invalidate_vote, invalidate_page,
-                        invalidate_delegateable, invalidate_delegation,
-                        invalidate_revision, invalidate_comment,
-                        invalidate_poll, invalidate_tagging, invalidate_text,
+from invalidate import (Invalidation, invalidate_user, invalidate_vote,
+                        invalidate_page, invalidate_delegateable,
+                        invalidate_delegation, invalidate_revision,
+                        invalidate_comment, invalidate_poll,
+                        invalidate_tagging, invalidate_text,
                         invalidate_selection, invalidate_badge,
                         invalidate_userbadges, invalidate_delegateablebadges,
                         invalidate_instance)
@@ -33,10 +34,27 @@ HANDLERS = {
 
 
 def invalidate(entity):
+    invalidate_many([entity])
+
+
+def invalidate_many(entities):
+    '''
+    Invalidate the cached results for all *entities* and the objects
+    that depend on them with a single request to memcached.
+    '''
+    from adhocracy.lib.instance.discriminator import forget_instance
+    for entity in entities:
+        if isinstance(entity, model.Instance):
+            forget_instance(entity.id)
+
     try:
         from pylons import app_globals as g
         if g.cache is not None:
-            func = HANDLERS.get(entity.__class__, lambda x: x)
-            func(entity)
+            inv = Invalidation()
+            for entity in entities:
+                func = HANDLERS.get(entity.__class__)
+                if func is not None:
+                    func(entity, inv)
+            inv.clear()
     except TypeError:
         pass
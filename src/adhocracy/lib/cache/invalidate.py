@@ -1,95 +1,136 @@
 import logging
 from adhocracy import model
-from adhocracy.lib.cache.util import clear_tag
+from adhocracy.lib.cache.util import clear_tags, make_tag
 
 log = logging.getLogger(__name__)
 
 
-def invalidate_badge(badge):
+class Invalidation(object):
+    '''
+    Collect the tags that have to be cleared to invalidate a number of
+    entities and clear them at once. Every entity is only visited
+    once per handler, so invalidating overlapping objects (e.g. many
+    votes on the same poll) doesn't repeat work.
+    '''
+
+    def __init__(self):
+        self.tags = {}
+        self.visited = set()
+
+    def visit(self, handler, entity):
+        '''
+        Return `True` if *entity* wasn't visited by *handler* before.
+        '''
+        key = (handler, entity)
+        if key in self.visited:
+            return False
+        self.visited.add(key)
+        return True
+
+    def clear_tag(self, tag):
+        self.tags.setdefault(make_tag(tag), tag)
+
+    def clear(self):
+        if self.tags:
+            clear_tags(self.tags.values())
+        self.tags = {}
+
+
+def invalidate_badge(badge, inv):
     log.debug('invalidate_badge %s' % badge)
-    clear_tag(badge)
+    inv.clear_tag(badge)
 
 
-def invalidate_userbadges(userbadges):
-    clear_tag(userbadges)
-    invalidate_user(userbadges.user)
+def invalidate_userbadges(userbadges, inv):
+    inv.clear_tag(userbadges)
+    invalidate_user(userbadges.user, inv)
 
 
-def invalidate_delegateablebadges(delegateablebadges):
-    clear_tag(delegateablebadges)
-    invalidate_delegateable(delegateablebadges.delegateable)
+def invalidate_delegateablebadges(delegateablebadges, inv):
+    inv.clear_tag(delegateablebadges)
+    invalidate_delegateable(delegateablebadges.delegateable, inv)
 
 
-def invalidate_user(user):
-    clear_tag(user)
+def invalidate_user(user, inv):
+    inv.clear_tag(user)
 
 
-def invalidate_text(text):
-    clear_tag(text)
-    invalidate_page(text.page)
+def invalidate_text(text, inv):
+    inv.clear_tag(text)
+    invalidate_page(text.page, inv)
 
 
-def invalidate_page(page):
-    invalidate_delegateable(page)
+def invalidate_page(page, inv):
+    invalidate_delegateable(page, inv)
 
 
-def invalidate_delegateable(d):
-    clear_tag(d)
-    for p in d.parents:
-        invalidate_delegateable(p)
-    if not len(d.parents):
-        clear_tag(d.instance)
+def invalidate_delegateable(d, inv):
+    # walk the parent chain iteratively, each delegateable is visited
+    # only once
+    stack = [d]
+    while stack:
+        d = stack.pop()
+        if not inv.visit('delegateable', d):
+            continue
+        inv.clear_tag(d)
+        stack.extend(d.parents)
+        if not len(d.parents):
+            inv.clear_tag(d.instance)
 
 
-def invalidate_revision(rev):
-    invalidate_comment(rev.comment)
+def invalidate_revision(rev, inv):
+    invalidate_comment(rev.comment, inv)
 
 
-def invalidate_comment(comment):
-    clear_tag(comment)
-    if comment.reply:
-        invalidate_comment(comment.reply)
-    invalidate_delegateable(comment.topic)
+def invalidate_comment(comment, inv):
+    while comment is not None and inv.visit('comment', comment):
+        inv.clear_tag(comment)
+        invalidate_delegateable(comment.topic, inv)
+        comment = comment.reply
 
 
-def invalidate_delegation(delegation):
-    invalidate_user(delegation.principal)
-    invalidate_user(delegation.agent)
+def invalidate_delegation(delegation, inv):
+    invalidate_user(delegation.principal, inv)
+    invalidate_user(delegation.agent, inv)
 
 
-def invalidate_vote(vote):
-    clear_tag(vote)
-    invalidate_user(vote.user)
-    invalidate_poll(vote.poll)
+def invalidate_vote(vote, inv):
+    inv.clear_tag(vote)
+    invalidate_user(vote.user, inv)
+    invalidate_poll(vote.poll, inv)
 
 
-def invalidate_selection(selection):
+def invalidate_selection(selection, inv):
     if selection is None:
         return
-    clear_tag(selection)
+    inv.clear_tag(selection)
     if selection.page:
-        invalidate_delegateable(selection.page)
+        invalidate_delegateable(selection.page, inv)
     if selection.proposal:
-        invalidate_delegateable(selection.proposal)
+        invalidate_delegateable(selection.proposal, inv)
 
 
-def invalidate_poll(poll):
-    clear_tag(poll)
+def invalidate_poll(poll, inv):
+    if not inv.visit('poll', poll):
+        return
+    inv.clear_tag(poll)
     if poll.action == poll.SELECT:
-        invalidate_selection(poll.selection)
+        invalidate_selection(poll.selection, inv)
     elif isinstance(poll.subject, model.Delegateable):
-        invalidate_delegateable(poll.subject)
+        invalidate_delegateable(poll.subject, inv)
     elif isinstance(poll.subject, model.Comment):
-        invalidate_comment(poll.subject)
+        invalidate_comment(poll.subject, inv)
 
 
-def invalidate_instance(instance):
-    # muharhar cache epic fail
-    clear_tag(instance)
+def invalidate_instance(instance, inv):
+    # All delegateables of the instance are cleared, so their parents
+    # don't have to be walked.
+    inv.clear_tag(instance)
     for d in instance.delegateables:
-        invalidate_delegateable(d)
+        if inv.visit('delegateable', d):
+            inv.clear_tag(d)
 
 
-def invalidate_tagging(tagging):
-    clear_tag(tagging)
-    invalidate_delegateable(tagging.delegateable)
+def invalidate_tagging(tagging, inv):
+    inv.clear_tag(tagging)
+    invalidate_delegateable(tagging.delegateable, inv)
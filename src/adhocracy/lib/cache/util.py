@@ -1,5 +1,8 @@
+from collections import OrderedDict
 import logging
 from hashlib import sha1
+import threading
+import time
 
 from pylons import app_globals
 
@@ -12,24 +15,113 @@ class NoneResult(object):
     pass
 
 
+class LocalCache(object):
+    """
+    A per-process LRU cache for memoized results in front of memcached.
+
+    Entries are stored under the versioned key (see
+    :func:`versioned_key`), whose tag versions are read from memcached
+    with a single request on every call. So clearing a tag in any
+    process makes the local entries unreachable right away, just like
+    the ones in memcached, and only the request for the result itself
+    is saved.
+
+    *size*
+       The maximum number of entries.
+    *ttl*
+       The number of seconds an entry is kept.
+    """
+
+    def __init__(self, size=1000, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.data[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = (time.time() + self.ttl, value)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def stats(self):
+        return dict(size=len(self.data), hits=self.hits, misses=self.misses)
+
+
+_stats = dict(hits=0, misses=0)
+
+
+def stats():
+    """
+    Return the hit and miss counters of memoize in this process.
+    """
+    result = dict(memcached=dict(_stats))
+    try:
+        local_cache = app_globals.local_cache
+    except (TypeError, AttributeError):
+        local_cache = None
+    if local_cache is not None:
+        result['local'] = local_cache.stats()
+    return result
+
+
 def _hash(data):
     return sha1(data).hexdigest()
 
 
-def add_tags(key, tags):
-    ctags = app_globals.cache.get_multi(tags)
-    for tag in tags:
-        if not ctags.get(tag):
-            ctags[tag] = key
-        else:
-            ctags[tag] = ctags[tag] + SEP + key
-    app_globals.cache.set_multi(ctags)
+def version_key(tag):
+    return "v." + tag
+
+
+def _new_version():
+    # A version that was not used before, so that entries stored under
+    # the version of an evicted or reset tag can't be hit again. Clearing
+    # a tag increments its version by one, which is always slower than
+    # a microsecond.
+    return int(time.time() * 1000000)
+
+
+def tag_versions(cache, tags):
+    """
+    Return the current version of each tag. Tags that don't have a
+    version yet get one.
+    """
+    keys = [version_key(tag) for tag in tags]
+    versions = cache.get_multi(keys)
+    for key in keys:
+        if versions.get(key) is None:
+            version = _new_version()
+            if not cache.add(key, version):
+                # another process was faster
+                version = cache.get(key) or version
+            versions[key] = version
+    return [versions[key] for key in keys]
 
 
-def tag_fn(key, args, kwargs):
-    tags = [make_tag(a) for a in args]
-    tags += [make_tag(v) for v in kwargs.values()]
-    add_tags(key, tags)
+def make_tags(args, kwargs):
+    return [make_tag(a) for a in args] + [make_tag(v) for v in kwargs.values()]
+
+
+def versioned_key(cache, key, tags):
+    """
+    Derive the cache key from *key* and the versions of all *tags*, so
+    entries become unreachable when one of the tags is cleared.
+    """
+    versions = tag_versions(cache, tags)
+    return _hash(key + SEP + SEP.join(str(v) for v in versions))
 
 
 def make_tag(obj):
@@ -52,15 +144,36 @@ def make_key(iden, args, kwargs):
 
 
 def clear_tag(tag):
+    """
+    Invalidate all results memoized with *tag* as an argument by
+    incrementing the version of the tag.
+    """
+    try:
+        app_globals.cache.incr(version_key(make_tag(tag)))
+    except TypeError:
+        pass  # when app_globals isn't there yet
+
+
+def clear_tags(tags):
+    """
+    Like :func:`clear_tag` for many tags, but with a single request to
+    memcached.
+    """
     try:
-        entities = app_globals.cache.get(make_tag(tag))
-        if entities:
-            app_globals.cache.delete_multi(entities.split(SEP))
+        app_globals.cache.set_multi(
+            dict((version_key(make_tag(tag)), _new_version())
+                 for tag in tags))
     except TypeError:
         pass  # when app_globals isn't there yet
 
 
-def memoize(iden, time=0, make_key=make_key):
+def memoize(iden, time=0, make_key=make_key, tags=True):
+    '''
+    Cache the results of the decorated function in memcached. The
+    cached results are invalidated through the tags of the arguments,
+    unless ``tags`` is false: Then the results are only keyed by
+    ``make_key``, which has to identify immutable arguments.
+    '''
     try:
         from pylons import tmpl_context as c
         iden = c.instance.key + '.' + iden if c.instance else iden
@@ -73,6 +186,7 @@ def memoize(iden, time=0, make_key=make_key):
         def new_fn(*a, **kw):
             try:
                 cache = app_globals.cache
+                local_cache = getattr(app_globals, 'local_cache', None)
             except TypeError:
                 # Probably in tests
                 cache = None
@@ -80,15 +194,25 @@ def memoize(iden, time=0, make_key=make_key):
                 res = fn(*a, **kw)
             else:
                 key = make_key(iden, a, kw)
-                res = cache.get(key)
+                if tags:
+                    key = versioned_key(cache, key, make_tags(a, kw))
+                res = None
+                if local_cache is not None:
+                    res = local_cache.get(key)
                 if res is None:
-                    res = fn(*a, **kw)
-                    #print "Cache miss", key + iden
+                    res = cache.get(key)
                     if res is None:
-                        res = NoneResult
-                    #print "Cache set:", key + iden
-                    cache.set(key, res, time=time)
-                    tag_fn(key, a, kw)
+                        _stats['misses'] += 1
+                        res = fn(*a, **kw)
+                        #print "Cache miss", key + iden
+                        if res is None:
+                            res = NoneResult
+                        #print "Cache set:", key + iden
+                        cache.set(key, res, time=time)
+                    else:
+                        _stats['hits'] += 1
+                    if local_cache is not None:
+                        local_cache.set(key, res)
                 #else:
                 # print "Cache hit", key + iden
                 if res is NoneResult:
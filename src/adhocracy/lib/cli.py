@@ -201,6 +201,18 @@ class Index(AdhocracyCommand):
     max_args = 999
     min_args = None
 
+    parser = Command.standard_parser(verbose=True)
+    parser.add_option('-c', '--config', dest='config',
+                      default='etc/adhocracy.ini', help='Config file to use.')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                      help='Number of processes to index with.')
+    parser.add_option('--partition-size', dest='partition_size',
+                      type='int', default=1000,
+                      help='Number of entities indexed per partition.')
+    parser.add_option('--checkpoint', dest='checkpoint', default=None,
+                      help='File to record indexed partitions in. Run '
+                      'again with the same file to resume.')
+
     DROP = 'DROP'
     INDEX = 'INDEX'
 
@@ -296,7 +308,14 @@ class Index(AdhocracyCommand):
 
         if self.INDEX in actions:
             classes = classes if classes else self.indexed_classes.values()
-            search.rebuild(classes, instances=instances)
+            try:
+                search.rebuild(classes, instances=instances,
+                               jobs=self.options.jobs,
+                               partition_size=self.options.partition_size,
+                               checkpoint=self.options.checkpoint)
+            except ValueError as e:
+                print e
+                return
             print 'done.'
             return
 
@@ -314,7 +333,7 @@ class Index(AdhocracyCommand):
         content_types = '\n          '.join(indexed_classes)
         usage += (
             'index (INDEX|DROP|DROP_ALL|ALL) [<entity>, ...] [-I <instance>, '
-            '...] -c <inifile>'
+            '...] -c <inifile> [-j <jobs>] [--checkpoint <file>]'
             '\n\n'
             '  DROP_ALL:\n'
             '      Remove all documents from solr.\n'
@@ -1,7 +1,11 @@
 import logging
 
+from adhocracy import config
 from adhocracy.lib.democracy.decision import Decision
+from adhocracy.lib.democracy.delegation_graph import DelegationGraph
 from adhocracy.lib.democracy.delegation_node import DelegationNode
+from adhocracy.lib.democracy.tally import make_from_poll, SimpleTally
+from adhocracy.lib.democracy.vote_table import VoteTable
 
 from adhocracy.model import meta
 from adhocracy.model import Delegation, Poll, Proposal, Tally, Vote
@@ -27,10 +31,36 @@ def init_democracy():
 def handle_vote(vote):
     #log.debug("Post-processing vote: %s" % vote)
     if Tally.find_by_vote(vote) is None:
-        tally = Tally.create_from_vote(vote)
+        if config.get_bool('adhocracy.tally.incremental'):
+            tally = Tally.create_incremental_from_vote(vote)
+        else:
+            tally = Tally.create_from_vote(vote)
         log.debug("Tallied %s: %s" % (vote.poll, tally))
 
 
+def verify_tallies():
+    """
+    Recount all open polls and create a new tally for those whose latest
+    tally has drifted from the actual decisions. This is only needed if
+    tallies are maintained incrementally.
+    """
+    if not config.get_bool('adhocracy.tally.incremental'):
+        return
+    q = meta.Session.query(Poll)
+    q = q.filter(Poll.end_time == None)  # noqa
+    for poll in q:
+        if not poll.tallies:
+            continue
+        latest = poll.tallies[0]
+        recount = make_from_poll(SimpleTally, poll)
+        if recount.to_dict() != dict((k, getattr(latest, k))
+                                     for k in recount.to_dict()):
+            log.warn("Tally of %s has drifted: %s, recounted %s" %
+                     (poll, latest, recount.to_dict()))
+            Tally.create_from_poll(poll)
+            meta.Session.commit()
+
+
 def check_adoptions():
     log.debug("Checking proposals for successful adoption...")
     for proposal in Proposal.all():
@@ -61,12 +91,9 @@ def voters(poll, at_time=None, orientation=None):
     if orientation is None:
         return query.all()
     else:
-        voters = []
-        for user in query:
-            d = Decision(user, poll, at_time=at_time)
-            if d.result == orientation:
-                voters.append(user)
-        return voters
+        results = VoteTable.load(poll, at_time=at_time).results()
+        return [user for user in query
+                if results.get(user.id) == orientation]
 
 
 def supporters(poll, at_time=None):
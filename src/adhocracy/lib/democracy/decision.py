@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import logging
 import math
 
@@ -6,7 +7,7 @@ from sqlalchemy.orm import eagerload
 from adhocracy import model
 from adhocracy.lib.cache import memoize
 from adhocracy.lib.democracy.delegation_node import DelegationNode
-from adhocracy.model import Delegateable, Vote, Poll, User
+from adhocracy.model import Delegateable, Vote, Poll, ScopeTree, User
 
 
 log = logging.getLogger(__name__)
@@ -22,15 +23,21 @@ class Decision(object):
     A decision describes the current or past opinion that a user has
     expressed on a given poll. This includes opinions that were determined
     by an agent as a result of delegation.
+
+    :param votes: The user's votes on the poll, newest first. They are
+        loaded if not given.
+    :param scopes: An optional ``ScopeTree`` used to compare the scopes
+        of delegations in memory.
     """
 
-    def __init__(self, user, poll, at_time=None, votes=None):
+    def __init__(self, user, poll, at_time=None, votes=None, scopes=None):
         self.user = user
         self.poll = poll
         self.at_time = at_time
         self.node = DelegationNode(user, poll.scope)
+        self.scopes = scopes
         self.votes = votes
-        if not votes:
+        if votes is None:
             self.reload()
 
     def reload(self):
@@ -64,7 +71,12 @@ class Decision(object):
             create_time = relevant.get(vote.delegation, vote).create_time
             if create_time <= vote.create_time:
                 relevant[vote.delegation] = vote
-        use_keys = self.node.filter_less_specific_delegations(relevant.keys())
+        if self.scopes is not None:
+            use_keys = self.scopes.filter_less_specific_delegations(
+                relevant.keys())
+        else:
+            use_keys = self.node.filter_less_specific_delegations(
+                relevant.keys())
         return [v for k, v in relevant.items() if k in use_keys]
 
     relevant_votes = property(_relevant_votes)
@@ -169,7 +181,8 @@ class Decision(object):
         else:
             votes = [v for v in self.votes if v != vote]
             return Decision(self.user, self.poll,
-                            at_time=self.at_time, votes=votes)
+                            at_time=self.at_time, votes=votes,
+                            scopes=self.scopes)
 
     def to_dict(self):
         d = dict(user=self.user.user_name,
@@ -199,21 +212,70 @@ class Decision(object):
             if not instance or poll.scope.instance == instance:
                 yield cls(user, poll, at_time=at_time)
 
+    @classmethod
+    def prefetch(cls, user, polls):
+        """
+        Load the votes of the user on all *polls* with a single query and
+        keep the decisions with the polls for :meth:`cached`.
+        """
+        votes = dict((poll.id, []) for poll in polls
+                     if user.id not in poll._decisions)
+        if not votes:
+            return
+        query = model.meta.Session.query(Vote)
+        query = query.filter(Vote.user_id == user.id)
+        query = query.filter(Vote.poll_id.in_(votes.keys()))
+        query = query.options(eagerload(Vote.delegation))
+        query = query.order_by(Vote.id.desc())
+        for vote in query:
+            votes[vote.poll_id].append(vote)
+        for poll in polls:
+            if poll.id in votes:
+                poll._decisions[user.id] = cls(user, poll,
+                                               votes=votes[poll.id])
+
+    @classmethod
+    def cached(cls, user, poll):
+        """
+        The current decision of the user on the poll, prefetched with
+        :meth:`prefetch` if possible.
+        """
+        decision = poll._decisions.get(user.id)
+        if decision is None:
+            decision = cls(user, poll)
+        return decision
+
     @classmethod
     def for_poll(cls, poll, at_time=None, user_filter=None):
         """
         Get all decisions that have been made on a poll.
 
+        All votes on the poll are loaded with a single query and grouped
+        by user, and the scopes of delegations are compared in memory,
+        so the number of queries doesn't depend on the number of voters.
+
         :param poll: The poll on which to get decisions.
+        :param user_filter: A callable that restricts a ``User`` query
+            to the users whose decisions should be returned.
         """
-        query = model.meta.Session.query(User)
-        if user_filter:
-            query = user_filter(query)
-        query = query.distinct().join(Vote)
+        query = model.meta.Session.query(Vote)
         query = query.filter(Vote.poll_id == poll.id)
+        if user_filter:
+            users = user_filter(model.meta.Session.query(User.id))
+            query = query.filter(Vote.user_id.in_(users.subquery()))
         if at_time:
             query = query.filter(Vote.create_time <= at_time)
-        return [Decision(u, poll, at_time=at_time) for u in query]
+        query = query.options(eagerload(Vote.user),
+                              eagerload(Vote.delegation))
+        query = query.order_by(Vote.id.desc())
+
+        by_user = OrderedDict()
+        for vote in query:
+            by_user.setdefault(vote.user, []).append(vote)
+        scopes = ScopeTree.for_instance(poll.scope.instance)
+        return [Decision(user, poll, at_time=at_time, votes=votes,
+                         scopes=scopes)
+                for user, votes in by_user.items()]
 
     @classmethod
     def average_decisions(cls, instance):
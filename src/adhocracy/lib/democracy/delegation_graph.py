@@ -0,0 +1,207 @@
+from collections import defaultdict
+from datetime import datetime
+import logging
+
+from sqlalchemy import or_
+from sqlalchemy.orm import eagerload
+
+from adhocracy import model
+from adhocracy.model import Delegateable, Delegation, ScopeTree, Vote
+
+log = logging.getLogger(__name__)
+
+
+class DelegationGraph(object):
+    """
+    An in-memory snapshot of the delegation graph of an ``Instance``.
+
+    All delegations that are live at ``at_time`` are loaded with a single
+    query and kept in adjacency maps keyed by ``(agent_id, scope_id)``
+    and ``(principal_id, scope_id)``. The category tree is loaded in
+    the same way, so traversing parent scopes and checking scope
+    specificity does not hit the database either.
+
+    The graph answers the same questions as
+    :class:`adhocracy.lib.democracy.delegation_node.DelegationNode`
+    (``inbound``, ``outbound``, ``transitive_inbound`` and
+    ``number_of_delegations``) with the same override semantics, but
+    without issuing a query per scope and per user.
+
+    :param delegations: The live ``Delegation`` objects.
+    :param scopes: The ``ScopeTree`` of the instance.
+    :param at_time: The point in time the graph represents.
+    """
+
+    def __init__(self, delegations, scopes, at_time=None):
+        if at_time is None:
+            at_time = datetime.utcnow()
+        self.at_time = at_time
+        self.scopes = scopes
+        self.delegations = delegations
+        self._by_agent = defaultdict(list)
+        self._by_principal = defaultdict(list)
+        for delegation in delegations:
+            self._by_agent[(delegation.agent_id,
+                            delegation.scope_id)].append(delegation)
+            self._by_principal[(delegation.principal_id,
+                                delegation.scope_id)].append(delegation)
+        self._self_deciders = {}
+
+    @classmethod
+    def load(cls, instance=None, scope=None, at_time=None):
+        """
+        Load the delegation graph from the database.
+
+        :param instance: Only load delegations within this ``Instance``.
+        :param scope: Only load delegations that apply to this
+            ``Delegateable``, i.e. those on the scope itself and on
+            all of its parents. Implies the scope's instance.
+        :param at_time: return the delegation graph at the given time,
+            defaults to the current time.
+        """
+        if at_time is None:
+            at_time = datetime.utcnow()
+        if scope is not None:
+            instance = scope.instance
+
+        scopes = ScopeTree.for_instance(instance)
+        q = model.meta.Session.query(Delegation)
+        q = q.filter(Delegation.create_time <= at_time)
+        q = q.filter(or_(Delegation.revoke_time == None,  # noqa
+                         Delegation.revoke_time > at_time))
+        if scope is not None:
+            q = q.filter(Delegation.scope_id.in_(scopes.chain(scope.id)))
+        elif instance is not None:
+            q = q.join(Delegateable)
+            q = q.filter(Delegateable.instance_id == instance.id)
+        q = q.options(eagerload(Delegation.agent),
+                      eagerload(Delegation.principal))
+        return cls(q.all(), scopes, at_time=at_time)
+
+    def _traverse(self, adjacency, user_id, scope_id, recurse):
+        delegations = []
+        for chain_id in self.scopes.chain(scope_id, recurse):
+            delegations.extend(adjacency.get((user_id, chain_id), []))
+        return delegations
+
+    def inbound(self, user, delegateable, recurse=True,
+                is_counting_delegations=False):
+        """
+        Retrieve all inbound delegations of ``user`` that apply to the
+        ``delegateable``. See :meth:`DelegationNode.inbound`.
+        """
+        delegations = self._traverse(self._by_agent, user.id,
+                                     delegateable.id, recurse)
+        delegations = self._filter_out_overriden_delegations(delegations)
+        if is_counting_delegations:
+            delegations = self._filter_out_delegations_where_a_more_specific_delegation_exists(  # noqa
+                user, delegateable, delegations)
+        delegations = self._filter_out_delegations_that_are_overriden_by_direct_votes(delegations)  # noqa
+        return delegations
+
+    def transitive_inbound(self, user, delegateable, recurse=True,
+                           is_counting_delegations=False, _path=None):
+        """
+        Retrieve inbound delegations recursing through the delegation graph
+        as well as through the category tree. See
+        :meth:`DelegationNode.transitive_inbound`.
+        """
+        if _path is None:
+            _path = []
+        elif user.id in _path:
+            return []
+        _path.append(user.id)
+
+        delegations = self.inbound(
+            user, delegateable, recurse=recurse,
+            is_counting_delegations=is_counting_delegations)
+        for delegation in list(delegations):
+            additional_delegations = self.transitive_inbound(
+                delegation.principal, delegateable, recurse=recurse,
+                is_counting_delegations=is_counting_delegations,
+                _path=_path)
+            for additional_delegation in additional_delegations:
+                if additional_delegation.principal_id not in _path:
+                    delegations.append(additional_delegation)
+        _path.remove(user.id)
+        return delegations
+
+    def outbound(self, user, delegateable, recurse=True, filter=True):
+        """
+        Retrieve all outbound delegations of ``user`` that apply to the
+        ``delegateable``. See :meth:`DelegationNode.outbound`.
+        """
+        delegations = self._traverse(self._by_principal, user.id,
+                                     delegateable.id, recurse)
+        if filter:
+            by_agent = dict()
+            for delegation in set(delegations):
+                by_agent[delegation.agent_id] = (
+                    by_agent.get(delegation.agent_id, []) + [delegation])
+            delegations = [
+                self.scopes.filter_less_specific_delegations(ds)[0]
+                for ds in by_agent.values()]
+        return delegations
+
+    def number_of_delegations(self, user, delegateable):
+        return len(self.transitive_inbound(user, delegateable,
+                                           is_counting_delegations=True))
+
+    def _filter_out_overriden_delegations(self, delegations):
+        by_principal = dict()
+        for delegation in set(delegations):
+            by_principal[delegation.principal_id] = by_principal.get(
+                delegation.principal_id, []) + [delegation]
+        return [self.scopes.filter_less_specific_delegations(ds)[0] for
+                ds in by_principal.values()]
+
+    def _self_deciders_for(self, poll):
+        """
+        The ids of all users who have cast a direct vote on the poll. A
+        single direct vote is enough for a ``Decision`` to be self-decided.
+        """
+        if poll.id not in self._self_deciders:
+            q = model.meta.Session.query(Vote.user_id).distinct()
+            q = q.filter(Vote.poll_id == poll.id)
+            q = q.filter(Vote.delegation_id == None)  # noqa
+            self._self_deciders[poll.id] = set(r[0] for r in q)
+        return self._self_deciders[poll.id]
+
+    def _filter_out_delegations_that_are_overriden_by_direct_votes(
+            self, delegations):
+
+        def is_overriden_by_own_decision(delegation):
+            poll = getattr(delegation.scope, 'poll', None)
+            if poll is None:
+                return True  # scope doesn't have a poll -> can't self decide
+            return delegation.principal_id not in self._self_deciders_for(
+                poll)
+
+        return filter(is_overriden_by_own_decision, delegations)
+
+    def _filter_out_delegations_where_a_more_specific_delegation_exists(
+            self, user, delegateable, delegations):
+        def is_overriden_by_other_delegation(delegation):
+            outbound_delegations = self.outbound(delegation.principal,
+                                                 delegateable)
+            if 1 == len(outbound_delegations):
+                # If this returns false, the data model is invalid!
+                return outbound_delegations[0].agent_id == user.id
+            elif len(outbound_delegations) > 1:
+                smallest_delegations = [outbound_delegations[0]]
+                for delegation in outbound_delegations:
+                    scope_id = smallest_delegations[0].scope_id
+                    if self.scopes.is_super(scope_id, delegation.scope_id):
+                        smallest_delegations = [delegation]
+                    elif scope_id == delegation.scope_id:
+                        smallest_delegations.append(delegation)
+                for delegation in smallest_delegations:
+                    if delegation.agent_id == user.id:
+                        return True
+            return False
+
+        return filter(is_overriden_by_other_delegation, delegations)
+
+    def __repr__(self):
+        return "<DelegationGraph(%s,%s)>" % (len(self.delegations),
+                                             self.at_time)
@@ -4,6 +4,7 @@ import logging
 from sqlalchemy import or_
 
 from adhocracy import model
+from adhocracy.lib.democracy.delegation_graph import DelegationGraph
 from adhocracy.model import Delegation
 
 log = logging.getLogger(__name__)
@@ -48,16 +49,20 @@ class DelegationNode(object):
     Each DelegationNode represents the incomming and outgoing delegations
     of one user on one level (scope/delegateable) in this graph.
 
-    **TODO:** Developing a good caching strategy for this class would be
-    useful in order to cache the delegation graph to memcached.
+    If a :class:`DelegationGraph` is given, all traversals are answered
+    from the in-memory graph and the ``at_time`` arguments are ignored in
+    favour of the time the graph has been loaded for. Transitive
+    traversals always load such a graph instead of querying each node.
 
     :param user: The ``User`` at the center of this ``DelegationNode``.
     :param delegateable: A ``Delegateable``.
+    :param graph: An optional, preloaded ``DelegationGraph``.
     """
 
-    def __init__(self, user, delegateable):
+    def __init__(self, user, delegateable, graph=None):
         self.user = user
         self.delegateable = delegateable
+        self.graph = graph
 
     def _query_traverse(self, querymod, recurse, at_time=None):
         if not at_time:  # shouldn't this be if at_time is None: ?
@@ -88,6 +93,11 @@ class DelegationNode(object):
         :param at_time: return the delegation graph at the given time, defaults
             to the current time.
         """
+        if self.graph is not None:
+            return self.graph.inbound(
+                self.user, self.delegateable, recurse=recurse,
+                is_counting_delegations=is_counting_delegations)
+
         delegations = self._query_traverse(
             lambda q: q.filter(Delegation.agent == self.user),
             recurse, at_time)
@@ -110,31 +120,13 @@ class DelegationNode(object):
             to the current time.
         :returns: list of ``Delegation``
         """
-        if _path is None:
-            _path = []
-        elif self.user in _path:
-            return []  # we already visited this node
-        # circle detection uses this path of visited nodes
-        _path.append(self.user)
-
-        delegations = self.inbound(
-            recurse=recurse, at_time=at_time,
-            is_counting_delegations=is_counting_delegations)
-        for delegation in list(delegations):
-            ddnode = DelegationNode(delegation.principal, self.delegateable)
-            additional_delegations = ddnode.transitive_inbound(
-                recurse=recurse, at_time=at_time, _path=_path,
-                is_counting_delegations=is_counting_delegations)
-            for additional_delegation in additional_delegations:
-                if additional_delegation.principal in _path:
-                    continue  # this is a delegation from  a node we
-                              # already visited
-                else:
-                    delegations.append(additional_delegation)
-        # _path is used as a stack in the recursion - so we need to remove
-        # what we added in going into the recursion
-        _path.remove(self.user)
-        return delegations
+        graph = self.graph
+        if graph is None:
+            graph = DelegationGraph.load(scope=self.delegateable,
+                                         at_time=at_time)
+        return graph.transitive_inbound(
+            self.user, self.delegateable, recurse=recurse,
+            is_counting_delegations=is_counting_delegations, _path=_path)
 
     def outbound(self, recurse=True, at_time=None, filter=True):
         """
@@ -148,6 +140,10 @@ class DelegationNode(object):
             to the current time.
         :returns: list of ``Delegation``
         """
+        if self.graph is not None:
+            return self.graph.outbound(self.user, self.delegateable,
+                                       recurse=recurse, filter=filter)
+
         delegations = self._query_traverse(
             lambda q: q.filter(Delegation.principal == self.user),
             recurse, at_time)
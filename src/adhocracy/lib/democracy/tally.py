@@ -18,20 +18,70 @@ class SimpleTally(object):
 
 
 def make_from_poll(tally_cls, poll, at_time=None, user_filter=None):
-    from adhocracy.lib.democracy import Decision
+    from adhocracy.lib.democracy.vote_table import VoteTable
     from adhocracy.model import Vote
     if at_time is None:
         at_time = datetime.utcnow()
-    results = {}
-    decisions = Decision.for_poll(poll, at_time=at_time,
-                                  user_filter=user_filter)
-    for decision in decisions:
-        if not decision.is_decided():
-            continue
-        results[decision.result] = results.get(decision.result, 0) + 1
+    results = VoteTable.load(poll, at_time=at_time,
+                             user_filter=user_filter).counts()
     tally = tally_cls(poll,
                       results.get(Vote.YES, 0),
                       results.get(Vote.NO, 0),
                       results.get(Vote.ABSTAIN, 0))
     tally.create_time = at_time
     return tally
+
+
+def decision_change(vote):
+    """
+    The change that ``vote`` causes in the results of its poll. Only the
+    decision of the voter can change: votes that are propagated to
+    principals are votes of their own and are tallied separately.
+
+    :returns: A dict mapping orientations to +1 or -1.
+    """
+    from adhocracy.lib.democracy.vote_table import VoteTable
+    table = VoteTable.load(vote.poll, user_ids=[vote.user_id])
+    (before, after) = table.change(vote.user_id, vote.id)
+
+    change = {}
+    if before.result is not None:
+        change[before.result] = change.get(before.result, 0) - 1
+    if after.result is not None:
+        change[after.result] = change.get(after.result, 0) + 1
+    return change
+
+
+def make_from_vote(tally_cls, vote):
+    """
+    Create a tally from the latest tally of the vote's poll and the
+    change caused by the vote, instead of recounting all decisions.
+    """
+    from adhocracy.model import meta, Poll, Tally, Vote
+    # Serialize the tallies of concurrent votes on the poll, so each
+    # one builds on the tally of the other.
+    q = meta.Session.query(Poll.id).filter(Poll.id == vote.poll_id)
+    q.with_lockmode('update').one()
+    q = meta.Session.query(Tally)
+    q = q.filter(Tally.poll_id == vote.poll_id)
+    q = q.order_by(Tally.create_time.desc(), Tally.id.desc())
+    previous = q.first()
+    if previous is None:
+        return make_from_poll(tally_cls, vote.poll, at_time=vote.create_time)
+
+    results = {Vote.YES: previous.num_for,
+               Vote.NO: previous.num_against,
+               Vote.ABSTAIN: previous.num_abstain}
+    # A full recount already includes all votes cast until it was made.
+    if (previous.vote_id is not None or
+            previous.create_time < vote.create_time):
+        for orientation, change in decision_change(vote).items():
+            results[orientation] += change
+    tally = tally_cls(vote.poll,
+                      results[Vote.YES],
+                      results[Vote.NO],
+                      results[Vote.ABSTAIN])
+    # The tally includes the changes of all earlier processed votes,
+    # which may be younger than this one.
+    tally.create_time = datetime.utcnow()
+    return tally
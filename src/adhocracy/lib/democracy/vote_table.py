@@ -0,0 +1,149 @@
+from collections import namedtuple
+import logging
+
+from adhocracy import model
+from adhocracy.model import Delegation, ScopeTree, User, Vote
+
+log = logging.getLogger(__name__)
+
+
+Outcome = namedtuple('Outcome', ['result', 'delegation_ids', 'self_decided'])
+
+
+class VoteTable(object):
+    """
+    The votes of a poll in a columnar layout: one list per column (vote
+    id, user id, delegation id, delegation scope id, orientation and
+    create time), sorted by user and newest vote first. Only the columns
+    are loaded from the database, no ``Vote`` objects.
+
+    The decision of each user is resolved with the same rules as
+    :class:`adhocracy.lib.democracy.decision.Decision`:
+
+    * The newest direct vote of the user decides.
+    * Otherwise, of each delegation only the latest vote counts, and
+      votes via delegations whose scope is broader than the scope of
+      another voting delegation are ignored.
+    * The result is the orientation of the remaining votes if they are
+      unanimous.
+
+    :param rows: Tuples of ``(id, user_id, delegation_id, scope_id,
+        orientation, create_time)``.
+    :param scopes: The ``ScopeTree`` of the poll's instance.
+    """
+
+    def __init__(self, rows, scopes):
+        self.scopes = scopes
+        rows = sorted(rows, key=lambda r: (r[1], -r[0]))
+        if rows:
+            columns = zip(*rows)
+        else:
+            columns = [()] * 6
+        (self.ids, self.user_ids, self.delegation_ids, self.scope_ids,
+         self.orientations, self.create_times) = map(list, columns)
+        self._slices = {}
+        for i, user_id in enumerate(self.user_ids):
+            start, stop = self._slices.get(user_id, (i, i))
+            self._slices[user_id] = (start, i + 1)
+
+    @classmethod
+    def load(cls, poll, at_time=None, user_filter=None, user_ids=None):
+        """
+        Load the votes of a poll with a single query.
+
+        :param at_time: Only load votes cast until then.
+        :param user_filter: A callable that restricts a ``User`` query
+            to the users whose votes should be loaded.
+        :param user_ids: Only load the votes of these users.
+        """
+        q = model.meta.Session.query(Vote.id, Vote.user_id,
+                                     Vote.delegation_id, Delegation.scope_id,
+                                     Vote.orientation, Vote.create_time)
+        q = q.outerjoin(Delegation, Vote.delegation_id == Delegation.id)
+        q = q.filter(Vote.poll_id == poll.id)
+        if user_filter:
+            users = user_filter(model.meta.Session.query(User.id))
+            q = q.filter(Vote.user_id.in_(users.subquery()))
+        if user_ids is not None:
+            q = q.filter(Vote.user_id.in_(user_ids))
+        if at_time:
+            q = q.filter(Vote.create_time <= at_time)
+        return cls(q.all(), ScopeTree.for_instance(poll.scope.instance))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def voter_ids(self):
+        return self._slices.keys()
+
+    def relevant(self, user_id, exclude=None, until=None):
+        """
+        The row indexes of the votes that determine the decision of the
+        user, ignoring the vote with the id ``exclude`` and (if given)
+        all votes with ids greater than ``until``.
+        """
+        start, stop = self._slices.get(user_id, (0, 0))
+        latest = {}
+        for i in xrange(start, stop):
+            if self.ids[i] == exclude or (until is not None and
+                                          self.ids[i] > until):
+                continue
+            delegation_id = self.delegation_ids[i]
+            if delegation_id is None:
+                return [i]
+            j = latest.get(delegation_id, i)
+            if self.create_times[j] <= self.create_times[i]:
+                latest[delegation_id] = i
+
+        # drop votes via delegations that are less specific than others
+        broader = set()
+        for i in latest.values():
+            broader.update(self.scopes.ancestors(self.scope_ids[i]))
+        return [i for i in latest.values()
+                if self.scope_ids[i] not in broader]
+
+    def outcome(self, user_id, exclude=None, until=None):
+        """
+        The :class:`Outcome` of the decision of the user. See
+        :meth:`relevant` for the arguments.
+        """
+        relevant = self.relevant(user_id, exclude=exclude, until=until)
+        orientations = set(self.orientations[i] for i in relevant)
+        result = orientations.pop() if len(orientations) == 1 else None
+        delegation_ids = frozenset(self.delegation_ids[i] for i in relevant)
+        self_decided = (len(relevant) == 1 and
+                        self.delegation_ids[relevant[0]] is None)
+        return Outcome(result, delegation_ids, self_decided)
+
+    def result(self, user_id, exclude=None):
+        return self.outcome(user_id, exclude=exclude).result
+
+    def change(self, user_id, vote_id):
+        """
+        The outcomes of the decision of the user without and with the
+        vote ``vote_id``. Votes newer than it are ignored.
+        """
+        return (self.outcome(user_id, exclude=vote_id, until=vote_id),
+                self.outcome(user_id, until=vote_id))
+
+    def results(self):
+        """
+        A dict mapping the id of every voter to the result of the
+        decision, `None` if the user is undecided.
+        """
+        return dict((user_id, self.result(user_id))
+                    for user_id in self._slices)
+
+    def counts(self):
+        """
+        The number of decisions per orientation.
+        """
+        counts = {Vote.YES: 0, Vote.NO: 0, Vote.ABSTAIN: 0}
+        for result in self.results().values():
+            if result is not None:
+                counts[result] = counts.get(result, 0) + 1
+        return counts
+
+    def __repr__(self):
+        return "<VoteTable(%s votes, %s voters)>" % (len(self.ids),
+                                                     len(self._slices))
@@ -1,4 +1,7 @@
+from contextlib import contextmanager
+import json
 import logging
+import threading
 
 from adhocracy import model
 from adhocracy.lib.queue import async
@@ -31,17 +34,48 @@ from adhocracy.lib.event.types import (
 log = logging.getLogger(__name__)
 
 
+_batch = threading.local()
+
+
 def emit(event, user, instance=None, topics=[], **kwargs):
     event = model.Event(event, user, kwargs, instance=instance)
     event.topics = topics
     model.meta.Session.add(event)
-    model.meta.Session.commit()
-
-    handle_queue_message(str(event.id))
+    if getattr(_batch, 'ids', None) is not None:
+        model.meta.Session.flush()
+        _batch.ids.append(event.id)
+    else:
+        model.meta.Session.commit()
+        handle_queue_message(str(event.id))
     log.debug("Event: %s %s, data: %r" % (user.user_name, event, event.data))
     return event
 
 
+@contextmanager
+def batch():
+    '''
+    Collect the events emitted within the block, commit them once and
+    process their notifications together in one job::
+
+        with event.batch():
+            for vote in votes:
+                event.emit(event.T_VOTE_CAST, vote.user, ...)
+    '''
+    if getattr(_batch, 'ids', None) is not None:
+        # already batching
+        yield
+        return
+    _batch.ids = []
+    try:
+        yield
+        ids = _batch.ids
+    finally:
+        _batch.ids = None
+    if ids:
+        model.meta.Session.commit()
+        handle_queue_messages(json.dumps(ids))
+
+
 def process(event):
     notification.notify(event)
 
@@ -52,5 +86,13 @@ def handle_queue_message(message):
     process(event)
 
 
+@async
+def handle_queue_messages(message):
+    ids = json.loads(message)
+    q = model.Event.all_q(include_hidden=True)
+    q = q.filter(model.Event.id.in_(ids)).order_by(model.Event.id)
+    notification.notify_many(q.all())
+
+
 # The funny thing about this line is: YOU DO NOT SEE IT!
 TYPES = filter(lambda n: isinstance(n, NotificationType), map(eval, dir()))
@@ -3,12 +3,15 @@ from time import time
 from itertools import chain
 
 from adhocracy import config
+from adhocracy.lib import watchlist
 from sources import watchlist_source, vote_source, instance_source
+from sources import watched_entities
 from sources import delegation_source, tag_source, comment_source
 from filters import self_filter, duplicates_filter, comment_filter
 from filters import hidden_instance_filter
 from sinks import log_sink, mail_sink, twitter_sink
-from sinks import database_sink
+from sinks import database_sink, digest_sink
+from digest import send_digests
 
 log = logging.getLogger(__name__)
 
@@ -30,27 +33,54 @@ def notify(event, database_only=False):
     if not event:
         log.warn("Received null as event, shouldn't happen!")
         return
-    log.debug("Event notification processing: %s" % event)
+    notify_many([event], database_only=database_only)
+
+
+def notify_many(events, database_only=False):
+    '''
+    Process the notifications of many events together. The watches of
+    all events are loaded at once and the notifications of all events
+    pass the sinks in one pipeline.
+    '''
+    events = filter(None, events)
+    if not events:
+        return
+    log.debug("Event notification processing: %s" % events)
     begin_time = time()
-    sources = filter(lambda g: g, [watchlist_source(event),
-                                   vote_source(event),
-                                   instance_source(event),
-                                   tag_source(event),
-                                   delegation_source(event),
-                                   comment_source(event)])
-    pipeline = chain(*sources)
-    #pipeline = echo(pipeline)
-
-    pipeline = comment_filter(pipeline)
-    pipeline = self_filter(pipeline)
-    pipeline = duplicates_filter(pipeline)
-    pipeline = hidden_instance_filter(pipeline)
+
+    entities = []
+    for event in events:
+        entities.extend(watched_entities(event))
+    cache = watchlist.prefetch_watches(entities)
+
+    pipelines = []
+    for event in events:
+        sources = filter(lambda g: g, [watchlist_source(event, cache=cache),
+                                       vote_source(event),
+                                       instance_source(event),
+                                       tag_source(event, cache=cache),
+                                       delegation_source(event),
+                                       comment_source(event, cache=cache)])
+        pipeline = chain(*sources)
+        #pipeline = echo(pipeline)
+
+        pipeline = comment_filter(pipeline)
+        pipeline = self_filter(pipeline)
+        # duplicates are removed per event
+        pipeline = duplicates_filter(pipeline)
+        pipelines.append(pipeline)
+
+    pipeline = hidden_instance_filter(chain(*pipelines))
 
     pipeline = log_sink(pipeline)
-    if config.get_bool('adhocracy.store_notification_events'):
+    store = config.get_bool('adhocracy.store_notification_events')
+    if store:
         pipeline = database_sink(pipeline)
     if not database_only:
         pipeline = twitter_sink(pipeline)
+        if store:
+            # digests are sent from the stored notifications
+            pipeline = digest_sink(pipeline)
         pipeline = mail_sink(pipeline)
 
     for _ in pipeline:
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from itertools import groupby
+import json
+import logging
+
+from pylons.i18n import _
+from sqlalchemy.orm import eagerload_all
+
+from adhocracy import config
+from adhocracy import i18n
+from adhocracy.lib import mail
+from adhocracy.lib.queue import async
+from adhocracy.lib.templating import render
+from adhocracy.model import meta, Event, Notification
+
+log = logging.getLogger(__name__)
+
+
+def compose_digest(user, notifications):
+    '''
+    Compose one mail that lists all *notifications* of the user,
+    grouped by instance. Every notification is listed with its subject
+    and link, the full notification bodies are not rendered.
+    '''
+    i18n.user_language(user)
+    groups = OrderedDict()
+    for notification in notifications:
+        groups.setdefault(notification.event.instance,
+                          []).append(notification)
+    body = render('/notifications/digest.txt', {
+        'u': user,
+        'groups': groups.items(),
+    })
+    subject = _(u'%(count)s new notifications on %(site_name)s') % {
+        'count': len(notifications),
+        'site_name': config.get('adhocracy.site.name'),
+    }
+    return mail.compose(user.name, user.email, subject, body)
+
+
+def send_digests(frequency):
+    '''
+    Compose one digest for each user with notifications pending for the
+    given digest *frequency* and deliver them from background jobs,
+    ``adhocracy.smtp.batch_size`` digests per job. The notifications
+    stay pending until their digest has been sent. Returns the number
+    of digests.
+    '''
+    q = meta.Session.query(Notification)
+    q = q.filter(Notification.digest == frequency)
+    q = q.options(eagerload_all(Notification.event, Event.instance))
+    q = q.order_by(Notification.user_id, Notification.event_id)
+
+    digests = []
+    for user, notifications in groupby(q, key=lambda n: n.user):
+        notifications = list(notifications)
+        message = None
+        if user.is_email_activated():
+            message = compose_digest(user, notifications)
+        if message is None:
+            # nothing can be sent to the user
+            for notification in notifications:
+                notification.digest = None
+        else:
+            digests.append((message, [n.id for n in notifications]))
+    meta.Session.commit()
+
+    batch_size = max(config.get_int('adhocracy.smtp.batch_size'), 1)
+    for i in range(0, len(digests), batch_size):
+        deliver_digests.enqueue(json.dumps(digests[i:i + batch_size]))
+    log.debug("Sent %d %s digests" % (len(digests), frequency))
+    return len(digests)
+
+
+@async
+def deliver_digests(data):
+    '''
+    Send a batch of digests and mark the notifications of the digests
+    that were sent as delivered.
+    '''
+    digests = json.loads(data)
+    results = mail.send_batch([message for (message, ids) in digests])
+    sent_ids = [id_ for ((message, ids), sent) in zip(digests, results)
+                if sent for id_ in ids]
+    if sent_ids:
+        q = meta.Session.query(Notification)
+        q = q.filter(Notification.id.in_(sent_ids))
+        q.update({'digest': None}, synchronize_session=False)
+        meta.Session.commit()
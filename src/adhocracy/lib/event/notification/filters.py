@@ -22,11 +22,16 @@ def duplicates_filter(pipeline):
 
 
 def hidden_instance_filter(pipeline):
+    hidden = {}
     for notification in pipeline:
         # we cannot access notification.event directly as that would add
         # the notifications to the database, so we take a detour
-        event = Event.find(notification.event.id)
-        if event.instance is None or not event.instance.hidden:
+        event_id = notification.event.id
+        if event_id not in hidden:
+            event = Event.find(event_id)
+            hidden[event_id] = (event.instance is not None and
+                                event.instance.hidden)
+        if not hidden[event_id]:
             yield notification
 
 
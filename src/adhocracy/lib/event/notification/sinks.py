@@ -4,7 +4,7 @@ from pylons import config
 from webhelpers import text
 
 from adhocracy.lib import mail, microblog
-from adhocracy.model import meta, Notification
+from adhocracy.model import meta, Notification, User
 
 TWITTER_LENGTH = 140
 TRUNCATE_EXT = '...'
@@ -40,32 +40,84 @@ def twitter_sink(pipeline):
             yield notification
 
 
+def _wants_mail(notification):
+    return (notification.user.is_email_activated() and
+            notification.priority >= notification.user.email_priority)
+
+
+def digest_sink(pipeline):
+    '''
+    Mark the notifications of users who receive their notifications as
+    a digest instead of passing them on to the mail sink. The digests
+    are sent by :func:`adhocracy.lib.event.notification.send_digests`.
+    Only used if ``adhocracy.store_notification_events`` is enabled, so
+    the notifications are already stored by the database sink.
+    '''
+    pending = []
+    for notification in pipeline:
+        if (notification.user.email_digest in User.DIGEST_FREQUENCIES and
+                _wants_mail(notification)):
+            pending.append(notification)
+        else:
+            yield notification
+    if not pending:
+        return
+
+    # notifications may already be stored by the database sink
+    q = meta.Session.query(Notification)
+    q = q.filter(Notification.event_id.in_(
+        set(n.event.id for n in pending)))
+    q = q.filter(Notification.user_id.in_(set(n.user.id for n in pending)))
+    stored = dict(((n.event_id, n.user_id), n) for n in q)
+
+    for notification in pending:
+        key = (notification.event.id, notification.user.id)
+        notification = stored.setdefault(key, notification)
+        notification.digest = notification.user.email_digest
+        meta.Session.add(notification)
+
+
 def mail_sink(pipeline):
+    messages = []
     for notification in pipeline:
-        if notification.user.is_email_activated() and \
-                notification.priority >= notification.user.email_priority:
+        if _wants_mail(notification):
             notification.language_context()
             headers = {'X-Notification-Id': notification.get_id(),
                        'X-Notification-Priority': str(notification.priority)}
 
             log.debug("mail to %s: %s" % (notification.user.email,
                                           notification.subject))
-            mail.to_user(notification.user,
-                         notification.subject,
-                         notification.body,
-                         headers=headers)
+            messages.append(mail.compose(notification.user.name,
+                                         notification.user.email,
+                                         notification.subject,
+                                         notification.body,
+                                         headers=headers))
 
         else:
             yield notification
 
+    mail.deliver(messages)
+
 
 def database_sink(pipeline):
-    for notification in pipeline:
-        if meta.Session.query(Notification)\
-                .filter(Notification.event_id == notification.event.id)\
-                .filter(Notification.user_id == notification.user.id).all():
+    notifications = list(pipeline)
+    if not notifications:
+        return
+
+    # look up the notifications that are already stored with one query
+    event_ids = set(n.event.id for n in notifications)
+    user_ids = set(n.user.id for n in notifications)
+    q = meta.Session.query(Notification.event_id, Notification.user_id)
+    q = q.filter(Notification.event_id.in_(event_ids))
+    q = q.filter(Notification.user_id.in_(user_ids))
+    present = set(q)
+
+    for notification in notifications:
+        key = (notification.event.id, notification.user.id)
+        if key in present:
             log.warn('Notification already present: %s' % notification)
         else:
+            present.add(key)
             meta.Session.add(notification)
 
         yield notification
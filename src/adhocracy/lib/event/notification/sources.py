@@ -12,10 +12,23 @@ from adhocracy.lib.event.types import (
     T_RATING_CAST, T_SELECT_VARIANT, T_VOTE_CAST)
 
 
-def watchlist_source(event):
-    watches = watchlist.traverse_watchlist(event.user)
+def watched_entities(event):
+    """
+    The entities whose watches the sources look at for *event*, see
+    :func:`adhocracy.lib.watchlist.prefetch_watches`.
+    """
+    entities = [event.user] + list(event.topics)
+    for topic in event.topics:
+        entities.extend(tag for (tag, count) in topic.tags)
+    if 'comment' in event.data:
+        entities.append(event.comment)
+    return entities
+
+
+def watchlist_source(event, cache=None):
+    watches = watchlist.traverse_watchlist(event.user, cache=cache)
     for topic in event.topics:
-        watches += watchlist.traverse_watchlist(topic)
+        watches += watchlist.traverse_watchlist(topic, cache=cache)
     for watch in watches:
         yield Notification(event, watch.user, watch=watch)
 
@@ -26,15 +39,15 @@ def vote_source(event):
     delegated votes.
     """
     if event.event in [T_VOTE_CAST, T_SELECT_VARIANT, T_RATING_CAST]:
-        decision = democracy.Decision(event.user, event.poll)
-        before = decision.without_vote(event.vote)
-        if (map(lambda v: v.delegation, decision.relevant_votes) ==
-            map(lambda v: v.delegation, before.relevant_votes)) and \
-           (before.result == decision.result):
+        table = democracy.VoteTable.load(event.poll,
+                                         user_ids=[event.user.id])
+        decision = table.outcome(event.user.id)
+        before = table.outcome(event.user.id, exclude=event.vote.id)
+        if before == decision:
             return
-        if not decision.is_decided():
+        if decision.result is None:
             yield Notification(event, event.user, type=N_DELEGATE_CONFLICT)
-        elif decision.is_self_decided():
+        elif decision.self_decided:
             yield Notification(event, event.user, type=N_SELF_VOTED)
         else:
             yield Notification(event, event.user, type=N_DELEGATE_VOTED)
@@ -62,21 +75,22 @@ def instance_source(event):
                            type=N_INSTANCE_MEMBERSHIP_UPDATE)
 
 
-def tag_source(event):
+def tag_source(event, cache=None):
     watches = []
     for topic in event.topics:
         for (tag, count) in topic.tags:
-            watches = watchlist.traverse_watchlist(tag)
+            watches = watchlist.traverse_watchlist(tag, cache=cache)
     for watch in set(watches):
         yield Notification(event, watch.user, watch=watch)
 
 
-def comment_source(event):
+def comment_source(event, cache=None):
     if event.event == T_COMMENT_EDIT:
         for revision in event.comment.revisions:
             yield Notification(event,
                                revision.user,
                                type=N_COMMENT_EDIT)
     if 'comment' in event.data:
-        for watch in watchlist.traverse_watchlist(event.comment):
+        for watch in watchlist.traverse_watchlist(event.comment,
+                                                  cache=cache):
             yield Notification(event, watch.user, watch=watch)
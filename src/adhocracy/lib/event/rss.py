@@ -2,6 +2,7 @@ from pylons import response
 
 from webhelpers.feedgenerator import Rss201rev2Feed as Feed
 
+from adhocracy import model
 from adhocracy.lib import pager
 from adhocracy.lib.event import formatting
 
@@ -24,5 +25,6 @@ def rss_feed(events, name, link, description):
                      unique_id=item_link)
 
     response.content_type = 'application/rss+xml'
-    pager.NamedPager('rss', events, event_item, size=50).here()
+    pager.NamedPager('rss', events, event_item, size=50,
+                     prefetch=model.Event.prefetch).here()
     return rss.writeString('utf-8')
@@ -1,12 +1,76 @@
+import cPickle as pickle
 import logging
+import time
 
+from adhocracy import config as aconfig
 from adhocracy import model
 from paste.deploy.converters import asbool
+from pylons import config
+from sqlalchemy.orm import attributes, class_mapper
 from webob import Response
 
 log = logging.getLogger(__name__)
 
 
+# instance key -> (expiry time, detached instance)
+_registry = {}
+# instance id -> time it was last forgotten
+_forgotten = {}
+
+
+def _detached_copy(instance):
+    # A copy which doesn't expire with the session. Only the columns
+    # are kept, relations like the badges are loaded again when used.
+    copy = pickle.loads(pickle.dumps(instance, -1))
+    state = attributes.instance_state(copy)
+    for prop in class_mapper(model.Instance).relationships:
+        state.dict.pop(prop.key, None)
+    return copy
+
+
+def find_instance(key, config=config, registry=True):
+    '''
+    Return the instance with the *key* like :meth:`model.Instance.find`.
+    The instances are remembered by the process for
+    ``adhocracy.instance_registry_ttl`` seconds, so usually no query is
+    needed to find the instance of a request. Pass ``registry=False``
+    to load the instance from the database in any case.
+    '''
+    key = unicode(key).lower()
+    ttl = aconfig.get_int('adhocracy.instance_registry_ttl', config=config)
+    if ttl > 0 and registry:
+        entry = _registry.get(key)
+        if (entry is not None and entry[0] > time.time()
+                and not entry[1].is_deleted()):
+            return model.meta.Session.merge(entry[1], load=False)
+
+    loaded = time.time()
+    instance = model.Instance.find(key)
+    if (instance is not None and ttl > 0
+            and _forgotten.get(instance.id, 0) < loaded):
+        _registry[key] = (time.time() + ttl, _detached_copy(instance))
+    return instance
+
+
+def forget_instance(instance_id):
+    '''
+    Remove the instance with the *instance_id* from the registry of
+    :func:`find_instance`. Instances loaded before are not registered
+    again.
+    '''
+    _forgotten[instance_id] = time.time()
+    for key, (expires, registered) in _registry.items():
+        if registered.id == instance_id:
+            _registry.pop(key, None)
+
+
+def _uses_registry(environ):
+    # Requests which change the instance and its settings forms need
+    # the current row, so that no stale values are written back.
+    return (environ.get('REQUEST_METHOD', 'GET') in ('GET', 'HEAD')
+            and not environ.get('PATH_INFO', '').startswith('/instance/'))
+
+
 class InstanceDiscriminatorMiddleware(object):
 
     def __init__(self, app, domain, config):
@@ -46,7 +110,8 @@ class InstanceDiscriminatorMiddleware(object):
                 instance_key = host
 
         if instance_key:  # instance key is set (neither None nor "")
-            instance = model.Instance.find(instance_key)
+            instance = find_instance(instance_key, config=self.config,
+                                     registry=_uses_registry(environ))
             if instance is None:
                 if (not relative_urls) and instance_key == 'www':
                     log.debug("No such instance: www, defaulting to global!")
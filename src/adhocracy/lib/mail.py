@@ -1,30 +1,242 @@
+from contextlib import contextmanager
 import email
 from email.header import Header
 from email.mime.text import MIMEText
+import json
 import logging
+import os
 import smtplib
-from time import time
+import socket
+import threading
+import time
 import textwrap
 
 from pylons.i18n import _
 from pylons import config
 
-from adhocracy.lib import helpers as h, version
+from adhocracy import config as aconfig
+from adhocracy.lib import helpers as h, queue, version
+from adhocracy.lib.queue import async
 
 log = logging.getLogger(__name__)
 ENCODING = 'utf-8'
 
+# Errors after which sending a message is retried with a new connection.
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                    socket.error)
+
+_stats = dict(sent=0, failed=0, retries=0, connections=0, seconds=0.0)
+
+
+def _stats_key():
+    return '%s.mail_stats' % queue.rq_config.queue_name
+
+
+def _redis():
+    rq_config = queue.rq_config
+    return rq_config.connection if rq_config is not None else None
+
+
+def publish_stats(changes):
+    '''
+    Add the counter *changes* of a delivered batch to the counters in
+    redis, which are shared by all processes.
+    '''
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        pipeline = redis.pipeline()
+        for name, value in changes.items():
+            if isinstance(value, float):
+                pipeline.hincrbyfloat(_stats_key(), name, value)
+            else:
+                pipeline.hincrby(_stats_key(), name, value)
+        pipeline.execute()
+    except Exception:
+        log.exception("Publishing the mail statistics failed.")
+
+
+def stats():
+    '''
+    Return the delivery counters and the throughput in mails per second
+    spent sending. If redis is configured the counters of all processes
+    are returned, otherwise the ones of this process.
+    '''
+    result = dict(_stats)
+    redis = _redis()
+    if redis is not None:
+        try:
+            stored = redis.hgetall(_stats_key())
+        except Exception:
+            log.exception("Reading the mail statistics failed.")
+        else:
+            result = dict((name, type(value)(stored.get(name, 0)))
+                          for name, value in _stats.items())
+    result['rate'] = (result['sent'] / result['seconds']
+                      if result['seconds'] else 0.0)
+    return result
+
+
+class SMTPPool(object):
+    '''
+    Keep up to ``size`` idle SMTP sessions open so that they can be
+    reused for the next messages instead of connecting (and greeting,
+    possibly authenticating) for every single mail.
+
+    Connections that raised an error are closed rather than returned
+    to the pool.
+    '''
+
+    def __init__(self, host='localhost', port=25, size=4):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.idle = []
+
+    @classmethod
+    def from_config(cls):
+        return cls(host=config.get('smtp_server', 'localhost'),
+                   port=aconfig.get_int('smtp_port', 25),
+                   size=aconfig.get_int('adhocracy.smtp.pool_size'))
+
+    def connect(self):
+        _stats['connections'] += 1
+        return smtplib.SMTP(self.host, self.port)
+
+    @contextmanager
+    def connection(self):
+        with self.lock:
+            server = self.idle.pop() if self.idle else None
+        if server is None:
+            server = self.connect()
+        try:
+            yield server
+        except:
+            self._close(server)
+            raise
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(server)
+                server = None
+        if server is not None:
+            self._close(server)
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for server in idle:
+            self._close(server)
+
+
+_pool = None
+
+
+def get_pool():
+    '''
+    Return the :class:`SMTPPool` of this process. Connections are not
+    shared with forked processes.
+    '''
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        _pool = SMTPPool.from_config()
+    return _pool
+
+
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
 
 def send(email_from, to_email, message):
-    server = smtplib.SMTP(config.get('smtp_server', 'localhost'),
-                          config.get('smtp_port', 25))
-    #server.set_debuglevel(1)
-    server.sendmail(email_from, [to_email], message)
-    server.quit()
+    '''
+    Send a message over a pooled SMTP connection. Transient failures
+    are retried ``adhocracy.smtp.retries`` times, waiting
+    ``adhocracy.smtp.retry_delay`` seconds before the first retry and
+    twice as long before each further one.
+    '''
+    retries = aconfig.get_int('adhocracy.smtp.retries')
+    delay = aconfig.get_int('adhocracy.smtp.retry_delay')
+    attempt = 0
+    while True:
+        begin_time = time.time()
+        try:
+            with get_pool().connection() as server:
+                server.sendmail(email_from, [to_email], message)
+        except Exception, e:
+            _stats['seconds'] += time.time() - begin_time
+            if attempt >= retries or not is_transient(e):
+                _stats['failed'] += 1
+                raise
+            log.warn("Sending mail to %s failed, retrying: %r" % (to_email,
+                                                                  e))
+            _stats['retries'] += 1
+            time.sleep(delay * 2 ** attempt)
+            attempt += 1
+        else:
+            _stats['seconds'] += time.time() - begin_time
+            _stats['sent'] += 1
+            return
 
 
-def to_mail(to_name, to_email, subject, body, headers={}, decorate_body=True,
+def deliver(messages):
+    '''
+    Send a list of ``(email_from, to_email, message)`` tuples as created
+    by :func:`compose` from background jobs, ``adhocracy.smtp.batch_size``
+    messages per job.
+    '''
+    messages = filter(None, messages)
+    batch_size = max(aconfig.get_int('adhocracy.smtp.batch_size'), 1)
+    for i in range(0, len(messages), batch_size):
+        deliver_batch.enqueue(json.dumps(messages[i:i + batch_size]))
+
+
+@async
+def deliver_batch(data):
+    return send_batch(json.loads(data)).count(True)
+
+
+def send_batch(messages):
+    '''
+    Send a list of ``(email_from, to_email, message)`` tuples within a
+    delivery job. Failures are logged. Returns a list that tells for
+    each message whether it was sent.
+    '''
+    before = dict(_stats)
+    begin_time = time.time()
+    results = []
+    for (email_from, to_email, message) in messages:
+        try:
+            send(email_from, to_email, message.encode(ENCODING))
+            results.append(True)
+        except Exception:
+            log.exception("Sending mail to %s failed." % to_email)
+            results.append(False)
+    seconds = time.time() - begin_time
+    sent = results.count(True)
+    log.info("Delivered %d of %d mails in %.2fs (%.1f mails/s)" % (
+        sent, len(messages), seconds, sent / seconds if seconds else 0.0))
+    publish_stats(dict((name, value - before[name])
+                       for name, value in _stats.items()))
+    return results
+
+
+def compose(to_name, to_email, subject, body, headers={}, decorate_body=True,
             email_from=None, reply_to=None, name_from=None):
+    '''
+    Build a mail. Returns an ``(email_from, to_email, message)`` tuple
+    that can be passed to :func:`send` or :func:`deliver`, or `None` if
+    the mail could not be built.
+    '''
     try:
         if email_from is None:
             email_from = config.get('adhocracy.email.from')
@@ -56,10 +268,22 @@ def to_mail(to_name, to_email, subject, body, headers={}, decorate_body=True,
         if reply_to is not None:
             msg['Reply-To'] = reply_to
         msg['']
-        msg['Date'] = email.Utils.formatdate(time())
+        msg['Date'] = email.Utils.formatdate(time.time())
         msg['X-Mailer'] = "Adhocracy SMTP %s" % version.get_version()
         #log.debug("MAIL\r\n" + msg.as_string())
-        send(email_from, to_email, msg.as_string())
+        return (email_from, to_email, msg.as_string())
+    except Exception:
+        log.exception("Composing mail failed.")
+
+
+def to_mail(to_name, to_email, subject, body, headers={}, decorate_body=True,
+            email_from=None, reply_to=None, name_from=None):
+    mail = compose(to_name, to_email, subject, body, headers, decorate_body,
+                   email_from, reply_to, name_from)
+    if mail is None:
+        return
+    try:
+        send(*mail)
     except Exception:
         log.exception("Sending mail failed.")
 
@@ -70,6 +70,7 @@ def _send(message, force_resend=False, massmessage=True,
     notification = Notification(e, message.creator)
     meta.Session.add(notification)
 
+    messages = []
     for r in message.recipients:
         if force_resend or not r.email_sent:
             if (r.recipient.is_email_activated() and
@@ -77,16 +78,17 @@ def _send(message, force_resend=False, massmessage=True,
 
                 body = render_body(message.body, r.recipient)
 
-                mail.to_user(r.recipient,
-                             email_subject(message, r.recipient,
-                                           email_subject_format),
-                             email_body(message, r.recipient, body,
-                                        email_body_template,
-                                        massmessage=massmessage),
-                             headers={},
-                             decorate_body=False,
-                             email_from=message.email_from,
-                             name_from=message.name_from)
+                messages.append(mail.compose(
+                    r.recipient.name,
+                    r.recipient.email,
+                    email_subject(message, r.recipient, email_subject_format),
+                    email_body(message, r.recipient, body,
+                               email_body_template,
+                               massmessage=massmessage),
+                    headers={},
+                    decorate_body=False,
+                    email_from=message.email_from,
+                    name_from=message.name_from))
 
             # creator already got a notification
             if r.recipient != message.creator:
@@ -97,6 +99,7 @@ def _send(message, force_resend=False, massmessage=True,
             r.email_sent = True
 
     meta.Session.commit()
+    mail.deliver(messages)
 
 
 def send(subject, body, creator, recipients, sender_email=None,
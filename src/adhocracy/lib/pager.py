@@ -87,6 +87,16 @@ def visible_pages(selected_page, pages):
 
 class PagerMixin(object):
 
+    # Called with the items of the current page before they are
+    # rendered, to load what the rows need with a few queries.
+    prefetch = None
+    _prefetched = False
+
+    def prefetch_items(self):
+        if self.prefetch is not None and not self._prefetched:
+            self._prefetched = True
+            self.prefetch(self.items)
+
     @property
     def offset(self):
         return (self.page - 1) * self.size
@@ -197,10 +207,11 @@ class NamedPager(PagerMixin):
 
     def __init__(self, name, items, itemfunc, initial_size=10,
                  size=None, sorts={}, default_sort=None, enable_sorts=True,
-                 enable_pages=True, **kwargs):
+                 enable_pages=True, prefetch=None, **kwargs):
         self.name = name
         self._items = items
         self.itemfunc = itemfunc
+        self.prefetch = prefetch
         self.initial_size = initial_size
         if size is not None:
             self.size = size
@@ -297,7 +308,8 @@ def proposals(proposals, default_sort=None, **kwargs):
         row = tiles.proposal.row
 
     return NamedPager('proposals', proposals, row, sorts=sorts,
-                      default_sort=default_sort, **kwargs)
+                      default_sort=default_sort,
+                      prefetch=tiles.proposal.prefetch, **kwargs)
 
 
 def help_strings():
@@ -379,7 +391,8 @@ def delegations(delegations):
 
 def events(events, pager_name='events', row_type='row', **kwargs):
     row = partial(tiles.event.event_row, row_type=row_type)
-    return NamedPager(pager_name, events, row, **kwargs)
+    return NamedPager(pager_name, events, row,
+                      prefetch=model.Event.prefetch, **kwargs)
 
 
 def polls(polls, default_sort=None, **kwargs):
@@ -1266,9 +1279,10 @@ class SolrPager(PagerMixin):
     def __init__(self, name, itemfunc, entity_type=None, extra_filter=None,
                  initial_size=20, size=None, sorts=None,
                  enable_sorts=True, enable_pages=True, facets=tuple(),
-                 wildcard_queries=None):
+                 wildcard_queries=None, prefetch=None):
         self.name = name
         self.itemfunc = itemfunc
+        self.prefetch = prefetch
         self.enable_pages = enable_pages
         self.extra_filter = extra_filter
         self.facets = [Facet(self.name, request, **kwargs)
@@ -1662,7 +1676,8 @@ def solr_proposal_pager(instance, wildcard_queries=None, default_sorting=None,
                       sorts=sorts,
                       extra_filter=extra_filter,
                       facets=facets,
-                      wildcard_queries=wildcard_queries)
+                      wildcard_queries=wildcard_queries,
+                      prefetch=tiles.proposal.prefetch)
     return pager
 
 
@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import json
 from logging import getLogger
 
@@ -9,12 +9,28 @@ from rq.job import Job
 
 from adhocracy import config
 from adhocracy.model import meta
-from adhocracy.model.refs import to_ref, to_entity
+from adhocracy.model.refs import to_ref, to_entity, to_entities
 
 log = getLogger(__name__)
 
 LISTENERS = defaultdict(list)
 
+# Listeners that can process many entities at once. Maps a listener
+# registered in LISTENERS to a function that takes a list of entities.
+BATCH_LISTENERS = {}
+
+# Functions that are called without arguments after every job, e.g. to
+# flush buffered writes.
+JOB_END_HOOKS = []
+
+
+def run_job_end_hooks():
+    for hook in JOB_END_HOOKS:
+        try:
+            hook()
+        except:
+            log.exception('exception in job end hook: %s' % hook.__name__)
+
 
 class async(object):
     """
@@ -51,7 +67,10 @@ class async(object):
 
     def fake_job(self, *args, **kwargs):
         fake_job = FakeJob()
-        fake_job._result = self.func(*args, **kwargs)
+        try:
+            fake_job._result = self.func(*args, **kwargs)
+        finally:
+            run_job_end_hooks()
         return fake_job
 
     def __call__(self, *args, **kwargs):
@@ -84,6 +103,7 @@ class async(object):
                 # from the queue.
                 meta.Session.commit()
                 meta.Session.remove()
+                run_job_end_hooks()
         else:
             job = self.enqueue(*args, **kwargs)
             if isinstance(job, FakeJob):
@@ -153,28 +173,75 @@ class RQConfig(object):
 # --[ async methods ]-------------------------------------------------------
 
 def update_entity(entity, operation):
-    entity_ref = to_ref(entity)
-    if entity_ref is None:
+    return update_entities([(entity, operation)])
+
+
+def update_entities(updates):
+    '''
+    Post a single update job for a list of (entity, operation) tuples.
+    Each entity and operation is only posted once.
+    '''
+    data = []
+    seen = set()
+    for (entity, operation) in updates:
+        entity_ref = to_ref(entity)
+        if entity_ref is None or (entity_ref, operation) in seen:
+            continue
+        seen.add((entity_ref, operation))
+        data.append(dict(operation=operation, entity=entity_ref))
+    if not data:
         return
-    data = dict(operation=operation, entity=entity_ref)
-    data_json = json.dumps(data)
-    return handle_update(data_json)
+    return handle_updates(json.dumps(data))
 
 
-@async
-def handle_update(message):
-    data = json.loads(message)
+def _delay_update():
     delay = config.get_int('adhocracy.delay_update_queue_seconds')
     if delay > 0:
         import time
         time.sleep(delay)
+
+
+@async
+def handle_update(message):
+    _delay_update()
+    data = json.loads(message)
     entity = to_entity(data.get('entity'))
-    for (clazz, operation), listeners in LISTENERS.items():
-        if operation != data.get('operation') \
-           or not isinstance(entity, clazz):
-            continue
-        for listener in listeners:
-            listener(entity)
+    _call_listeners([(entity, data.get('operation'))])
+
+
+@async
+def handle_updates(message):
+    _delay_update()
+    data = json.loads(message)
+    entities = dict((to_ref(e), e) for e in
+                    to_entities([d.get('entity') for d in data]))
+    _call_listeners([(entities.get(d.get('entity')), d.get('operation'))
+                     for d in data])
+
+
+def _call_listeners(updates):
+    '''
+    Call the matching listeners for a list of (entity, operation)
+    tuples. The calls are grouped by listener so that listeners
+    registered in BATCH_LISTENERS are called once with all entities.
+    '''
+    calls = OrderedDict()
+    for (entity, operation) in updates:
+        for (clazz, listen_op), listeners in LISTENERS.items():
+            if operation != listen_op or not isinstance(entity, clazz):
+                continue
+            for listener in listeners:
+                entities = calls.setdefault(listener, [])
+                if entity not in entities:
+                    entities.append(entity)
+
+    for listener, entities in calls.items():
+        batch_listener = BATCH_LISTENERS.get(listener)
+        if batch_listener is not None:
+            batch_listener(entities)
+        else:
+            for entity in entities:
+                listener(entity)
 
 
 @async
@@ -185,12 +252,18 @@ def minutely():
 
 @async
 def hourly():
-    return
-    # nothing here yet
+    from adhocracy.lib import democracy
+    from adhocracy.lib.event import notification
+    from adhocracy.model import User
+    democracy.verify_tallies()
+    notification.send_digests(User.DIGEST_HOURLY)
 
 
 @async
 def daily():
+    from adhocracy.lib.event import notification
+    from adhocracy.model import User
+    notification.send_digests(User.DIGEST_DAILY)
     return
     from adhocracy.lib import watchlist
     watchlist.clean_stale_watches()
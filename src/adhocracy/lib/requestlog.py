@@ -1,6 +1,13 @@
+import atexit
+from datetime import datetime
 import ipaddress
+import json
 import logging
+import os
+import threading
+import time
 
+from adhocracy import config as aconfig
 import adhocracy.lib.util
 import adhocracy.model
 
@@ -28,6 +35,72 @@ ANONYMIZATION_FUNCS = {
 log = logging.getLogger(__name__)
 
 
+class RequestLogBuffer(object):
+    '''
+    Collect request log entries in memory and write them in bulk every
+    ``interval`` seconds from a background thread, so requests don't
+    wait for the database. If ``size`` entries are already waiting,
+    further entries are dropped and counted in ``dropped``.
+
+    The entries are inserted into the requestlog table or, if ``path``
+    is given, appended to that file as JSON lines.
+    '''
+
+    def __init__(self, size=10000, interval=5, path=None):
+        self.size = size
+        self.interval = interval
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = []
+        self.dropped = 0
+        self.reported = 0
+        self.pid = None
+
+    def add(self, entry):
+        with self.lock:
+            if self.pid != os.getpid():
+                # (re)start the writer, also in forked worker processes
+                self.pid = os.getpid()
+                self.entries = []
+                thread = threading.Thread(target=self._run,
+                                          name='requestlog')
+                thread.daemon = True
+                thread.start()
+                atexit.register(self.flush)
+            if len(self.entries) >= self.size:
+                self.dropped += 1
+            else:
+                self.entries.append(entry)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.error('Error while trying to write request log: %r' % e)
+
+    def flush(self):
+        with self.lock:
+            entries, self.entries = self.entries, []
+            dropped = self.dropped - self.reported
+            self.reported = self.dropped
+        if dropped:
+            log.warn('Request log buffer full, dropped %i requests'
+                     % dropped)
+        if not entries:
+            return
+        if self.path:
+            with open(self.path, 'a') as f:
+                for entry in entries:
+                    entry = dict(entry,
+                                 access_time=entry['access_time'].isoformat())
+                    f.write(json.dumps(entry) + '\n')
+        else:
+            adhocracy.model.meta.engine.execute(
+                adhocracy.model.requestlog_table.insert(), entries)
+
+
 class RequestLogger(object):
     def __init__(self, app, config):
         self.app = app
@@ -35,6 +108,12 @@ class RequestLogger(object):
         afname = self.config.get('adhocracy.requestlog_ipanonymization',
                                  'dontlog')
         self.anonymization_func = ANONYMIZATION_FUNCS[afname]
+        self.buffer = RequestLogBuffer(
+            size=aconfig.get_int('adhocracy.requestlog.buffer_size',
+                                 config=config),
+            interval=aconfig.get_int('adhocracy.requestlog.flush_interval',
+                                     config=config),
+            path=aconfig.get('adhocracy.requestlog.file', config=config))
 
     def __call__(self, environ, start_response):
         try:
@@ -55,10 +134,11 @@ class RequestLogger(object):
         url = (environ['PATH_INFO'].decode('utf-8', 'replace')
                + '?' + environ['QUERY_STRING'].decode('utf-8', 'replace'))
 
-        adhocracy.model.RequestLog.create(
-            ip, url,
+        self.buffer.add(dict(
+            access_time=datetime.utcnow(),
+            ip_address=ip,
+            request_url=url,
             cookies=_get_field('HTTP_COOKIE'),
             user_agent=_get_field('HTTP_USER_AGENT'),
             referer=_get_field('HTTP_REFERER'),
-        )
-        adhocracy.model.meta.Session.commit()
+        ))
@@ -1,8 +1,14 @@
 '''Integrate solr with adhocracy'''
 
+from hashlib import sha1
 import logging
+import multiprocessing
+import os
 import time
 
+from sqlalchemy.orm import class_mapper, eagerload, subqueryload
+
+from adhocracy import config
 from adhocracy import model
 from adhocracy.lib.search import index, query
 
@@ -18,85 +24,215 @@ def init_search():
     '''Register callback functions for commit hooks to add/update and
     delete documents in solr when model instances are commited.
     '''
-    from adhocracy.lib.queue import LISTENERS
+    from adhocracy.lib.queue import LISTENERS, BATCH_LISTENERS
+    from adhocracy.lib.queue import JOB_END_HOOKS
     from adhocracy.model import INSERT, UPDATE, DELETE
     for cls in INDEXED_CLASSES:
         LISTENERS[(cls, INSERT)].append(index.update)
         LISTENERS[(cls, UPDATE)].append(index.update)
         LISTENERS[(cls, DELETE)].append(index.delete)
+    BATCH_LISTENERS[index.update] = index.update_many
+    BATCH_LISTENERS[index.delete] = index.delete_many
+    if index.flush not in JOB_END_HOOKS:
+        JOB_END_HOOKS.append(index.flush)
+
+
+# Relations used by ``to_index()`` and the indexers in
+# :data:`adhocracy.lib.pager.INDEX_DATA_FINDERS` that are loaded eagerly
+# on reindex. Badges, categories and thumbnails are always loaded with
+# their delegateables and users. The latest tallies of the polls are
+# loaded per partition, see :func:`index_partition`.
+INDEX_EAGERLOAD = ('creator', 'instance', 'topic', 'comments', 'poll',
+                   'rate_poll')
 
+CHECKPOINT_PLAN = 'plan '
 
-def rebuild(classes, instances=None):
+
+def rebuild(classes, instances=None, jobs=1, partition_size=1000,
+            checkpoint=None):
     '''
     (Re)Index all entities of the given *classes*.
+
+    The entities of each class are split into partitions of
+    *partition_size* consecutive ids that are indexed by *jobs* worker
+    processes. If *checkpoint* is the path of a file, every indexed
+    partition is recorded there and partitions that are already
+    recorded are skipped, so an interrupted rebuild can be resumed by
+    running it again with the same *checkpoint*.
     '''
     log = logging.getLogger('index')
-    connection = index.get_sunburnt_connection()
     start = time.time()
-    batch_start = time.time()
-    done = 0
-    other_classes = 0
-    docs = {index.ADD: [],
-            index.SKIP: [],
-            index.DELETE: [],
-            index.IGNORE: []}
     instance_ids = [i.id for i in instances] if instances else None
 
+    planned = []
     for cls in classes:
         if cls not in INDEXED_CLASSES:
             log.warn('Class "%s" is not an indexable class! skipping.' %
                      cls)
             continue
-        log.info("Re-indexing %ss..." % cls.__name__)
-        q = model.meta.Session.query(cls)
-        if instances:
-            if isinstance(cls, model.Instance):
-                q = q.filter(cls.id.in_(instance_ids))
-            elif hasattr(cls, 'instance_id'):
-                q = q.filter(cls.instance_id.in_(instance_ids))
-            elif hasattr(cls, 'topic_id'):
-                q = q.filter(cls.topic_id.in_(instance_ids))
-            elif cls is model.User:
-                q = q.filter(model.User.memberships.any(
-                    model.Membership.instance_id.in_(instance_ids)))
-        for entity in q:
-            (action, data) = index.get_update_information(entity)
-            docs[action].append(data)
-            done = done + 1
-            if done % 1000 == 0:
-                docs = commit_docs(docs, connection, log, start, batch_start)
-                batch_start = time.time()
-        log.info("...re-indexed %s %ss" % (done - other_classes, cls.__name__))
-        other_classes = done
-    commit_docs(docs, connection, log, start, batch_start)
-    now = time.time()
-    log.info('total: %s updates, %0.1f s' % (done, now - start))
-
-
-def commit_docs(docs, connection, log, start, batch_start):
-    to_add = docs[index.ADD]
-    if len(to_add):
-        connection.add(to_add)
-
-    to_delete = docs[index.DELETE]
-    if len(to_delete):
-        connection.delete(to_delete)
-
-    msg = "...indexed: %s/%s" % (len(to_add), len(to_delete))
-
-    to_skip = docs[index.SKIP]
-    if len(to_skip):
-        connection.delete(to_skip)
-        msg += ', skipped: %s' % len(to_skip)
+        for (first_id, last_id) in partition_ids(cls, instance_ids,
+                                                 partition_size):
+            planned.append((cls.__name__, first_id, last_id, instance_ids))
 
-    connection.commit()
-    now = time.time()
-    msg += ' in %0.1f s. Total time: %0.1f s' % (now - batch_start,
-                                                 now - start)
-    log.info(msg)
-    for key in docs:
-        docs[key] = []
-    return docs
+    plan = plan_id(planned)
+    done_keys = read_checkpoint(checkpoint, plan=plan)
+    if checkpoint is not None and not done_keys:
+        with open(checkpoint, 'w') as f:
+            f.write(CHECKPOINT_PLAN + plan + '\n')
+    partitions = [p for p in planned if partition_key(p) not in done_keys]
+    log.info('Re-indexing %s partitions (%s already done)...' % (
+        len(partitions), len(done_keys)))
+
+    if jobs > 1 and len(partitions) > 1:
+        # Don't let the workers inherit the session of the planning
+        # queries and its connection.
+        model.meta.Session.remove()
+        model.meta.engine.dispose()
+        pool = multiprocessing.Pool(jobs, initializer=_init_worker)
+        try:
+            results = pool.imap_unordered(_index_partition_in_worker,
+                                          partitions)
+            done = _collect(results, checkpoint, log, start)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        done = _collect((index_partition(p) for p in partitions),
+                        checkpoint, log, start)
+
+    index.make_connection().commit()
+    log.info('total: %s updates, %0.1f s' % (done, time.time() - start))
+
+
+def _collect(results, checkpoint, log, start):
+    done = 0
+    for (partition, count) in results:
+        done += count
+        write_checkpoint(checkpoint, partition)
+        log.info('...indexed %s %ss with ids %s-%s. Total time: %0.1f s' % (
+            count, partition[0], partition[1], partition[2],
+            time.time() - start))
+    return done
+
+
+def _init_worker():
+    # Forked processes must not share the database connections of the
+    # parent. The inherited session is dropped without closing it, as
+    # that would roll back on the connection of the parent.
+    model.meta.Session.registry.clear()
+    model.meta.engine.dispose()
+
+
+def _rebuild_query(cls, instance_ids):
+    q = model.meta.Session.query(cls)
+    if instance_ids:
+        if cls is model.Instance:
+            q = q.filter(cls.id.in_(instance_ids))
+        elif hasattr(cls, 'instance_id'):
+            q = q.filter(cls.instance_id.in_(instance_ids))
+        elif hasattr(cls, 'topic_id'):
+            q = q.filter(cls.topic_id.in_(instance_ids))
+        elif cls is model.User:
+            q = q.filter(model.User.memberships.any(
+                model.Membership.instance_id.in_(instance_ids)))
+    return q
+
+
+def partition_ids(cls, instance_ids, partition_size):
+    '''
+    Return a list of (first_id, last_id) tuples that split the entities
+    of *cls* into ranges of *partition_size* entities.
+    '''
+    q = _rebuild_query(cls, instance_ids).with_entities(cls.id)
+    ids = [id_ for (id_,) in q.order_by(cls.id)]
+    return [(chunk[0], chunk[-1]) for chunk in
+            (ids[i:i + partition_size]
+             for i in range(0, len(ids), partition_size))]
+
+
+def index_partition(partition):
+    '''
+    Send the documents for all entities of a partition to solr.
+    Returns a tuple of the partition and the number of entities.
+    '''
+    (cls_name, first_id, last_id, instance_ids) = partition
+    cls = getattr(model, cls_name)
+    q = _rebuild_query(cls, instance_ids)
+    q = q.filter(cls.id.between(first_id, last_id))
+    relationships = class_mapper(cls).relationships
+    q = q.options(*[(subqueryload if relationships[name].uselist
+                     else eagerload)(name)
+                    for name in INDEX_EAGERLOAD if name in relationships])
+    entities = q.all()
+    polls = [getattr(e, name) for e in entities
+             for name in ('poll', 'rate_poll') if getattr(e, name, None)]
+    model.Tally.prefetch_latest(polls)
+
+    to_add = []
+    to_delete = []
+    count = 0
+    for entity in entities:
+        (action, data) = index.get_update_information(entity)
+        if action == index.ADD:
+            to_add.append(data)
+        elif action in (index.DELETE, index.SKIP):
+            to_delete.append(data)
+        count += 1
+
+    index.send(index.make_connection(), to_add, to_delete,
+               config.get_int('adhocracy.solr.commit_within'))
+    return (partition, count)
+
+
+def _index_partition_in_worker(partition):
+    try:
+        return index_partition(partition)
+    finally:
+        model.meta.Session.remove()
+
+
+def partition_key(partition):
+    (cls_name, first_id, last_id, instance_ids) = partition
+    if instance_ids:
+        instances = ','.join(str(i) for i in sorted(instance_ids))
+    else:
+        instances = 'all'
+    return '%s:%s-%s:%s' % (cls_name.lower(), first_id, last_id, instances)
+
+
+def plan_id(partitions):
+    '''
+    Return an id for the list of all *partitions* of a rebuild.
+    '''
+    return sha1('\n'.join(partition_key(p) for p in partitions)).hexdigest()
+
+
+def read_checkpoint(checkpoint, plan=None):
+    '''
+    Return the keys of the partitions recorded in *checkpoint*. If the
+    *plan* (see :func:`plan_id`) is given, a checkpoint that was
+    written for other partitions raises a :exc:`ValueError`, as
+    resuming it could skip entities that were never indexed.
+    '''
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return set()
+    with open(checkpoint) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    recorded = None
+    if lines and lines[0].startswith(CHECKPOINT_PLAN):
+        recorded = lines.pop(0)[len(CHECKPOINT_PLAN):]
+    if plan is not None and lines and recorded != plan:
+        raise ValueError('The checkpoint %s was written for other '
+                         'classes, instances or entities. Remove it to '
+                         'start a new rebuild.' % checkpoint)
+    return set(lines)
+
+
+def write_checkpoint(checkpoint, partition):
+    if checkpoint is None:
+        return
+    with open(checkpoint, 'a') as f:
+        f.write(partition_key(partition) + '\n')
 
 
 def rebuild_all():
@@ -1,5 +1,7 @@
 import hashlib
 import logging
+import threading
+import time
 
 from httplib2 import Http
 from pylons import tmpl_context as c
@@ -46,20 +48,157 @@ def gen_id(entity):
     return hashlib.sha1(ref).hexdigest()
 
 
+def send(connection, to_add, to_delete, commit_within=0):
+    '''
+    Send documents to add and ids to delete to solr, each with a single
+    request. If *commit_within* is positive, solr makes the changes
+    visible within that many milliseconds.
+    '''
+    for message in [to_add and connection.schema.make_update(to_add),
+                    to_delete and connection.schema.make_delete(to_delete,
+                                                                 None)]:
+        if not message:
+            continue
+        if commit_within > 0:
+            # sunburnt sends the commitWithin parameter as a float,
+            # which solr doesn't accept. The attribute of the message
+            # is sent as an integer.
+            message.xml.set('commitWithin', str(int(commit_within)))
+        connection.conn.update(str(message))
+
+
+class IndexWriter(object):
+    '''
+    Buffer documents that should be added to or deleted from solr and
+    send them in bulk. Instead of a hard commit per document solr is
+    asked to make the changes visible within ``commit_within``
+    milliseconds.
+
+    The buffer is flushed when it holds ``batch_size`` documents or
+    when :meth:`flush` is called, which happens at the end of every
+    job (see :data:`adhocracy.lib.queue.JOB_END_HOOKS`). The age of the
+    buffer is only checked when a document is added: if the oldest
+    buffered document is older than ``batch_seconds`` the buffer is
+    flushed as well, otherwise it waits for the end of the job.
+
+    If sending fails, the documents stay buffered and are sent again
+    with the next flush, but not before ``batch_seconds`` have passed.
+    Up to ``max_batches`` batches are kept, more are dropped.
+
+    If ``commit_within`` is 0 a hard commit is done on every flush.
+    '''
+
+    def __init__(self, batch_size=100, batch_seconds=5, commit_within=1000,
+                 max_batches=10):
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.commit_within = commit_within
+        self.max_batches = max_batches
+        self.lock = threading.RLock()
+        self.retry_time = None
+        self._reset()
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            batch_size=config.get_int('adhocracy.solr.batch_size'),
+            batch_seconds=config.get_int('adhocracy.solr.batch_seconds'),
+            commit_within=config.get_int('adhocracy.solr.commit_within'))
+
+    def _reset(self):
+        self.to_add = {}
+        self.to_delete = set()
+        self.started = None
+
+    def __len__(self):
+        return len(self.to_add) + len(self.to_delete)
+
+    def add(self, data):
+        with self.lock:
+            self.to_delete.discard(data['id'])
+            self.to_add[data['id']] = data
+            self._buffered()
+
+    def delete(self, index_id):
+        with self.lock:
+            self.to_add.pop(index_id, None)
+            self.to_delete.add(index_id)
+            self._buffered()
+
+    def _buffered(self):
+        if self.started is None:
+            self.started = time.time()
+        if self.retry_time is not None and time.time() < self.retry_time:
+            return
+        if (len(self) >= self.batch_size or
+                time.time() - self.started >= self.batch_seconds):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not len(self):
+                return
+            to_add = self.to_add
+            to_delete = self.to_delete
+            started = self.started
+            self._reset()
+
+            connection = get_sunburnt_connection()
+            try:
+                send(connection, to_add.values(), list(to_delete),
+                     self.commit_within)
+                if self.commit_within <= 0:
+                    connection.commit()
+            except Exception, e:
+                log.exception(e)
+                self.retry_time = time.time() + self.batch_seconds
+                if (len(to_add) + len(to_delete) >
+                        self.batch_size * self.max_batches):
+                    log.error('Dropped %s index updates, rebuild the index '
+                              'when solr is available again.' %
+                              (len(to_add) + len(to_delete)))
+                    return
+                # Nothing else could be buffered while sending.
+                self.to_add = to_add
+                self.to_delete = to_delete
+                self.started = started
+            else:
+                self.retry_time = None
+
+
+_writer = None
+
+
+def get_writer():
+    '''
+    Return the :class:`IndexWriter` of this process.
+    '''
+    global _writer
+    if _writer is None:
+        _writer = IndexWriter.from_config()
+    return _writer
+
+
+def flush():
+    '''
+    Send all buffered documents to solr.
+    '''
+    if _writer is not None:
+        _writer.flush()
+
+
 def update(entity):
-    (action, data) = get_update_information(entity)
-    if action == IGNORE:
-        return
+    update_many([entity])
 
-    connection = get_sunburnt_connection()
-    try:
+
+def update_many(entities):
+    writer = get_writer()
+    for entity in entities:
+        (action, data) = get_update_information(entity)
         if action == ADD:
-            connection.add(data)
+            writer.add(data)
         elif action in (DELETE, SKIP):
-            connection.delete(data)
-        connection.commit()
-    except Exception, e:
-        log.exception(e)
+            writer.delete(data)
 
 
 def get_update_information(entity):
@@ -75,10 +214,10 @@ def get_update_information(entity):
 
 
 def delete(entity):
-    connection = get_sunburnt_connection()
-    try:
-        index_id = gen_id(entity)
-        connection.delete(index_id)
-        connection.commit()
-    except Exception, e:
-        log.exception(e)
+    delete_many([entity])
+
+
+def delete_many(entities):
+    writer = get_writer()
+    for entity in entities:
+        writer.delete(gen_id(entity))
@@ -7,7 +7,7 @@ from lxml.html import fragment_fromstring
 from adhocracy.lib.text import diff
 from adhocracy.lib.text.tag import tag_normalize, tag_split, tag_split_last
 from normalize import *
-from render import render, render_line_based
+from render import render, render_many, render_line_based, prefetch
 
 
 META_RE = re.compile("(\n|\t|\")", re.MULTILINE)
@@ -1,21 +1,281 @@
 import cgi
+from bisect import bisect_left
 from itertools import izip_longest
 from string import count
 
+from lxml import etree
+import lxml.html
 from lxml.html.diff import htmldiff
 
 from adhocracy import model
 from adhocracy.lib.cache import memoize
 from adhocracy.lib.text.normalize import simple_form
 from adhocracy.lib.text.render import (render, render_line_based, _line_table,
-                                       linify)
+                                       linify, RENDER_VERSION)
 
 LINEBREAK_TOKEN = 23
 SPACE_TOKEN = 42
 
 
+def _intern(left, right):
+    '''
+    Map the tokens of both sequences to small integer ids, which are
+    cheaper to hash and compare than the tokens themselves.
+    '''
+    ids = {}
+    return ([ids.setdefault(t, len(ids)) for t in left],
+            [ids.setdefault(t, len(ids)) for t in right])
+
+
+def _unique_anchors(a, a0, a1, b, b0, b1):
+    '''
+    The longest increasing sequence of positions ``(i, j)`` of tokens
+    that occur exactly once in ``a[a0:a1]`` and in ``b[b0:b1]`` (the
+    anchors of the patience diff).
+    '''
+    counts = {}
+    for i in xrange(a0, a1):
+        counts[a[i]] = counts.get(a[i], 0) + 1
+    positions = {}
+    for i in xrange(a0, a1):
+        if counts[a[i]] == 1:
+            positions[a[i]] = i
+    b_counts = {}
+    for j in xrange(b0, b1):
+        if b[j] in positions:
+            b_counts[b[j]] = b_counts.get(b[j], 0) + 1
+    pairs = sorted((positions[b[j]], j) for j in xrange(b0, b1)
+                   if b_counts.get(b[j]) == 1)
+    if not pairs:
+        return []
+
+    # patience sorting of the positions in b
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(pairs)
+    for index, (i, j) in enumerate(pairs):
+        pile = bisect_left(tails, j)
+        if pile == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[pile] = j
+            tail_indexes[pile] = index
+        if pile:
+            previous[index] = tail_indexes[pile - 1]
+    anchors = []
+    index = tail_indexes[-1]
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _middle_snake(a, a0, a1, b, b0, b1):
+    '''
+    Find a point on a shortest edit path from ``a[a0:a1]`` to
+    ``b[b0:b1]`` by running Myers' algorithm from both ends until
+    the paths meet. Needs space linear in the length of the ranges.
+    '''
+    n = a1 - a0
+    m = b1 - b0
+    delta = n - m
+    odd = delta % 2 != 0
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in xrange((n + m + 1) // 2 + 1):
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and
+                           forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if (odd and -(d - 1) <= k - delta <= d - 1 and
+                    x + backward[offset + delta - k] >= n):
+                return a0 + x, b0 + y
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and
+                           backward[offset + k - 1] <
+                           backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            while (x < n and y < m and
+                   a[a1 - 1 - x] == b[b1 - 1 - y]):
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if (not odd and -d <= k - delta <= d and
+                    x + forward[offset + delta - k] >= n):
+                return a1 - x, b1 - y
+    return None
+
+
+def _matching_blocks(a, b):
+    '''
+    The blocks of tokens both sequences have in common as triples
+    ``(i, j, n)`` with ``a[i:i + n] == b[j:j + n]``, ordered and
+    without the dummy block at the end of
+    :meth:`difflib.SequenceMatcher.get_matching_blocks`.
+
+    Common prefixes and suffixes are stripped, ranges are split at
+    tokens that are unique in both (patience diff) and the remaining
+    ranges are split with :func:`_middle_snake`.
+    '''
+    blocks = []
+    ranges = [(0, len(a), 0, len(b))]
+    while ranges:
+        a0, a1, b0, b1 = ranges.pop()
+        n = 0
+        while a0 + n < a1 and b0 + n < b1 and a[a0 + n] == b[b0 + n]:
+            n += 1
+        if n:
+            blocks.append((a0, b0, n))
+            a0 += n
+            b0 += n
+        n = 0
+        while (a0 < a1 - n and b0 < b1 - n and
+               a[a1 - n - 1] == b[b1 - n - 1]):
+            n += 1
+        if n:
+            blocks.append((a1 - n, b1 - n, n))
+            a1 -= n
+            b1 -= n
+        if a0 == a1 or b0 == b1:
+            continue
+
+        anchors = _unique_anchors(a, a0, a1, b, b0, b1)
+        if anchors:
+            for i, j in anchors:
+                ranges.append((a0, i, b0, j))
+                blocks.append((i, j, 1))
+                a0, b0 = i + 1, j + 1
+            ranges.append((a0, a1, b0, b1))
+            continue
+
+        point = _middle_snake(a, a0, a1, b, b0, b1)
+        if point is None or point in ((a0, b0), (a1, b1)):
+            continue  # nothing in common
+        x, y = point
+        ranges.append((a0, x, b0, y))
+        ranges.append((x, a1, y, b1))
+
+    blocks.sort()
+    merged = []
+    for i, j, n in blocks:
+        if merged and (merged[-1][0] + merged[-1][2] == i and
+                       merged[-1][1] + merged[-1][2] == j):
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        else:
+            merged.append((i, j, n))
+    return merged
+
+
+def _opcodes(left, right):
+    '''
+    The operations that turn *left* into *right* in the format of
+    :meth:`difflib.SequenceMatcher.get_opcodes`.
+    '''
+    a, b = _intern(left, right)
+    opcodes = []
+    i = j = 0
+    for ai, bj, n in _matching_blocks(a, b) + [(len(a), len(b), 0)]:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        if n:
+            opcodes.append(('equal', ai, ai + n, bj, bj + n))
+        i, j = ai + n, bj + n
+    return opcodes
+
+
+def _cleanup(opcodes, left):
+    '''
+    Merge changes that are only separated by spaces, so that replacing
+    several words is shown as one change and not word by word.
+    '''
+    result = []
+    for opcode in opcodes:
+        if (opcode[0] != 'equal' and len(result) > 1 and
+                result[-1][0] == 'equal' and result[-2][0] != 'equal' and
+                all(t == SPACE_TOKEN
+                    for t in left[result[-1][1]:result[-1][2]])):
+            result.pop()
+            previous = result.pop()
+            opcode = ('replace', previous[1], opcode[2], previous[3],
+                      opcode[4])
+        result.append(opcode)
+    return result
+
+
+def _html_blocks(html):
+    '''
+    Split *html* into its top level elements, or return `None` if it
+    doesn't consist of elements only. Returns the html of each element
+    without and with the text following it.
+    '''
+    try:
+        fragments = lxml.html.fragments_fromstring(html)
+    except (etree.ParserError, etree.XMLSyntaxError, ValueError):
+        return None
+    if not fragments or any(isinstance(f, basestring) for f in fragments):
+        return None
+    return ([etree.tostring(f, encoding=unicode, with_tail=False)
+             for f in fragments],
+            [etree.tostring(f, encoding=unicode) for f in fragments])
+
+
 def _diff_html(left, right):
-    return htmldiff(left, right)
+    '''
+    Diff the top level elements (usually paragraphs) of both documents
+    and only run :func:`htmldiff` on the changed ones.
+    '''
+    left_blocks = _html_blocks(left)
+    right_blocks = _html_blocks(right)
+    if left_blocks is None or right_blocks is None:
+        return htmldiff(left, right)
+    opcodes = _opcodes(left_blocks[0], right_blocks[0])
+    left_blocks = left_blocks[1]
+    right_blocks = right_blocks[1]
+
+    out = []
+    spare = 0
+    skip = 0
+    for op, i1, i2, j1, j2 in opcodes:
+        if op == 'equal':
+            blocks = right_blocks[j1 + skip:j2]
+            out.extend(blocks)
+            spare = len(blocks)
+            skip = 0
+            continue
+        # htmldiff needs content on both sides, so take a block of
+        # the neighbouring unchanged ones
+        if i1 == i2 or j1 == j2:
+            if spare:
+                out.pop()
+                i1 -= 1
+                j1 -= 1
+            elif i2 < len(left_blocks) and j2 < len(right_blocks):
+                i2 += 1
+                j2 += 1
+                skip = 1
+            else:
+                return htmldiff(left, right)
+        spare = 0
+        out.append(htmldiff(u''.join(left_blocks[i1:i2]),
+                            u''.join(right_blocks[j1:j2])))
+    return u''.join(out)
 
 
 def _decompose(text):
@@ -33,45 +293,52 @@ def _decompose(text):
     return _tokens
 
 
-def _compose(elems):
-    lines = []
-    line = ''
+def _compose(elems, out):
+    '''
+    Append the escaped text of the tokens *elems* to the list *out*.
+    '''
     for elem in elems:
         if elem == LINEBREAK_TOKEN:
-            lines.append(line)
-            line = ''
+            out.append('\n')
         elif elem == SPACE_TOKEN:
-            line += ' '
+            out.append(' ')
         else:
-            line += elem
-    lines.append(line)
-    return '\n'.join([cgi.escape(l) for l in lines])
+            out.append(cgi.escape(elem))
 
 
 def _diff_line_based(left_text, right_text, include_deletions=True,
                      include_insertions=True, replace_as_insert=False,
                      replace_as_delete=False, ratio_skip=0.7,
                      line_length=model.Text.LINE_LENGTH):
-    from difflib import SequenceMatcher
     left = _decompose(left_text)
     right = _decompose(right_text)
-    s = SequenceMatcher(None, left, right)
 
-    html_match = ''
-    for op, i1, i2, j1, j2 in s.get_opcodes():
+    out = []
+    for op, i1, i2, j1, j2 in _cleanup(_opcodes(left, right), left):
         if op == 'equal':
-            html_match += _compose(left[i1:i2])
+            _compose(left[i1:i2], out)
         elif op == 'delete' and include_deletions:
-            html_match += '<del>' + _compose(left[i1:i2]) + '</del>'
+            out.append('<del>')
+            _compose(left[i1:i2], out)
+            out.append('</del>')
         elif op == 'insert' and include_insertions:
-            html_match += '<ins>' + _compose(right[j1:j2]) + '</ins>'
+            out.append('<ins>')
+            _compose(right[j1:j2], out)
+            out.append('</ins>')
         elif op == 'replace':
             if replace_as_delete:
-                html_match += '<del>' + _compose(left[i1:i2]) + '</del>'
+                out.append('<del>')
+                _compose(left[i1:i2], out)
+                out.append('</del>')
             if replace_as_insert:
-                html_match += '<ins>' + _compose(right[j1:j2]) + '</ins>'
+                out.append('<ins>')
+                _compose(right[j1:j2], out)
+                out.append('</ins>')
             if not (replace_as_delete or replace_as_insert):
-                html_match += '<span>' + _compose(right[j1:j2]) + '</span>'
+                out.append('<span>')
+                _compose(right[j1:j2], out)
+                out.append('</span>')
+    html_match = ''.join(out)
 
     carry = []
     lines = []
@@ -94,7 +361,16 @@ def _diff_line_based(left_text, right_text, include_deletions=True,
     return lines
 
 
-@memoize('rev_diff')
+def _make_key(iden, args, kwargs):
+    '''
+    Texts and revisions are never changed, so diffs between them are
+    keyed by their ids (and the version of the renderer).
+    '''
+    ids = [str(getattr(a, 'id', None)) for a in args]
+    return '%s.%s.%s' % (iden, RENDER_VERSION, '.'.join(ids))
+
+
+@memoize('rev_diff', make_key=_make_key, tags=False)
 def comment_revisions_compare(rev_from, rev_to):
     if rev_to is None:
         return render(rev_from.text)
@@ -102,7 +378,7 @@ def comment_revisions_compare(rev_from, rev_to):
                       render(rev_from.text))
 
 
-@memoize('titles_diff')
+@memoize('titles_diff', make_key=_make_key, tags=False)
 def page_titles_compare(text_from, text_to):
     if text_to is None or text_from.id == text_to.id:
         return text_from.title
@@ -110,6 +386,7 @@ def page_titles_compare(text_from, text_to):
                       text_from.title)
 
 
+@memoize('texts_diff', make_key=_make_key, tags=False)
 def page_texts_history_compare(text_from, text_to):
     if text_from.page.function == model.Page.NORM:
         return norm_texts_history_compare(text_from, text_to)
@@ -119,7 +396,7 @@ def page_texts_history_compare(text_from, text_to):
                       render(text_from.text))
 
 
-@memoize('norms_diff')
+@memoize('norms_diff', make_key=_make_key, tags=False)
 def norm_texts_history_compare(text_from, text_to):
     '''
     Note: Inverts from and to inside. Be prepared;)
@@ -132,7 +409,7 @@ def norm_texts_history_compare(text_from, text_to):
     return _line_table(lines)
 
 
-@memoize('norms_diff_inline')
+@memoize('norms_diff_inline', make_key=_make_key, tags=False)
 def norm_texts_inline_compare(text_from, text_to):
     if text_to is None or text_from.id == text_to.id:
         return render_line_based(text_from)
@@ -143,7 +420,7 @@ def norm_texts_inline_compare(text_from, text_to):
     return _line_table(lines)
 
 
-@memoize('normtab_diff')
+@memoize('normtab_diff', make_key=_make_key, tags=False)
 def norm_texts_table_compare(text_from, text_to):
     insertions = _diff_line_based(text_from.text,
                                   text_to.text,
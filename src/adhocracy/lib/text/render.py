@@ -1,65 +1,131 @@
 import cgi
+from hashlib import sha1
+import json
 import re
 
 import markdown
+from sqlalchemy.exc import IntegrityError
 
-from adhocracy import model
+from adhocracy import config, model
 from adhocracy.lib.cache.util import memoize
 from adhocracy.lib.outgoing_link import rewrite_urls
+from adhocracy.lib.queue import async
 
 SUB_USER = re.compile("@([a-zA-Z0-9_\-]{3,255})")
+SUB_PAGE = re.compile("\[\[([^(\]\])]{3,255})\]\]", re.M)
 
+# Part of every render key. Increase it when the markdown output
+# changes, e.g. after updating markdown or its extensions, so that
+# the stored renderings are not used anymore.
+RENDER_VERSION = 1
 
-def user_sub(match):
-    from adhocracy.lib import helpers as h
-    user = model.User.find(match.group(1))
-    if user is not None:
-        return h.user.link(user)
-    return match.group(0)
 
+def _as_id(name):
+    try:
+        return int(name)
+    except ValueError:
+        return None
 
-SUB_PAGE = re.compile("\[\[([^(\]\])]{3,255})\]\]", re.M)
+
+def find_users(htmls):
+    '''
+    Return a dict mapping the user names (or ids) referenced as
+    ``@name`` in *htmls* to the users, loaded with a single query.
+    '''
+    names = set(m.group(1) for html in htmls for m in SUB_USER.finditer(html))
+    users = {}
+    user_names = [n for n in names if _as_id(n) is None]
+    if user_names:
+        for user in model.User.find_all(user_names):
+            users[user.user_name] = user
+    for name in names:
+        if _as_id(name) is not None:
+            users[name] = model.User.find(name)
+    return users
 
 
-def page_sub(match):
+def find_pages(htmls):
+    '''
+    Return a dict mapping the page labels (or ids) referenced as
+    ``[[label]]`` or ``[[label/variant]]`` in *htmls* to the pages.
+    Pages are loaded with a single query, only references that don't
+    match a label or id exactly are looked up one by one by title.
+    '''
+    names = set(m.group(1).split('/', 1)[0]
+                for html in htmls for m in SUB_PAGE.finditer(html))
+    if not names:
+        return {}
+    by_label = {}
+    by_id = {}
+    for page in model.Page.find_all(names, include_deleted=True):
+        by_label[page.label] = page
+        by_id[page.id] = page
+    pages = {}
+    for name in names:
+        id = _as_id(name)
+        page = by_id.get(id) if id is not None else by_label.get(name)
+        if page is None:
+            page = model.Page.find_fuzzy(name, include_deleted=True)
+        pages[name] = page
+    return pages
+
+
+def substitute(html, users, pages):
+    '''
+    Replace user and page references in *html* with links, looking
+    them up in the dicts returned by :func:`find_users` and
+    :func:`find_pages`.
+    '''
     from adhocracy.lib import helpers as h
-    page_name = match.group(1)
-    variant = model.Text.HEAD
-    if '/' in page_name:
-        page_name, variant = page_name.split('/', 1)
-    page = model.Page.find_fuzzy(page_name, include_deleted=True)
-    if page is not None:
-        if page.is_deleted():
-            return page_name
-        return h.page.link(page, variant=variant)
-    else:
+
+    def user_sub(match):
+        user = users.get(match.group(1))
+        if user is not None:
+            return h.user.link(user)
+        return match.group(0)
+
+    def page_sub(match):
+        page_name = match.group(1)
+        variant = model.Text.HEAD
+        if '/' in page_name:
+            page_name, variant = page_name.split('/', 1)
+        page = pages.get(page_name)
+        if page is not None and not page.is_deleted():
+            return h.page.link(page, variant=variant)
         return page_name
 
+    html = SUB_USER.sub(user_sub, html)
+    return SUB_PAGE.sub(page_sub, html)
 
-@memoize('render')
-def render(text, substitutions=True, safe_mode='escape',
-           _testing_allow_user_html=None):
-    '''
-    Render markdown as html.
 
-    *substitutions*
-        If `True`, substitude text reference, e.g. member refs like
-        @(pudo), to html.
-    *safe_mode*
-        This is passed directly to the markdown renderer. Possible options are
-        `'escape'` (escape html tags), `'remove'` (remove html tags),
-        `'adhocracy_config'` (HTML if allowed, escape otherwise).
+def render_options(safe_mode='escape', _testing_allow_user_html=None):
+    '''
+    Return the markdown safe mode for *safe_mode* and whether the
+    html has to be cleaned afterwards.
     '''
-    if text is None:
-        return ""
-
     from adhocracy.lib.helpers.text_helper import getconf_allow_user_html
     allow_user_html = getconf_allow_user_html(_testing_allow_user_html)
     assert safe_mode in ('escape', 'remove', 'adhocracy_config')
     if safe_mode == 'adhocracy_config':
         safe_mode = False if allow_user_html else 'escape'
+    return safe_mode, bool(allow_user_html and not safe_mode)
+
+
+def render_key(text, safe_mode, clean):
+    '''
+    The key of the rendering of *text* with the given options. Equal
+    texts share their rendering.
+    '''
+    options = '%s|%s|%s|' % (RENDER_VERSION, safe_mode, clean)
+    return unicode(sha1(options + text.encode('utf-8')).hexdigest())
+
 
-    text = markdown.markdown(
+def render_markdown(text, safe_mode, clean):
+    '''
+    Render markdown as html, without any substitutions. The result
+    depends on the arguments only and can be stored.
+    '''
+    html = markdown.markdown(
         text,
         extensions=[
             'adhocracy.lib.text.mdx_showmore',
@@ -68,18 +134,167 @@ def render(text, substitutions=True, safe_mode='escape',
         safe_mode=safe_mode,
         enable_attributes=False
     )
-    if substitutions:
-        text = SUB_USER.sub(user_sub, text)
-        text = SUB_PAGE.sub(page_sub, text)
-
-    if allow_user_html and not safe_mode:
+    if clean:
         from lxml.html.clean import Cleaner
-        text = Cleaner(embedded=False,
-                       kill_tags=['embed', 'object']).clean_html(text)
+        html = Cleaner(embedded=False,
+                       kill_tags=['embed', 'object']).clean_html(html)
+    return html
 
-    text = rewrite_urls(text)
 
-    return text
+def _get_cache():
+    try:
+        from pylons import app_globals
+        return app_globals.cache
+    except TypeError:
+        # Probably in tests
+        return None
+
+
+def _output_key(key, substitutions):
+    # substituted links and rewritten urls depend on the instance
+    try:
+        from pylons import tmpl_context as c
+        instance = c.instance.key if c.instance else u''
+    except TypeError:
+        instance = u''
+    data = u'%s|%s|%s' % (key, substitutions, instance)
+    return 'render.' + sha1(data.encode('utf-8')).hexdigest()
+
+
+def render_many(texts, substitutions=True, safe_mode='escape',
+                _testing_allow_user_html=None):
+    '''
+    Render a list of markdown texts as html, see :func:`render` for
+    the arguments.
+
+    Finished html is looked up in memcached by the hash of the text
+    and the options. For the remaining texts, the markdown renderings
+    are looked up in the :class:`adhocracy.model.RenderedText` store
+    with a single query, and missing ones are rendered and stored by a
+    background job if a queue is configured. User and page references
+    of all these texts are resolved with one query per type.
+    '''
+    safe_mode, clean = render_options(safe_mode, _testing_allow_user_html)
+    keys = [render_key(text, safe_mode, clean) if text is not None else None
+            for text in texts]
+    pending = set(filter(None, keys))
+
+    results = {}
+    cache = _get_cache()
+    if cache is not None and pending:
+        output_keys = dict((key, _output_key(key, substitutions))
+                           for key in pending)
+        cached = cache.get_multi(output_keys.values())
+        for key in list(pending):
+            if output_keys[key] in cached:
+                results[key] = cached[output_keys[key]]
+                pending.discard(key)
+
+    if pending:
+        rendered = model.RenderedText.find_all(pending)
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key in pending and key not in rendered:
+                missing[key] = rendered[key] = render_markdown(
+                    text, safe_mode, clean)
+        if missing and _store_in_background():
+            store_rendered.enqueue(json.dumps(missing))
+
+        if substitutions:
+            htmls = [rendered[key] for key in pending]
+            users = find_users(htmls)
+            pages = find_pages(htmls)
+        for key in pending:
+            html = rendered[key]
+            if substitutions:
+                html = substitute(html, users, pages)
+            results[key] = rewrite_urls(html)
+
+        if cache is not None:
+            cache.set_multi(dict((output_keys[key], results[key])
+                                 for key in pending))
+
+    return [results[key] if key is not None else "" for key in keys]
+
+
+def render(text, substitutions=True, safe_mode='escape',
+           _testing_allow_user_html=None):
+    '''
+    Render markdown as html.
+
+    *substitutions*
+        If `True`, substitude text reference, e.g. member refs like
+        @(pudo), to html.
+    *safe_mode*
+        This is passed directly to the markdown renderer. Possible options are
+        `'escape'` (escape html tags), `'remove'` (remove html tags),
+        `'adhocracy_config'` (HTML if allowed, escape otherwise).
+    '''
+    return render_many([text], substitutions=substitutions,
+                       safe_mode=safe_mode,
+                       _testing_allow_user_html=_testing_allow_user_html)[0]
+
+
+def prefetch(texts):
+    '''
+    Render *texts* into memcached in one go, so that rendering them
+    one by one afterwards only hits memcached.
+    '''
+    if _get_cache() is not None:
+        render_many(texts)
+
+
+def _store_in_background():
+    # Without a queue the job would run within the request and add its
+    # rows to the session of the request.
+    from adhocracy.lib import queue
+    return (queue.rq_config is not None and queue.rq_config.queue is not None
+            and not config.get_bool('adhocracy.readonly'))
+
+
+@async
+def store_rendered(data):
+    rendered = json.loads(data)
+    try:
+        model.RenderedText.store(rendered)
+        model.meta.Session.commit()
+    except IntegrityError:
+        # Another job stored some of the renderings first, they are
+        # skipped now.
+        model.meta.Session.rollback()
+        model.RenderedText.store(rendered)
+
+
+def prerender_many(entities):
+    '''
+    Store the markdown renderings of ``Text`` and ``Revision`` objects
+    with the default options when they are created.
+    '''
+    safe_mode, clean = render_options()
+    texts = set(e.text for e in entities if e.text is not None)
+    keys = dict((render_key(text, safe_mode, clean), text) for text in texts)
+    present = model.RenderedText.find_all(keys.keys())
+    missing = dict((key, render_markdown(text, safe_mode, clean))
+                   for key, text in keys.items() if key not in present)
+    if missing and _store_in_background():
+        store_rendered.enqueue(json.dumps(missing))
+
+
+def prerender(entity):
+    prerender_many([entity])
+
+
+def init_render():
+    '''
+    Register the callbacks that store the renderings of new texts and
+    comment revisions.
+    '''
+    from adhocracy.lib.queue import LISTENERS, BATCH_LISTENERS
+    from adhocracy.model import INSERT
+    for cls in (model.Text, model.Revision):
+        if prerender not in LISTENERS[(cls, INSERT)]:
+            LISTENERS[(cls, INSERT)].append(prerender)
+    BATCH_LISTENERS[prerender] = prerender_many
 
 
 def _line_table(lines):
@@ -64,6 +64,10 @@ def list(topic, root=None, comments=None, variant=None, recurse=True,
     cached = c.user is None
     if comments is None:
         comments = topic.comments
+    if root is None:
+        # nested lists render replies from the same comments
+        text.prefetch([comment.latest.text for comment in comments
+                       if comment.latest])
     return render_tile('/comment/tiles.html', 'list', tile=None,
                        comments=comments, topic=topic,
                        variant=variant, root=root, recurse=recurse,
@@ -127,7 +127,7 @@ class PollTile(BaseTile):
     @property
     def decision(self):
         if not self.__decision and c.user:
-            self.__decision = democracy.Decision(c.user, self.poll)
+            self.__decision = democracy.Decision.cached(c.user, self.poll)
         return self.__decision
 
     @property
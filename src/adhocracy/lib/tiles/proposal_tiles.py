@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from pylons import tmpl_context as c
+from sqlalchemy.orm import subqueryload
 
+from adhocracy import model
 from adhocracy.lib.auth import authorization
 from adhocracy.lib.democracy import Decision
 from adhocracy.lib.tiles.util import render_tile
@@ -50,6 +52,29 @@ class ProposalTile(DelegateableTile):
         return self.__num_principals
 
 
+def prefetch(proposals):
+    '''
+    Load what the rows of the *proposals* need with a few queries:
+    Their descriptions, adoption polls and selections, the latest
+    tallies of their polls and the decisions of the current user.
+    '''
+    proposals = [p for p in proposals if p]
+    if not proposals:
+        return
+    q = model.meta.Session.query(model.Proposal)
+    q = q.filter(model.Proposal.id.in_([p.id for p in proposals]))
+    q = q.options(subqueryload(model.Proposal.description),
+                  subqueryload(model.Proposal.adopt_poll),
+                  subqueryload(model.Proposal._selections))
+    q.all()
+
+    polls = [poll for p in proposals for poll in (p.rate_poll, p.adopt_poll)
+             if poll is not None]
+    model.Tally.prefetch_latest(polls)
+    if c.user:
+        Decision.prefetch(c.user, polls)
+
+
 def row(proposal):
     global_admin = authorization.has('global.admin')
     if not proposal:
@@ -1,6 +1,8 @@
+from datetime import datetime
 import logging
 
 from pylons import tmpl_context as c
+from sqlalchemy import or_
 
 from adhocracy.model import meta, Watch, Comment, Delegateable
 import adhocracy.model.refs as refs
@@ -44,33 +46,75 @@ def clean_stale_watches():
         log.debug("Removed %d stale watchlist entries." % count)
 
 
-def traverse_watchlist(entity):
+def _outer_entities(entity):
     """
-    Traverse the watchlist for all affected topics. Returns only
-    the most closely matching watchlist entries.
+    The entities whose watches also apply to *entity*, in the order
+    :func:`traverse_watchlist` merges them.
     """
-
-    def merge(outer, inner):
-        return inner + [w for w in outer if
-                        not w.user in [w.user for w in inner]]
-
-    watches = Watch.all_by_entity(entity)
-
     if isinstance(entity, Comment):
         if entity.reply is not None:
-            watches = merge(watches,
-                            traverse_watchlist(entity.reply))
-        else:
-            watches = merge(watches,
-                            traverse_watchlist(entity.topic))
+            return [entity.reply]
+        return [entity.topic]
     elif isinstance(entity, Delegateable):
+        outer = []
         if entity.milestone is not None and not entity.milestone.is_deleted():
-            watches = merge(watches, traverse_watchlist(entity.milestone))
+            outer.append(entity.milestone)
         if len(entity.parents):
-            for parent in entity.parents:
-                watches = merge(watches,
-                                traverse_watchlist(parent))
+            outer.extend(entity.parents)
         else:
-            watches = merge(watches,
-                            traverse_watchlist(entity.instance))
+            outer.append(entity.instance)
+        return outer
+    return []
+
+
+def prefetch_watches(entities):
+    """
+    Load the watches for all *entities* and the entities
+    :func:`traverse_watchlist` visits from them with a single query.
+
+    Returns a dict mapping entity references to lists of ``Watch``
+    objects, to be passed to :func:`traverse_watchlist` as *cache*.
+    """
+    cache = {}
+    stack = list(entities)
+    while stack:
+        entity = stack.pop()
+        ref = refs.to_ref(entity)
+        if ref is None or ref in cache:
+            continue
+        cache[ref] = []
+        stack.extend(_outer_entities(entity))
+    if not cache:
+        return cache
+
+    q = meta.Session.query(Watch)
+    q = q.filter(Watch.entity_ref.in_(cache.keys()))
+    q = q.filter(or_(Watch.delete_time == None,  # noqa
+                     Watch.delete_time > datetime.utcnow()))
+    for watch in q:
+        cache[watch.entity_ref].append(watch)
+    return cache
+
+
+def traverse_watchlist(entity, cache=None):
+    """
+    Traverse the watchlist for all affected topics. Returns only
+    the most closely matching watchlist entries.
+
+    If a *cache* from :func:`prefetch_watches` is given, the watches
+    are looked up there instead of being queried.
+    """
+
+    def merge(outer, inner):
+        users = set(w.user for w in inner)
+        return inner + [w for w in outer if w.user not in users]
+
+    ref = refs.to_ref(entity)
+    if cache is not None and ref in cache:
+        watches = list(cache[ref])
+    else:
+        watches = Watch.all_by_entity(entity)
+
+    for outer in _outer_entities(entity):
+        watches = merge(watches, traverse_watchlist(outer, cache=cache))
     return watches
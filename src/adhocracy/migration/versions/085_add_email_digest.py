@@ -0,0 +1,20 @@
+from sqlalchemy import Column, MetaData, Table
+from sqlalchemy import Unicode
+
+metadata = MetaData()
+
+
+def upgrade(migrate_engine):
+    metadata.bind = migrate_engine
+
+    user_table = Table('user', metadata, autoload=True)
+    email_digest = Column('email_digest', Unicode(10), nullable=True)
+    email_digest.create(user_table)
+
+    notification_table = Table('notification', metadata, autoload=True)
+    digest = Column('digest', Unicode(10), nullable=True, index=True)
+    digest.create(notification_table)
+
+
+def downgrade(migrate_engine):
+    raise NotImplementedError()
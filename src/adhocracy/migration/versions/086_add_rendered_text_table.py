@@ -0,0 +1,20 @@
+from sqlalchemy import MetaData, Column, Table
+from sqlalchemy import DateTime, Unicode, UnicodeText
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    rendered_text_table = Table(
+        'rendered_text', meta,
+        Column('key', Unicode(40), primary_key=True),
+        Column('html', UnicodeText(), nullable=False),
+        Column('create_time', DateTime),
+    )
+
+    rendered_text_table.create()
+
+
+def downgrade(migrate_engine):
+    raise NotImplementedError()
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, ForeignKey, MetaData, Table
+from sqlalchemy import Integer, UnicodeText
+
+metadata = MetaData()
+
+
+def upgrade(migrate_engine):
+    metadata.bind = migrate_engine
+
+    text_table = Table('text', metadata, autoload=True)
+    base_id = Column('base_id', Integer, ForeignKey('text.id'),
+                     nullable=True)
+    base_id.create(text_table)
+    delta = Column('delta', UnicodeText(), nullable=True)
+    delta.create(text_table)
+
+    revision_table = Table('revision', metadata, autoload=True)
+    base_id = Column('base_id', Integer, ForeignKey('revision.id'),
+                     nullable=True)
+    base_id.create(revision_table)
+    delta = Column('delta', UnicodeText(), nullable=True)
+    delta.create(revision_table)
+    revision_table.c.text.alter(nullable=True)
+
+
+def downgrade(migrate_engine):
+    raise NotImplementedError()
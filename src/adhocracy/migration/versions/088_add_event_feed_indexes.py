@@ -0,0 +1,18 @@
+from sqlalchemy import Index, MetaData, Table
+
+metadata = MetaData()
+
+
+def upgrade(migrate_engine):
+    metadata.bind = migrate_engine
+
+    event_table = Table('event', metadata, autoload=True)
+    Index('ix_event_time', event_table.c.time).create(migrate_engine)
+    Index('ix_event_instance_id_time', event_table.c.instance_id,
+          event_table.c.time).create(migrate_engine)
+    Index('ix_event_user_id_time', event_table.c.user_id,
+          event_table.c.time).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    raise NotImplementedError()
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, ForeignKey, Index, MetaData, Table
+from sqlalchemy import DateTime, Integer, select
+
+metadata = MetaData()
+
+
+def upgrade(migrate_engine):
+    metadata.bind = migrate_engine
+
+    event_table = Table('event', metadata, autoload=True)
+    notification_table = Table('notification', metadata, autoload=True)
+    event_time = Column('event_time', DateTime, nullable=True)
+    event_time.create(notification_table)
+    instance_id = Column('instance_id', Integer, ForeignKey('instance.id'),
+                         nullable=True)
+    instance_id.create(notification_table)
+
+    def event(column):
+        return select([column]).where(
+            event_table.c.id == notification_table.c.event_id).as_scalar()
+
+    migrate_engine.execute(notification_table.update().values(
+        event_time=event(event_table.c.time),
+        instance_id=event(event_table.c.instance_id)))
+
+    Index('ix_notification_user_id_event_time',
+          notification_table.c.user_id,
+          notification_table.c.event_time).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    raise NotImplementedError()
@@ -1,7 +1,7 @@
 """The application's model objects"""
 from sqlalchemy import orm, and_
 from sqlalchemy import event as sa_event
-from sqlalchemy.orm import mapper, relation, backref, synonym
+from sqlalchemy.orm import mapper, relation, backref, deferred, synonym
 
 import meta
 
@@ -29,7 +29,7 @@ from adhocracy.model.group import Group, group_table
 from adhocracy.model.permission import (Permission, group_permission_table,
                                         permission_table)
 from adhocracy.model.delegateable import (Delegateable, delegateable_table,
-                                          category_graph)
+                                          category_graph, ScopeTree)
 from adhocracy.model.delegation import Delegation, delegation_table
 from adhocracy.model.proposal import Proposal, proposal_table
 from adhocracy.model.poll import Poll, poll_table
@@ -52,6 +52,7 @@ from adhocracy.model.milestone import Milestone, milestone_table
 from adhocracy.model.selection import Selection, selection_table
 from adhocracy.model.staticpage import StaticPage, staticpage_table
 from adhocracy.model.requestlog import RequestLog, requestlog_table
+from adhocracy.model.rendered_text import RenderedText, rendered_text_table
 from adhocracy.model.message import Message, message_table
 from adhocracy.model.message import MessageRecipient, message_recipient_table
 from adhocracy.model.votedetail import votedetail_table
@@ -318,6 +319,8 @@ mapper(Comment, comment_table, properties={
 
 
 mapper(Revision, revision_table, properties={
+    '_text': revision_table.c.text,
+    'delta': deferred(revision_table.c.delta),
     'user': relation(
         User, lazy=True,
         primaryjoin=revision_table.c.user_id == user_table.c.id,
@@ -423,13 +426,15 @@ mapper(Notification, notification_table, properties={
     'event': relation(Event),
     'user': relation(User, lazy=False),
     'watch': relation(Watch, lazy=True),
+    'instance': relation(Instance, lazy=True),
 })
 
 
 mapper(Tally, tally_table, properties={
     'poll': relation(
         Poll, backref=backref('tallies',
-                              order_by=tally_table.c.create_time.desc(),
+                              order_by=[tally_table.c.create_time.desc(),
+                                        tally_table.c.id.desc()],
                               lazy=True)),
     'vote': relation(Vote, backref=backref('tally', uselist=False))
 })
@@ -456,11 +461,14 @@ mapper(Tagging, tagging_table, properties={
 
 
 mapper(Text, text_table, properties={
+    '_text': text_table.c.text,
+    'delta': deferred(text_table.c.delta),
     'user': relation(
         User, lazy=True,
         primaryjoin=text_table.c.user_id == user_table.c.id),
     'child': relation(
         Text,
+        primaryjoin=text_table.c.child_id == text_table.c.id,
         remote_side=[text_table.c.id],
         uselist=False,
         backref=backref('parent', uselist=False)),
@@ -489,6 +497,8 @@ mapper(Selection, selection_table, properties={
 
 mapper(RequestLog, requestlog_table)
 
+mapper(RenderedText, rendered_text_table)
+
 mapper(StaticPage, staticpage_table)
 
 
@@ -534,19 +544,41 @@ def before_flush(session, flush_context, instances):
 
 def before_commit(session):
     from adhocracy.lib import cache
+    from adhocracy.lib import queue
 
     session.flush()
     if not hasattr(session, '_object_cache'):
         return
 
-    for operation, entities in session._object_cache.items():
-        while len(entities) > 0:
-            entity = entities.pop()
+    # Listeners that are executed synchronously may flush new changes
+    # into the object cache, so repeat until it is empty.
+    while any(session._object_cache.values()):
+        updates = []
+        changed = []
+        for operation, entities in session._object_cache.items():
+            while len(entities) > 0:
+                entity = entities.pop()
+
+                if operation in [UPDATE, DELETE]:
+                    changed.append(entity)
+                    if isinstance(entity, Instance):
+                        session.info.setdefault('changed_instances',
+                                                set()).add(entity.id)
+
+                updates.extend(related_updates(entity, operation))
+        cache.invalidate_many(changed)
+        queue.update_entities(updates)
 
-            if operation in [UPDATE, DELETE]:
-                cache.invalidate(entity)
 
-            post_update(entity, operation)
+def after_commit(session):
+    from adhocracy.lib.instance.discriminator import forget_instance
+
+    if session.transaction is not None and session.transaction.nested:
+        return
+    # Requests may have found the old row of a changed instance between
+    # before_commit and the commit, so forget it again.
+    for instance_id in session.info.pop('changed_instances', ()):
+        forget_instance(instance_id)
 
 
 def post_update(entity, operation):
@@ -554,17 +586,23 @@ def post_update(entity, operation):
     Post an update task for the entity and any related objects.
     '''
     from adhocracy.lib import queue
-    queue.update_entity(entity, operation)
+    queue.update_entities(related_updates(entity, operation))
+
+
+def related_updates(entity, operation):
+    '''
+    Return a list of (entity, operation) tuples for the entity and any
+    related objects that have to be updated with it. Duplicates are
+    removed by :func:`adhocracy.lib.queue.update_entities`.
+    '''
+    updates = [(entity, operation)]
 
     ## Do subsequent updates to reindex related content
-    # NOTE: This may post duplicate update tasks if an entity
-    # is part of the session, and also updated depending on
-    # another entity. Ignored for now cause the real work
-    # is asynchronous and (probably) not expensive.
     # NOTE: Move the decisions about which other objects to
     # update to the models
     if isinstance(entity, Poll):
-        queue.update_entity(entity.scope, UPDATE)
+        updates.append((entity.scope, UPDATE))
+    return updates
 
 
 def init_model(engine):
@@ -578,3 +616,24 @@ def init_model(engine):
 
     sa_event.listen(meta.Session, "before_commit", before_commit)
     sa_event.listen(meta.Session, "before_flush", before_flush)
+    sa_event.listen(meta.Session, "after_flush", count_flush)
+
+    sa_event.listen(meta.Session, "after_commit", after_commit)
+    sa_event.listen(meta.Session, "after_commit", ScopeTree.clear_cache)
+    sa_event.listen(meta.Session, "after_soft_rollback",
+                    ScopeTree.clear_cache)
+    for attr in (Delegateable.parents, Delegateable.children):
+        for name in ('append', 'remove', 'set'):
+            sa_event.listen(attr, name, clear_scope_trees, propagate=True)
+
+
+def count_flush(session, flush_context):
+    """
+    Count the flushes of the session, so that results computed before
+    changes were written can be told apart from newer ones.
+    """
+    session.info['flushes'] = session.info.get('flushes', 0) + 1
+
+
+def clear_scope_trees(*args):
+    ScopeTree.clear_cache()
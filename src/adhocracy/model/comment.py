@@ -106,10 +106,14 @@ class Comment(meta.Indexable):
     def create_revision(self, text, user, sentiment=0,
                         create_time=None):
         from revision import Revision
+        previous = None
+        if self.revisions:
+            previous = max(self.revisions, key=lambda r: r.id)
         rev = Revision(self, user, text)
         rev.sentiment = sentiment
         if create_time is not None:
             rev.create_time = create_time
+        rev.store_delta(previous)
         meta.Session.add(rev)
         self.revisions.append(rev)
         meta.Session.flush()
@@ -7,6 +7,7 @@ be able to delegate the voting to another user (
 SQLAlchemy's `joint table inheritance` is used.
 """
 
+from collections import defaultdict
 from datetime import datetime
 import logging
 
@@ -27,6 +28,121 @@ category_graph = Table(
 )
 
 
+class ScopeTree(object):
+    """
+    The category tree of ``Delegateable`` objects, held in memory to
+    answer ``Delegateable.is_super``, ``Poll.within_scope`` and related
+    specificity questions without lazy loading each level of the tree.
+
+    :param parents: A dict mapping a delegateable id to the ids of its
+        ``parents``.
+    """
+
+    def __init__(self, parents):
+        self.parents = parents
+        self.children = defaultdict(list)
+        for child_id, parent_ids in parents.items():
+            for parent_id in parent_ids:
+                self.children[parent_id].append(child_id)
+        self._ancestors = {}
+        self._descendants = {}
+
+    @classmethod
+    def load(cls, instance=None):
+        """
+        Load the category tree with a single query.
+
+        :param instance: Only load the tree of this ``Instance``.
+        """
+        # Note that the columns of category_graph are named the other
+        # way round than the ``parents`` and ``children`` relations.
+        q = meta.Session.query(category_graph.c.parent_id,
+                               category_graph.c.child_id)
+        if instance is not None:
+            q = q.filter(category_graph.c.parent_id == Delegateable.id)
+            q = q.filter(Delegateable.instance_id == instance.id)
+        parents = defaultdict(list)
+        for (child_id, parent_id) in q:
+            parents[child_id].append(parent_id)
+        return cls(parents)
+
+    @classmethod
+    def for_instance(cls, instance):
+        """
+        The tree of the ``Instance``, loaded once per session. It is
+        dropped when the category graph is changed and when the session
+        is committed or rolled back (see :func:`clear_cache`).
+        """
+        trees = meta.Session().info.setdefault('scope_trees', {})
+        key = instance.id if instance is not None else None
+        if key not in trees:
+            trees[key] = cls.load(instance)
+        return trees[key]
+
+    @classmethod
+    def clear_cache(cls, session=None, *args):
+        if session is None:
+            session = meta.Session()
+        session.info.pop('scope_trees', None)
+
+    def _walk(self, edges, scope_id):
+        chain = [scope_id]
+        seen = set(chain)
+        for current in chain:
+            for next_id in edges.get(current, []):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    chain.append(next_id)
+        return chain
+
+    def chain(self, scope_id, recurse=True):
+        """
+        The ids of the given scope and (if ``recurse``) all of its
+        parents in breadth-first order.
+        """
+        if not recurse:
+            return [scope_id]
+        return self._walk(self.parents, scope_id)
+
+    def ancestors(self, scope_id):
+        """
+        The ids of all scopes that are (transitively) broader than the
+        given scope.
+        """
+        if scope_id not in self._ancestors:
+            self._ancestors[scope_id] = set(self.chain(scope_id)[1:])
+        return self._ancestors[scope_id]
+
+    def descendants(self, scope_id):
+        """
+        The ids of all scopes that are (transitively) more specific than
+        the given scope.
+        """
+        if scope_id not in self._descendants:
+            self._descendants[scope_id] = set(
+                self._walk(self.children, scope_id)[1:])
+        return self._descendants[scope_id]
+
+    def is_super(self, scope_id, other_id):
+        """
+        In-memory equivalent of ``Delegateable.is_super``.
+        """
+        return scope_id in self.ancestors(other_id)
+
+    def filter_less_specific_delegations(self, delegations):
+        """
+        Given a set of delegations, remove those that are overriden by
+        others. See
+        :meth:`DelegationNode.filter_less_specific_delegations`.
+        """
+        matches = list(delegations)
+        for d in delegations:
+            for m in matches:
+                if self.is_super(m.scope_id, d.scope_id):
+                    matches.remove(m)
+        return matches
+
+
 delegateable_table = Table(
     'delegateable', meta.data,
     Column('id', Integer, primary_key=True),
@@ -57,13 +173,8 @@ class Delegateable(meta.Indexable):
         return u"<Delegateable(%d,%s)>" % (self.id, self.instance.key)
 
     def is_super(self, delegateable):
-        if delegateable in self.children:
-            return True
-        for child in self.children:
-            r = child.is_super(delegateable)
-            if r:
-                return True
-        return False
+        scopes = ScopeTree.for_instance(self.instance)
+        return scopes.is_super(self.id, delegateable.id)
 
     def is_sub(self, delegateable):
         return delegateable.is_super(self)
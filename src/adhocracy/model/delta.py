@@ -0,0 +1,125 @@
+"""
+Delta storage for the history of texts and comment revisions.
+
+If ``adhocracy.delta_storage`` is enabled, a new revision is stored as
+the difference to a full snapshot of an earlier revision of the same
+chain (the revisions of a page variant or of a comment). Every
+``adhocracy.delta_storage.snapshot_interval`` revisions a new snapshot
+is stored. The newest revision keeps its full text as well, so reading
+the current version never needs the delta. When it is superseded, its
+full text is dropped.
+
+Revisions stored before the option was enabled are left as they are.
+"""
+from difflib import SequenceMatcher
+import json
+
+from adhocracy import config
+from adhocracy.model import meta
+
+
+def make_delta(base, text):
+    """
+    Encode *text* relative to *base* as a JSON list of lines ranges
+    ``[start, stop]`` copied from *base* and strings of new lines.
+    """
+    base_lines = base.splitlines(True)
+    lines = text.splitlines(True)
+    matcher = SequenceMatcher(None, base_lines, lines, autojunk=False)
+    ops = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == 'equal':
+            ops.append([i1, i2])
+        elif j1 < j2:
+            ops.append(u''.join(lines[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def apply_delta(base, delta):
+    """
+    Reconstruct the text encoded with :func:`make_delta`.
+    """
+    base_lines = base.splitlines(True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            parts.extend(base_lines[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return u''.join(parts)
+
+
+class DeltaStorage(object):
+    """
+    Mixin for mapped classes with a ``base_id`` and a ``delta`` column,
+    which map their text column as ``_text``. Provides the ``text``
+    attribute, which is reconstructed from the snapshot ``base_id``
+    if only the delta is stored.
+    """
+
+    _reconstructed = None
+
+    def _get_text(self):
+        if self._text is not None or self.base_id is None:
+            return self._text
+        if self._reconstructed is None:
+            cls = type(self)
+            q = meta.Session.query(cls.id, cls._text, cls.delta)
+            rows = dict((row[0], row) for row in
+                        q.filter(cls.id.in_([self.id, self.base_id])))
+            self._reconstructed = apply_delta(rows[self.base_id][1],
+                                              rows[self.id][2])
+        return self._reconstructed
+
+    def _set_text(self, text):
+        self._text = text
+        self._reconstructed = None
+
+    text = property(_get_text, _set_text)
+
+    def detach_dependents(self):
+        """
+        Store the full text in all revisions that are stored as delta
+        to this one, so it can be deleted.
+        """
+        cls = type(self)
+        for dependent in meta.Session.query(cls).filter(
+                cls.base_id == self.id):
+            dependent.text = dependent.text
+            dependent.base_id = None
+            dependent.delta = None
+        meta.Session.flush()
+
+    def store_delta(self, previous):
+        """
+        Store the text as delta if delta storage is enabled. *previous*
+        is the former newest revision of the chain, which doesn't keep
+        its full text anymore unless it's a snapshot.
+        """
+        if (previous is None or previous.id is None
+                or not config.get_bool('adhocracy.delta_storage')):
+            return
+        if previous.base_id is not None and previous._text is not None:
+            previous._reconstructed = previous._text
+            previous._text = None
+        if self._text is None:
+            return
+
+        cls = type(self)
+        snapshot_id = previous.base_id or previous.id
+        interval = config.get_int('adhocracy.delta_storage.snapshot_interval')
+        q = meta.Session.query(cls).filter(cls.base_id == snapshot_id)
+        if q.count() + 1 >= interval:
+            return
+        if previous.base_id is None:
+            base = previous._text
+        else:
+            q = meta.Session.query(cls._text).filter(cls.id == snapshot_id)
+            base = q.scalar()
+        if base is None:
+            return
+        delta = make_delta(base, self._text)
+        if len(delta) >= len(self._text):
+            return
+        self.base_id = snapshot_id
+        self.delta = delta
@@ -1,7 +1,7 @@
 from datetime import datetime
 import logging
 
-from sqlalchemy import Table, Column, ForeignKey
+from sqlalchemy import Table, Column, ForeignKey, Index, and_, or_
 from sqlalchemy import DateTime, Integer, Unicode, UnicodeText
 from sqlalchemy.orm import reconstructor
 
@@ -15,6 +15,8 @@ from instance import Instance
 
 log = logging.getLogger(__name__)
 
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
 
 event_topic_table = Table(
     'event_topic', meta.data,
@@ -35,6 +37,12 @@ event_table = Table(
     Column('instance_id', Integer, ForeignKey('instance.id'), nullable=True)
 )
 
+# for the activity feeds, see Event.feed
+Index('ix_event_time', event_table.c.time)
+Index('ix_event_instance_id_time', event_table.c.instance_id,
+      event_table.c.time)
+Index('ix_event_user_id_time', event_table.c.user_id, event_table.c.time)
+
 
 class Event(object):
 
@@ -76,15 +84,26 @@ class Event(object):
     def _get_event(self):
         try:
             import adhocracy.lib.event.types as types
-            for etype in types.TYPES:
-                if str(etype) == self._event:
-                    return etype
-            return None
+            return types.TYPE_MAPPINGS.get(self._event)
         except ImportError:
             return None
 
     event = property(_get_event)
 
+    @classmethod
+    def prefetch(cls, events):
+        '''
+        Resolve the references in the data of all *events* with one
+        query per entity type instead of one query per reference.
+        '''
+        events = [e for e in events if e is not None]
+        entities = refs.resolve_refs([e._ref_data for e in events])
+        for event in events:
+            for attr, val in event._ref_data.items():
+                if attr not in event._deref_data:
+                    event._deref_data[attr] = refs.complex_to_entities(
+                        val, entities=entities)
+
     @classmethod
     def all_q(cls, instance=None, include_hidden=False, event_filter=[]):
         query = meta.Session.query(Event)
@@ -94,7 +113,8 @@ class Event(object):
         elif not include_hidden:
             # inner join+filter would remove the rows with instance=None here
             query = query.outerjoin(Instance)  # noqa
-            query = query.except_(query.filter(Instance.hidden == True))  # noqa
+            query = query.filter(or_(Instance.hidden == None,  # noqa
+                                     Instance.hidden == False))  # noqa
 
         if event_filter:
             query = query.filter(Event.event.in_(event_filter))
@@ -105,6 +125,39 @@ class Event(object):
 
         return query
 
+    @classmethod
+    def feed(cls, query, limit=50, before=None):
+        '''
+        Return at most *limit* events of *query*, newest first. If the
+        cursor *before* (see :attr:`cursor`) is given, only events
+        older than the event it identifies are returned. Paging by
+        time and id instead of an offset keeps older pages as cheap
+        as the first one.
+        '''
+        query = query.order_by(Event.time.desc(), Event.id.desc())
+        if before is not None:
+            time, id = before
+            query = query.filter(or_(Event.time < time,
+                                     and_(Event.time == time,
+                                          Event.id < id)))
+        return query.limit(limit).all()
+
+    @property
+    def cursor(self):
+        return u'%s_%s' % (self.time.strftime(CURSOR_TIME_FORMAT), self.id)
+
+    @classmethod
+    def parse_cursor(cls, cursor):
+        '''
+        Return the (time, id) tuple encoded in *cursor* or `None` if it
+        isn't a valid cursor.
+        '''
+        try:
+            time, id = cursor.split(u'_')
+            return datetime.strptime(time, CURSOR_TIME_FORMAT), int(id)
+        except (AttributeError, ValueError):
+            return None
+
     @classmethod
     def find(cls, id, instance_filter=True, include_deleted=False,
              include_hidden=True):
@@ -142,9 +195,7 @@ class Event(object):
     @classmethod
     def find_by_instance(cls, instance, limit=50, include_hidden=True):
         q = cls.all_q(instance=instance, include_hidden=include_hidden)
-        q = q.order_by(Event.time.desc())
-        q = q.limit(limit)
-        return q.all()
+        return cls.feed(q, limit=limit)
 
     def text(self):
         text = None
@@ -1,9 +1,11 @@
+from datetime import datetime
 import os.path
 import logging
 
-from sqlalchemy import Table, Column, ForeignKey
-from sqlalchemy import Integer, Unicode
+from sqlalchemy import Table, Column, ForeignKey, Index
+from sqlalchemy import DateTime, Integer, Unicode
 from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import joinedload
 
 from pylons.i18n import _
 
@@ -20,9 +22,18 @@ notification_table = Table(
     Column('event_type', Unicode(255), nullable=True),
     Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
     Column('watch_id', Integer, ForeignKey('watch.id'), nullable=True),
+    # the digest frequency the notification is pending for, if any
+    Column('digest', Unicode(10), nullable=True, index=True),
+    # copied from the event, so the timeline of a user can be read
+    # without joining the events
+    Column('event_time', DateTime, default=datetime.utcnow),
+    Column('instance_id', Integer, ForeignKey('instance.id'), nullable=True),
     UniqueConstraint('event_id', 'user_id'),
 )
 
+Index('ix_notification_user_id_event_time', notification_table.c.user_id,
+      notification_table.c.event_time)
+
 
 class Notification(object):
     """ Notification class connects events to their recipients.
@@ -66,6 +77,23 @@ class Notification(object):
             self.event_type = self._type.code
         self.user = user
         self.watch = watch
+        self.event_time = event.time or datetime.utcnow()
+        self.instance = event.instance
+
+    @classmethod
+    def timeline(cls, user, instance=None, event_filter=[], limit=None):
+        '''
+        Return the stored notifications of *user*, newest event first,
+        together with their events.
+        '''
+        q = meta.Session.query(cls).filter(cls.user == user)
+        if event_filter:
+            q = q.filter(cls.event_type.in_(event_filter))
+        if instance is not None:
+            q = q.filter(cls.instance == instance)
+        q = q.order_by(cls.event_time.desc(), cls.id.desc())
+        q = q.options(joinedload(cls.event))
+        return q.limit(limit).all()
 
     def get_type(self):
         from adhocracy.lib.event.types import TYPE_MAPPINGS
@@ -95,6 +95,32 @@ class Page(Delegateable):
             log.warn("find(%s): %s" % (id, e))
             return None
 
+    @classmethod
+    def find_all(cls, ids, instance_filter=True, include_deleted=False):
+        '''
+        Like :meth:`find` for many ids or labels with a single query.
+        '''
+        ids = set(ids)
+        if not ids:
+            return []
+        conditions = [Page.label.in_(ids)]
+        numeric = []
+        for id in ids:
+            try:
+                numeric.append(int(id))
+            except ValueError:
+                pass
+        if numeric:
+            conditions.append(Page.id.in_(numeric))
+        q = meta.Session.query(Page)
+        q = q.filter(or_(*conditions))
+        if not include_deleted:
+            q = q.filter(or_(Page.delete_time == None,  # noqa
+                             Page.delete_time > datetime.utcnow()))
+        if ifilter.has_instance() and instance_filter:
+            q = q.filter(Page.instance == ifilter.get_instance())
+        return q.all()
+
     @classmethod
     def all_q(cls, instance=None, functions=[], exclude=[],
               include_deleted=False):
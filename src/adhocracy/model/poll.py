@@ -47,6 +47,8 @@ class Poll(object):
         self._tally = None
         self._stable = {}
         self._selection = None
+        # decisions by user id, see Decision.prefetch
+        self._decisions = {}
         self.subject = subject
 
     @reconstructor
@@ -55,6 +57,7 @@ class Poll(object):
         self._tally = None
         self._stable = {}
         self._selection = None
+        self._decisions = {}
 
     def _get_subject(self):
         import refs
@@ -192,11 +195,9 @@ class Poll(object):
 
     @classmethod
     def within_scope(cls, scope):
-        def _crawl(scope):
-            l = [scope]
-            [l.extend(_crawl(c)) for c in scope.children]
-            return l
-        scope_ids = [s.id for s in _crawl(scope)]
+        from delegateable import ScopeTree
+        scopes = ScopeTree.for_instance(scope.instance)
+        scope_ids = [scope.id] + list(scopes.descendants(scope.id))
         q = meta.Session.query(Poll)
         q = q.filter(Poll.scope_id.in_(scope_ids))
         q = q.filter(or_(Poll.end_time == None,  # noqa
@@ -273,11 +273,56 @@ def complex_to_refs(obj):
     return _ify(to_ref, obj)
 
 
-def complex_to_entities(refs):
+def complex_to_entities(refs, entities=None):
     '''Resolve model instances from a list or dict of references.
     `refs`
       A list or dict of references.
+    `entities`
+      Optional dict of already resolved references as returned by
+      :func:`resolve_refs`. References not in it are resolved one by
+      one.
     For details see :func:`to_entity'. Note that the default values
     for the additional parameter of `to_entity` will be used.
     '''
-    return _ify(to_entity, refs)
+    if entities is None:
+        return _ify(to_entity, refs)
+
+    def lookup(ref):
+        entity = entities.get(unicode(ref))
+        if entity is None:
+            entity = to_entity(ref)
+        return entity
+    return _ify(lookup, refs)
+
+
+def _collect_ids(obj, ids):
+    if isinstance(obj, type([])):
+        for e in obj:
+            _collect_ids(e, ids)
+    elif isinstance(obj, type({})):
+        for e in obj.values():
+            _collect_ids(e, ids)
+    elif obj:
+        match = FORMAT.match(unicode(obj))
+        if match and match.group(1) in TYPES_MAP:
+            ids.setdefault(match.group(1), set()).add(match.group(2))
+
+
+def resolve_refs(objs):
+    '''Resolve all references in a list of lists or dicts of references
+    with one query per entity type.
+    `objs`
+      A list of references or lists or dicts of references.
+    Returns a dict mapping the references to the model objects. It
+    can be passed to :func:`complex_to_entities`.
+    '''
+    ids = {}
+    _collect_ids(objs, ids)
+    entities = {}
+    for type_, type_ids in ids.items():
+        entity_class = TYPES_MAP[type_]
+        for entity in get_entities(entity_class, list(type_ids),
+                                   order=False):
+            ref = u"@[%s:%s]" % (type_, ref_attr_value(entity))
+            entities[ref] = entity
+    return entities
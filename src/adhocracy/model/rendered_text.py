@@ -0,0 +1,61 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import Table, Column
+from sqlalchemy import DateTime, Unicode, UnicodeText
+
+from adhocracy.model import meta
+
+log = logging.getLogger(__name__)
+
+rendered_text_table = Table(
+    'rendered_text', meta.data,
+    Column('key', Unicode(40), primary_key=True),
+    Column('html', UnicodeText(), nullable=False),
+    Column('create_time', DateTime, default=datetime.utcnow),
+)
+
+
+class RenderedText(object):
+    """
+    Markdown rendered to html, keyed by a hash of the source text and
+    the render options (see :func:`adhocracy.lib.text.render.render_key`).
+    As the key addresses the content, entries never become stale and
+    are never updated.
+    """
+
+    def __init__(self, key, html):
+        self.key = key
+        self.html = html
+
+    @classmethod
+    def find_all(cls, keys):
+        """
+        Return a dict mapping the given keys to the stored html.
+        """
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        q = meta.Session.query(RenderedText.key, RenderedText.html)
+        q = q.filter(RenderedText.key.in_(keys))
+        return dict(q)
+
+    @classmethod
+    def create(cls, key, html):
+        rendered_text = cls(key, html)
+        meta.Session.add(rendered_text)
+        return rendered_text
+
+    @classmethod
+    def store(cls, rendered):
+        """
+        Store a dict mapping keys to html. Keys which are already stored
+        are skipped.
+        """
+        present = cls.find_all(rendered.keys())
+        for key, html in rendered.items():
+            if key not in present:
+                cls.create(key, html)
+
+    def __repr__(self):
+        return "<RenderedText(%s)>" % self.key
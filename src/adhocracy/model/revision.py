@@ -4,6 +4,7 @@ import logging
 from sqlalchemy import Table, Column, ForeignKey
 from sqlalchemy import Integer, UnicodeText, DateTime
 
+from adhocracy.model.delta import DeltaStorage
 import meta
 
 log = logging.getLogger(__name__)
@@ -12,14 +13,16 @@ revision_table = Table(
     'revision', meta.data,
     Column('id', Integer, primary_key=True),
     Column('create_time', DateTime, default=datetime.utcnow),
-    Column('text', UnicodeText(), nullable=False),
+    Column('text', UnicodeText(), nullable=True),
+    Column('base_id', Integer, ForeignKey('revision.id'), nullable=True),
+    Column('delta', UnicodeText(), nullable=True),
     Column('sentiment', Integer, default=0),
     Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
     Column('comment_id', Integer, ForeignKey('comment.id'), nullable=False),
 )
 
 
-class Revision(object):
+class Revision(DeltaStorage):
 
     def __init__(self, comment, user, text):
         self.comment = comment
@@ -49,6 +52,13 @@ class Revision(object):
     def index(self):
         return len(self.comment.revisions) - self.comment.revisions.index(self)
 
+    def purge(self):
+        """
+        Delete the revision from the history of its comment.
+        """
+        self.detach_dependents()
+        meta.Session.delete(self)
+
     @classmethod
     def find(cls, id, instance_filter=True, include_deleted=False):
         try:
@@ -3,6 +3,7 @@ import logging
 from sets import Set
 
 from sqlalchemy import Table, Column, Integer, ForeignKey, DateTime
+from sqlalchemy.orm import aliased
 
 import meta
 
@@ -63,6 +64,21 @@ class Tally(object):
             meta.Session.flush()
         return tally
 
+    @classmethod
+    def create_incremental_from_vote(cls, vote):
+        """
+        Like :meth:`create_from_vote`, but only count the change caused
+        by the vote on top of the latest tally of the poll.
+        """
+        from adhocracy.lib.democracy.tally import make_from_vote
+        tally = cls.find_by_vote(vote)
+        if tally is None:
+            tally = make_from_vote(cls, vote)
+            tally.vote = vote
+            meta.Session.add(tally)
+            meta.Session.flush()
+        return tally
+
     @classmethod
     def create_from_poll(cls, poll, at_time=None, user_filter=None):
         from adhocracy.lib.democracy.tally import make_from_poll
@@ -106,6 +122,28 @@ class Tally(object):
         q = q.filter(Tally.vote == vote)
         return q.limit(1).first()
 
+    @classmethod
+    def prefetch_latest(cls, polls):
+        '''
+        Load the latest tally of each of the *polls* with a single query,
+        so that ``poll.tally`` doesn't load all tallies of each poll.
+        '''
+        polls = dict((poll.id, poll) for poll in polls
+                     if poll._tally is None)
+        if not polls:
+            return
+        # the same order as Poll.tallies
+        other = aliased(Tally)
+        latest = meta.Session.query(other.id)
+        latest = latest.filter(other.poll_id == Tally.poll_id)
+        latest = latest.order_by(other.create_time.desc(), other.id.desc())
+        latest = latest.limit(1).correlate(Tally).as_scalar()
+        q = meta.Session.query(Tally)
+        q = q.filter(Tally.poll_id.in_(polls.keys()))
+        q = q.filter(Tally.id == latest)
+        for tally in q:
+            polls[tally.poll_id]._tally = tally
+
     @classmethod
     def all_samples(cls, poll, start_time, end_time):
         qp = meta.Session.query(Tally)
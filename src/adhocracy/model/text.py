@@ -5,6 +5,7 @@ from pylons.i18n import _
 from sqlalchemy import Column, ForeignKey, Table, or_
 from sqlalchemy import Boolean, Integer, Unicode, UnicodeText, DateTime
 
+from adhocracy.model.delta import DeltaStorage
 import meta
 
 log = logging.getLogger(__name__)
@@ -19,13 +20,15 @@ text_table = Table(
     Column('variant', Unicode(255), nullable=True),
     Column('title', Unicode(255), nullable=True),
     Column('text', UnicodeText(), nullable=True),
+    Column('base_id', Integer, ForeignKey('text.id'), nullable=True),
+    Column('delta', UnicodeText(), nullable=True),
     Column('wiki', Boolean, default=False),
     Column('create_time', DateTime, default=datetime.utcnow),
     Column('delete_time', DateTime)
 )
 
 
-class Text(object):
+class Text(DeltaStorage):
 
     HEAD = u'HEAD'
     LINE_LENGTH = 60
@@ -60,9 +63,14 @@ class Text(object):
                 variant = Text.HEAD
 
         variant_is_new = variant not in page.variants
+        previous = None
+        if not variant_is_new:
+            previous = max((t for t in page._texts if t.variant == variant),
+                           key=lambda t: t.id)
         _text = Text(page, variant, user, title, text, wiki)
         if parent:
             _text.parent = parent
+        _text.store_delta(previous)
         meta.Session.add(_text)
         meta.Session.flush()
         if variant_is_new:
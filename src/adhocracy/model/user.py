@@ -44,6 +44,7 @@ user_table = Table(
     Column('gender', Unicode(1), default=None),
     Column('_is_organization', Boolean, default=False),
     Column('email_messages', Boolean, default=True),
+    Column('email_digest', Unicode(10), nullable=True),
     Column('welcome_code', Unicode(255), nullable=True),
     Column('optional_attributes', MutationDict.as_mutable(JSONEncodedDict)),
 )
@@ -53,6 +54,12 @@ class User(meta.Indexable):
 
     IMPORT_MARKER = 'i__'
 
+    # Values of email_digest. If it is None, notifications are mailed
+    # immediately.
+    DIGEST_HOURLY = u'hourly'
+    DIGEST_DAILY = u'daily'
+    DIGEST_FREQUENCIES = [DIGEST_HOURLY, DIGEST_DAILY]
+
     def __init__(self, user_name, email, password, locale, display_name=None,
                  bio=None):
         self.user_name = user_name
@@ -113,6 +113,9 @@ def _register_request(**kwargs):
     Returns: An request object that can be removed with
     :func:`_unregister_request`.
     '''
+    if 'environ' in kwargs:
+        # every request has its own environ
+        kwargs['environ'] = dict(kwargs['environ'])
     request = MockRequest(**kwargs)
     pylons.request._push_object(request)
 
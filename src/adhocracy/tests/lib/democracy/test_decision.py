@@ -161,6 +161,30 @@ class TestDecisionWithDelegation(TestController):
         Decision(self.high_delegate, self.poll).make(Vote.YES)
         self.assertEqual(self.decision.reload().result, Vote.YES)
 
+    def test_for_poll_resolves_delegated_and_direct_votes(self):
+        self._do_delegate(self.me, self.high_delegate, self.proposal)
+        self._do_delegate(self.low_delegate, self.high_delegate,
+                          self.proposal)
+        Decision(self.high_delegate, self.poll).make(Vote.YES)
+        Decision(self.low_delegate, self.poll).make(Vote.NO)
+        decisions = dict((d.user, d) for d in Decision.for_poll(self.poll))
+        self.assertEqual(len(decisions), 3)
+        self.assertEqual(decisions[self.me].result, Vote.YES)
+        self.assertFalse(decisions[self.me].is_self_decided())
+        self.assertEqual(decisions[self.low_delegate].result, Vote.NO)
+        self.assertTrue(decisions[self.low_delegate].is_self_decided())
+        for user, decision in decisions.items():
+            self.assertEqual(decision.result,
+                             Decision(user, self.poll).result)
+
+    def test_for_poll_with_user_filter(self):
+        from adhocracy.model import User
+        self._do_delegate(self.me, self.high_delegate, self.proposal)
+        Decision(self.high_delegate, self.poll).make(Vote.YES)
+        user_filter = lambda q: q.filter(User.id == self.me.id)
+        decisions = Decision.for_poll(self.poll, user_filter=user_filter)
+        self.assertEqual([d.user for d in decisions], [self.me])
+
 
 # TODO: can access history of delegation decisions
 # TODO: test replay - this is currently in the decision -
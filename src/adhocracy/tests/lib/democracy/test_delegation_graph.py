@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from adhocracy.lib.democracy import DelegationGraph, DelegationNode
+from adhocracy.model import Delegation
+
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_get_instance
+from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
+
+
+class TestDelegationGraph(TestController):
+
+    def setUp(self):
+        super(TestDelegationGraph, self).setUp()
+        self.me = tt_make_user()
+        self.first = tt_make_user()
+        self.second = tt_make_user()
+        self.proposal = tt_make_proposal(voting=True)
+
+    def _graph(self, **kwargs):
+        return DelegationGraph.load(instance=tt_get_instance(), **kwargs)
+
+    def test_empty_graph(self):
+        graph = self._graph()
+        self.assertEqual(graph.inbound(self.me, self.proposal), [])
+        self.assertEqual(graph.outbound(self.me, self.proposal), [])
+        self.assertEqual(graph.number_of_delegations(self.me, self.proposal),
+                         0)
+
+    def test_inbound_and_outbound(self):
+        delegation = Delegation.create(self.me, self.first, self.proposal)
+        graph = self._graph()
+        self.assertEqual(graph.outbound(self.me, self.proposal), [delegation])
+        self.assertEqual(graph.inbound(self.first, self.proposal),
+                         [delegation])
+        self.assertEqual(graph.inbound(self.me, self.proposal), [])
+
+    def test_transitive_inbound(self):
+        Delegation.create(self.me, self.first, self.proposal)
+        Delegation.create(self.first, self.second, self.proposal)
+        graph = self._graph()
+        self.assertEqual(len(graph.inbound(self.second, self.proposal)), 1)
+        self.assertEqual(
+            len(graph.transitive_inbound(self.second, self.proposal)), 2)
+        self.assertEqual(
+            graph.number_of_delegations(self.second, self.proposal), 2)
+
+    def test_mutual_delegation(self):
+        Delegation.create(self.first, self.second, self.proposal)
+        Delegation.create(self.second, self.first, self.proposal)
+        graph = self._graph()
+        self.assertEqual(
+            len(graph.transitive_inbound(self.first, self.proposal)), 1)
+        self.assertEqual(
+            len(graph.transitive_inbound(self.second, self.proposal)), 1)
+
+    def test_matches_delegation_node(self):
+        Delegation.create(self.me, self.first, self.proposal)
+        Delegation.create(self.second, self.first, self.proposal)
+        Delegation.create(self.first, self.second, self.proposal)
+        graph = self._graph()
+        for user in [self.me, self.first, self.second]:
+            node = DelegationNode(user, self.proposal)
+            self.assertEqual(
+                set(graph.inbound(user, self.proposal)),
+                set(node.inbound()))
+            self.assertEqual(
+                set(graph.outbound(user, self.proposal)),
+                set(node.outbound()))
+            self.assertEqual(
+                graph.number_of_delegations(user, self.proposal),
+                node.number_of_delegations())
+
+    def test_node_uses_given_graph(self):
+        graph = self._graph()
+        Delegation.create(self.me, self.first, self.proposal)
+        node = DelegationNode(self.first, self.proposal, graph=graph)
+        self.assertEqual(node.inbound(), [])
+        self.assertEqual(len(DelegationNode(self.first,
+                                            self.proposal).inbound()), 1)
+
+    def test_revoked_delegations_are_not_loaded(self):
+        delegation = Delegation.create(self.me, self.first, self.proposal)
+        before = datetime.utcnow()
+        delegation.revoke(before + timedelta(hours=1))
+        self.assertEqual(len(self._graph().delegations), 1)
+        later = self._graph(at_time=before + timedelta(hours=2))
+        self.assertEqual(later.delegations, [])
+
+    def test_load_for_scope(self):
+        other = tt_make_proposal(voting=True)
+        Delegation.create(self.me, self.first, self.proposal)
+        Delegation.create(self.me, self.second, other)
+        graph = DelegationGraph.load(scope=self.proposal)
+        self.assertEqual(len(graph.delegations), 1)
+        self.assertEqual(graph.inbound(self.second, other), [])
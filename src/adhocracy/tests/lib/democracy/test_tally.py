@@ -0,0 +1,65 @@
+from adhocracy.lib.democracy import Decision
+from adhocracy.lib.democracy.tally import make_from_poll, SimpleTally
+from adhocracy.model import Delegation, Tally, Vote, meta
+
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
+
+
+class TestIncrementalTally(TestController):
+
+    def setUp(self):
+        super(TestIncrementalTally, self).setUp()
+        self.proposal = tt_make_proposal(voting=True)
+        self.poll = self.proposal.polls[0]
+        self.first = tt_make_user()
+        self.second = tt_make_user()
+
+    def _vote(self, user, orientation):
+        votes = Decision(user, self.poll).make(orientation)
+        return [Tally.create_incremental_from_vote(v) for v in votes][-1]
+
+    def assertMatchesRecount(self, tally):
+        recount = make_from_poll(SimpleTally, self.poll)
+        self.assertEqual((tally.num_for, tally.num_against,
+                          tally.num_abstain),
+                         (recount.num_for, recount.num_against,
+                          recount.num_abstain))
+
+    def test_direct_votes(self):
+        tally = self._vote(self.first, Vote.YES)
+        self.assertEqual((tally.num_for, tally.num_against), (1, 0))
+        tally = self._vote(self.second, Vote.NO)
+        self.assertEqual((tally.num_for, tally.num_against), (1, 1))
+        self.assertMatchesRecount(tally)
+
+    def test_changed_vote(self):
+        self._vote(self.first, Vote.YES)
+        tally = self._vote(self.first, Vote.ABSTAIN)
+        self.assertEqual((tally.num_for, tally.num_abstain), (0, 1))
+        self.assertMatchesRecount(tally)
+
+    def test_delegated_votes(self):
+        Delegation.create(self.first, self.second, self.proposal)
+        tally = self._vote(self.second, Vote.YES)
+        self.assertEqual(tally.num_for, 2)
+        self.assertMatchesRecount(tally)
+        tally = self._vote(self.first, Vote.NO)
+        self.assertEqual((tally.num_for, tally.num_against), (1, 1))
+        self.assertMatchesRecount(tally)
+
+    def test_tally_is_linked_to_vote(self):
+        vote = Decision(self.first, self.poll).make(Vote.YES)[0]
+        tally = Tally.create_incremental_from_vote(vote)
+        self.assertEqual(tally.vote, vote)
+        self.assertEqual(Tally.create_incremental_from_vote(vote), tally)
+
+    def test_votes_processed_out_of_order(self):
+        first = Decision(self.first, self.poll).make(Vote.YES)[0]
+        second = Decision(self.second, self.poll).make(Vote.NO)[0]
+        Tally.create_incremental_from_vote(second)
+        tally = Tally.create_incremental_from_vote(first)
+        self.assertEqual((tally.num_for, tally.num_against), (1, 1))
+        meta.Session.expire_all()
+        self.assertEqual(self.poll.tallies[0], tally)
+        self.assertMatchesRecount(self.poll.tallies[0])
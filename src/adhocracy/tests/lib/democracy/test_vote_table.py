@@ -0,0 +1,67 @@
+from adhocracy.lib.democracy import Decision, VoteTable
+from adhocracy.model import Delegation, Poll, Vote
+
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
+
+
+class TestVoteTable(TestController):
+
+    def setUp(self):
+        super(TestVoteTable, self).setUp()
+        self.me = tt_make_user()
+        self.first = tt_make_user()
+        self.second = tt_make_user()
+        self.proposal = tt_make_proposal(creator=self.me, voting=True)
+        self.poll = Poll.create(self.proposal, self.proposal.creator,
+                                Poll.ADOPT)
+
+    def _assert_matches_decisions(self, table):
+        for user in [self.me, self.first, self.second]:
+            decision = Decision(user, self.poll)
+            outcome = table.outcome(user.id)
+            self.assertEqual(outcome.result, decision.result)
+            self.assertEqual(outcome.self_decided,
+                             decision.is_self_decided())
+
+    def test_empty(self):
+        table = VoteTable.load(self.poll)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.counts(), {Vote.YES: 0, Vote.NO: 0,
+                                          Vote.ABSTAIN: 0})
+        self.assertEqual(table.result(self.me.id), None)
+
+    def test_direct_and_delegated_votes(self):
+        Delegation.create(self.me, self.first, self.proposal)
+        Delegation.create(self.second, self.first, self.proposal)
+        Decision(self.first, self.poll).make(Vote.YES)
+        Decision(self.second, self.poll).make(Vote.NO)
+        table = VoteTable.load(self.poll)
+        self.assertEqual(table.results(), {self.me.id: Vote.YES,
+                                           self.first.id: Vote.YES,
+                                           self.second.id: Vote.NO})
+        self.assertEqual(table.counts()[Vote.YES], 2)
+        self._assert_matches_decisions(table)
+
+    def test_disagreeing_delegates(self):
+        Delegation.create(self.me, self.first, self.proposal)
+        Delegation.create(self.me, self.second, self.proposal)
+        Decision(self.first, self.poll).make(Vote.YES)
+        Decision(self.second, self.poll).make(Vote.NO)
+        table = VoteTable.load(self.poll)
+        self.assertEqual(table.result(self.me.id), None)
+        self.assertEqual(len(table.relevant(self.me.id)), 2)
+        self._assert_matches_decisions(table)
+
+    def test_change(self):
+        Delegation.create(self.me, self.first, self.proposal)
+        Decision(self.first, self.poll).make(Vote.YES)
+        own_vote = Decision(self.me, self.poll).make(Vote.NO)[0]
+        Decision(self.me, self.poll).make(Vote.ABSTAIN)
+        table = VoteTable.load(self.poll)
+        (before, after) = table.change(self.me.id, own_vote.id)
+        self.assertEqual(before.result, Vote.YES)
+        self.assertFalse(before.self_decided)
+        self.assertEqual(after.result, Vote.NO)
+        self.assertTrue(after.self_decided)
+        self.assertEqual(table.result(self.me.id), Vote.ABSTAIN)
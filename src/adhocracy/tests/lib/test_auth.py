@@ -0,0 +1,42 @@
+from mock import patch
+
+from adhocracy import model
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
+
+
+class TestAuthCheckMemoization(TestController):
+
+    def setUp(self):
+        super(TestAuthCheckMemoization, self).setUp()
+        self.proposal = tt_make_proposal(creator=tt_make_user())
+        model.meta.Session.flush()
+
+    def test_permissions_are_computed_once(self):
+        from adhocracy.lib.auth.authorization import has
+        with patch('adhocracy.model.Group.by_code',
+                   wraps=model.Group.by_code) as by_code:
+            self.assertTrue(has(u'proposal.show'))
+            self.assertFalse(has(u'global.admin'))
+        self.assertEqual(by_code.call_count, 1)
+
+    def test_checks_are_memoized_per_request(self):
+        from adhocracy.lib.auth import authorization, can
+        with patch.object(authorization, 'AuthCheck',
+                          wraps=authorization.AuthCheck) as auth_check:
+            self.assertTrue(can.proposal.show(self.proposal))
+            self.assertTrue(can.proposal.show(self.proposal))
+            self.assertEqual(auth_check.call_count, 1)
+
+            # changes that have been written invalidate memoized checks
+            self.proposal.delete()
+            model.meta.Session.flush()
+            self.assertFalse(can.proposal.show(self.proposal))
+            self.assertFalse(can.proposal.show(self.proposal))
+            self.assertEqual(auth_check.call_count, 2)
+
+            # and no checks are memoized while there are pending changes
+            self.proposal.delete_time = None
+            self.assertTrue(can.proposal.show(self.proposal))
+            self.assertTrue(can.proposal.show(self.proposal))
+            self.assertEqual(auth_check.call_count, 4)
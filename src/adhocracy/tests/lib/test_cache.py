@@ -0,0 +1,185 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_make_proposal
+
+
+class DictCache(object):
+    '''
+    The subset of :class:`memcache.Client` used by memoize.
+    '''
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def get_multi(self, keys):
+        return dict((k, self.data[k]) for k in keys if k in self.data)
+
+    def set(self, key, value, time=0):
+        self.data[key] = value
+        return True
+
+    def add(self, key, value):
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def incr(self, key, delta=1):
+        if key not in self.data:
+            return None
+        self.data[key] += delta
+        return self.data[key]
+
+
+class TestMemoize(TestCase):
+
+    def setUp(self):
+        self.cache = DictCache()
+        self.patch = patch('adhocracy.lib.cache.util.app_globals',
+                           MagicMock(cache=self.cache, local_cache=None))
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def _memoized(self):
+        from adhocracy.lib.cache.util import memoize
+        calls = []
+
+        @memoize('test_memoize')
+        def fn(arg):
+            calls.append(arg)
+            return arg.upper()
+        return fn, calls
+
+    def test_results_are_cached(self):
+        fn, calls = self._memoized()
+        self.assertEqual(fn(u'a'), u'A')
+        self.assertEqual(fn(u'a'), u'A')
+        self.assertEqual(calls, [u'a'])
+
+    def test_clear_tag_invalidates_results(self):
+        from adhocracy.lib.cache.util import clear_tag
+        fn, calls = self._memoized()
+        fn(u'a')
+        fn(u'b')
+        clear_tag(u'a')
+        fn(u'a')
+        fn(u'b')
+        self.assertEqual(calls, [u'a', u'b', u'a'])
+
+    def test_clear_tag_increments_version(self):
+        from adhocracy.lib.cache.util import clear_tag, make_tag, version_key
+        fn, calls = self._memoized()
+        fn(u'a')
+        key = version_key(make_tag(u'a'))
+        version = self.cache.get(key)
+        for i in range(10):
+            clear_tag(u'a')
+        self.assertEqual(self.cache.get(key), version + 10)
+
+    def test_clear_unknown_tag(self):
+        from adhocracy.lib.cache.util import clear_tag
+        clear_tag(u'unknown')
+        self.assertEqual(self.cache.data, {})
+
+
+class TestLocalCache(TestCase):
+
+    def setUp(self):
+        from adhocracy.lib.cache.util import LocalCache
+        self.cache = DictCache()
+        self.local_cache = LocalCache(size=2, ttl=60)
+        self.patch = patch('adhocracy.lib.cache.util.app_globals',
+                           MagicMock(cache=self.cache,
+                                     local_cache=self.local_cache))
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def test_lru(self):
+        self.local_cache.set('a', 1)
+        self.local_cache.set('b', 2)
+        self.assertEqual(self.local_cache.get('a'), 1)
+        self.local_cache.set('c', 3)
+        self.assertEqual(self.local_cache.get('b'), None)
+        self.assertEqual(self.local_cache.get('a'), 1)
+        self.assertEqual(self.local_cache.stats(),
+                         dict(size=2, hits=2, misses=1))
+
+    @patch('adhocracy.lib.cache.util.time')
+    def test_ttl(self, time):
+        time.time.return_value = 100
+        self.local_cache.set('a', 1)
+        time.time.return_value = 161
+        self.assertEqual(self.local_cache.get('a'), None)
+
+    def test_memoize_uses_local_cache(self):
+        from adhocracy.lib.cache.util import clear_tag, memoize
+        calls = []
+
+        @memoize('test_local_cache')
+        def fn(arg):
+            calls.append(arg)
+            return arg.upper()
+
+        fn(u'a')
+        self.cache.get = MagicMock(wraps=self.cache.get)
+        self.cache.get_multi = MagicMock(wraps=self.cache.get_multi)
+        self.assertEqual(fn(u'a'), u'A')
+        self.assertFalse(self.cache.get.called)
+        self.assertEqual(self.cache.get_multi.call_count, 1)
+        clear_tag(u'a')
+        self.assertEqual(fn(u'a'), u'A')
+        self.assertEqual(calls, [u'a', u'a'])
+        self.assertEqual(self.local_cache.stats()['hits'], 1)
+
+    def test_tags_cleared_elsewhere_are_seen_at_once(self):
+        from adhocracy.lib.cache.util import make_tag, memoize, version_key
+        calls = []
+
+        @memoize('test_local_versions')
+        def fn(arg):
+            calls.append(arg)
+            return arg.upper()
+
+        fn(u'a')
+        # another process clears the tag
+        self.cache.incr(version_key(make_tag(u'a')))
+        fn(u'a')
+        self.assertEqual(calls, [u'a', u'a'])
+
+
+class TestInvalidation(TestController):
+
+    def test_clears_parents_once(self):
+        from adhocracy.lib.cache.invalidate import (Invalidation,
+                                                    invalidate_delegateable,
+                                                    invalidate_poll)
+        from adhocracy.lib.cache.util import make_tag
+        proposal = tt_make_proposal(voting=True)
+        inv = Invalidation()
+        invalidate_delegateable(proposal, inv)
+        invalidate_poll(proposal.polls[0], inv)
+        self.assertEqual(set(inv.tags.keys()),
+                         set([make_tag(proposal), make_tag(proposal.instance),
+                              make_tag(proposal.polls[0])]))
+
+    def test_invalidate_many_clears_once(self):
+        from adhocracy.lib.cache import invalidate_many
+        proposal = tt_make_proposal(voting=True)
+        cache = MagicMock()
+        app_globals = MagicMock(cache=cache, local_cache=None)
+        with patch('pylons.app_globals', app_globals):
+            with patch('adhocracy.lib.cache.util.app_globals', app_globals):
+                invalidate_many([proposal, proposal.polls[0],
+                                 proposal.instance])
+        self.assertEqual(cache.set_multi.call_count, 1)
+        self.assertFalse(cache.incr.called)
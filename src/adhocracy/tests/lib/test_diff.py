@@ -0,0 +1,66 @@
+import random
+from unittest import TestCase
+
+from mock import patch
+
+
+class TestDiff(TestCase):
+
+    def _lcs_length(self, a, b):
+        table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+        for i, x in enumerate(a):
+            for j, y in enumerate(b):
+                if x == y:
+                    table[i + 1][j + 1] = table[i][j] + 1
+                else:
+                    table[i + 1][j + 1] = max(table[i][j + 1],
+                                              table[i + 1][j])
+        return table[-1][-1]
+
+    def test_opcodes_reconstruct_both_sequences(self):
+        from adhocracy.lib.text.diff import _opcodes
+        rand = random.Random(23)
+        for _ in range(500):
+            left = [rand.choice('abcde') for _ in range(rand.randint(0, 30))]
+            right = [rand.choice('abcde') for _ in range(rand.randint(0, 30))]
+            old, new = [], []
+            for op, i1, i2, j1, j2 in _opcodes(left, right):
+                if op == 'equal':
+                    self.assertEqual(left[i1:i2], right[j1:j2])
+                old.extend(left[i1:i2])
+                new.extend(right[j1:j2])
+            self.assertEqual(old, left)
+            self.assertEqual(new, right)
+
+    @patch('adhocracy.lib.text.diff._unique_anchors', return_value=[])
+    def test_myers_finds_longest_common_subsequence(self, unique_anchors):
+        from adhocracy.lib.text.diff import _matching_blocks
+        rand = random.Random(42)
+        for _ in range(300):
+            a = [rand.choice('abc') for _ in range(rand.randint(0, 25))]
+            b = [rand.choice('abc') for _ in range(rand.randint(0, 25))]
+            matched = sum(n for i, j, n in _matching_blocks(a, b))
+            self.assertEqual(matched, self._lcs_length(a, b))
+
+    def test_diff_line_based(self):
+        from adhocracy.lib.text.diff import _diff_line_based
+        left = u'a b c\nd e'
+        right = u'a x y c\nd e <f>'
+        self.assertEqual(_diff_line_based(left, right),
+                         [u'a <span>x y</span> c',
+                          u'd e<ins> &lt;f&gt;</ins>'])
+        self.assertEqual(
+            _diff_line_based(left, right, replace_as_insert=True,
+                             replace_as_delete=True, include_insertions=False),
+            [u'a <del>b</del><ins>x y</ins> c', u'd e'])
+
+    def test_diff_html_only_diffs_changed_paragraphs(self):
+        from adhocracy.lib.text.diff import _diff_html
+        left = u'<p>one</p>\n<p>two three</p>\n<p>four</p>'
+        right = u'<p>one</p>\n<p>two drei</p>\n<p>four</p>\n<p>five</p>'
+        self.assertEqual(
+            _diff_html(left, right),
+            u'<p>one</p>\n<p>two <ins>drei</ins> <del>three</del> </p>'
+            u'<p>four</p> <p><ins>five</ins></p>')
+        self.assertEqual(_diff_html(u'Title', u'Title new'),
+                         u'Title <ins>new</ins>')
@@ -1,6 +1,215 @@
+from mock import patch
+
+from adhocracy import model
 from adhocracy.tests import TestController
+from adhocracy.tests.testtools import (tt_get_instance, tt_make_proposal,
+                                       tt_make_user)
 
 
 class TestEvent(TestController):
 
-    pass
+    def test_prefetch_resolves_data(self):
+        user = tt_make_user()
+        proposal = tt_make_proposal(creator=user)
+        events = []
+        for data in [dict(proposal=proposal, users=[user]),
+                     dict(proposal=proposal, other=u'text')]:
+            event = model.Event(u't_proposal_edit', user, data,
+                                instance=tt_get_instance())
+            model.meta.Session.add(event)
+            events.append(event)
+        model.meta.Session.flush()
+        model.meta.Session.expire_all()
+        q = model.meta.Session.query(model.Event)
+        q = q.filter(model.Event.id.in_([e.id for e in events]))
+        events = q.order_by(model.Event.id).all()
+
+        with patch('adhocracy.model.refs.to_entity') as to_entity:
+            model.Event.prefetch(events)
+            self.assertEqual(events[0].proposal, proposal)
+            self.assertEqual(events[0].users, [user])
+            self.assertEqual(events[1].other, u'text')
+            self.assertEqual(events[1].event.code, u't_proposal_edit')
+        self.assertFalse(to_entity.called)
+
+    def test_feed_pages_by_cursor(self):
+        from datetime import datetime
+        user = tt_make_user()
+        hidden = model.Instance.create(u'hiddenfeed', u'Hidden', user)
+        hidden.hidden = True
+        time = datetime(2020, 1, 1)
+        events = []
+        for instance in [None, tt_get_instance(), hidden, None, None]:
+            event = model.Event(u't_test', user, {}, instance=instance)
+            event.time = time
+            model.meta.Session.add(event)
+            events.append(event)
+        model.meta.Session.flush()
+        visible = [events[4], events[3], events[1], events[0]]
+
+        query = model.Event.all_q().filter(model.Event.user == user)
+        first = model.Event.feed(query, limit=3)
+        self.assertEqual(first, visible[:3])
+        before = model.Event.parse_cursor(first[-1].cursor)
+        self.assertEqual(before, (time, events[1].id))
+        self.assertEqual(model.Event.feed(query, limit=3, before=before),
+                         visible[3:])
+        self.assertEqual(model.Event.parse_cursor(u'invalid'), None)
+        self.assertEqual(model.Event.parse_cursor(None), None)
+
+
+class TestNotificationBatch(TestController):
+
+    def setUp(self):
+        super(TestNotificationBatch, self).setUp()
+        self.author = tt_make_user()
+        self.instance_watcher = tt_make_user()
+        self.proposal_watcher = tt_make_user()
+        self.proposal = tt_make_proposal(creator=self.author)
+        model.Watch.create(self.instance_watcher, tt_get_instance())
+        model.Watch.create(self.proposal_watcher, self.proposal)
+        model.meta.Session.flush()
+
+    def _event(self):
+        event = model.Event(u't_proposal_edit', self.author, {},
+                            instance=tt_get_instance())
+        event.topics = [self.proposal]
+        model.meta.Session.add(event)
+        model.meta.Session.flush()
+        return event
+
+    def test_prefetched_watches_match_queried_watches(self):
+        from adhocracy.lib.watchlist import (prefetch_watches,
+                                             traverse_watchlist)
+        cache = prefetch_watches([self.proposal])
+        self.assertEqual(
+            set(w.user for w in traverse_watchlist(self.proposal)),
+            set([self.instance_watcher, self.proposal_watcher]))
+        self.assertEqual(traverse_watchlist(self.proposal, cache=cache),
+                         traverse_watchlist(self.proposal))
+
+    def test_notify_many_stores_notifications_of_all_events(self):
+        from adhocracy.lib.event.notification import notify_many
+        events = [self._event(), self._event()]
+        notify_many(events, database_only=True)
+        q = model.meta.Session.query(model.Notification)
+        q = q.filter(model.Notification.event_id.in_([e.id for e in events]))
+        stored = set((n.event_id, n.user_id) for n in q)
+        self.assertEqual(stored, set(
+            (e.id, u.id) for e in events
+            for u in [self.instance_watcher, self.proposal_watcher]))
+
+        # processing the events again doesn't store duplicates
+        notify_many(events, database_only=True)
+        self.assertEqual(q.count(), 4)
+
+    def test_timeline(self):
+        from adhocracy.lib.event.notification import notify_many
+        events = [self._event(), self._event()]
+        notify_many(events, database_only=True)
+        timeline = model.Notification.timeline(self.proposal_watcher)
+        self.assertEqual([n.event for n in timeline], events[::-1])
+        self.assertEqual(timeline[0].event_time, events[1].time)
+        self.assertEqual(
+            model.Notification.timeline(self.proposal_watcher,
+                                        instance=tt_get_instance(),
+                                        limit=1), timeline[:1])
+        self.assertEqual(
+            model.Notification.timeline(self.proposal_watcher,
+                                        event_filter=[u't_page_edit']), [])
+
+    @patch('adhocracy.model.meta.Session.commit')
+    @patch('adhocracy.lib.event.notification.notify_many')
+    def test_batch_processes_events_together(self, notify_many, commit):
+        from adhocracy.lib import event
+        with event.batch():
+            first = event.emit(event.T_PROPOSAL_EDIT, self.author,
+                               instance=tt_get_instance(),
+                               topics=[self.proposal],
+                               proposal=self.proposal)
+            second = event.emit(event.T_PROPOSAL_EDIT, self.author,
+                                instance=tt_get_instance(),
+                                topics=[self.proposal],
+                                proposal=self.proposal)
+        self.assertEqual(commit.call_count, 1)
+        notify_many.assert_called_once_with([first, second])
+
+
+class TestDigest(TestController):
+
+    def setUp(self):
+        super(TestDigest, self).setUp()
+        self.author = tt_make_user()
+        self.watcher = tt_make_user()
+        self.watcher.email_digest = model.User.DIGEST_HOURLY
+        self.watcher.email_priority = 0
+        self.watcher.set_email_verified()
+        self.proposal = tt_make_proposal(creator=self.author)
+        model.Watch.create(self.watcher, self.proposal)
+
+    def _notify(self):
+        from adhocracy.lib.event.notification import notify_many
+        events = []
+        for i in range(3):
+            event = model.Event(u't_proposal_edit', self.author, {},
+                                instance=tt_get_instance())
+            event.topics = [self.proposal]
+            model.meta.Session.add(event)
+            events.append(event)
+        model.meta.Session.flush()
+        notify_many(events)
+        return events
+
+    def _pending(self):
+        q = model.meta.Session.query(model.Notification)
+        q = q.filter(model.Notification.user == self.watcher)
+        q = q.filter(model.Notification.digest != None)  # noqa
+        return q.all()
+
+    def test_notifications_are_stored_instead_of_mailed(self):
+        self._notify()
+        self.assertEqual(len(self._pending()), 3)
+        self.assertFalse(self.mocked_mail_send.called)
+
+    @patch('adhocracy.lib.event.notification.config.get_bool',
+           return_value=False)
+    @patch('adhocracy.lib.event.notification.mail_sink')
+    def test_no_digests_without_stored_notifications(self, mail_sink,
+                                                     get_bool):
+        mailed = []
+        mail_sink.side_effect = lambda pipeline: mailed.extend(pipeline) or []
+        self._notify()
+        q = model.meta.Session.query(model.Notification)
+        q = q.filter(model.Notification.user == self.watcher)
+        self.assertEqual(q.count(), 0)
+        self.assertEqual([n.user for n in mailed], [self.watcher] * 3)
+
+    # templates can't be rendered outside of a request here
+    @patch('adhocracy.lib.event.notification.digest.render',
+           return_value=u'digest')
+    @patch('adhocracy.model.meta.Session.commit')
+    @patch('adhocracy.i18n.user_language')
+    def test_send_digests(self, user_language, commit, render):
+        from adhocracy.lib.event.notification import send_digests
+        events = self._notify()
+        self.assertEqual(send_digests(model.User.DIGEST_DAILY), 0)
+        self.assertEqual(send_digests(model.User.DIGEST_HOURLY), 1)
+        self.assertEqual(self._pending(), [])
+        groups = render.call_args[0][1]['groups']
+        self.assertEqual(groups[0][0], tt_get_instance())
+        self.assertEqual([n.event for n in groups[0][1]], events)
+        self.assertEqual(self.mocked_mail_send.call_count, 1)
+        (email_from, to_email, message) = self.mocked_mail_send.call_args[0]
+        self.assertEqual(to_email, self.watcher.email)
+
+    @patch('adhocracy.lib.event.notification.digest.render',
+           return_value=u'digest')
+    @patch('adhocracy.model.meta.Session.commit')
+    @patch('adhocracy.i18n.user_language')
+    def test_failed_digests_stay_pending(self, user_language, commit,
+                                         render):
+        from adhocracy.lib.event.notification import send_digests
+        self._notify()
+        self.mocked_mail_send.side_effect = Exception('unavailable')
+        self.assertEqual(send_digests(model.User.DIGEST_HOURLY), 1)
+        self.assertEqual(len(self._pending()), 3)
@@ -0,0 +1,89 @@
+from mock import patch
+
+from adhocracy import model
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_get_instance
+
+
+class TestInstanceRegistry(TestController):
+
+    def setUp(self):
+        super(TestInstanceRegistry, self).setUp()
+        from adhocracy.lib.instance import discriminator
+        discriminator._registry.clear()
+
+    def test_find_instance_is_remembered(self):
+        from adhocracy.lib.instance.discriminator import find_instance
+        key = tt_get_instance().key
+        instance = find_instance(key)
+        self.assertEqual(instance, tt_get_instance())
+        model.meta.Session.expunge_all()
+
+        with patch('adhocracy.model.Instance.find') as find:
+            found = find_instance(key.upper())
+            self.assertFalse(find.called)
+        self.assertEqual(found.id, instance.id)
+        self.assertEqual(found.label, instance.label)
+        self.assertTrue(found in model.meta.Session)
+        self.assertEqual(found.required_participation,
+                         instance.required_participation)
+
+    def test_changed_instance_is_forgotten(self):
+        from adhocracy.lib.cache import invalidate
+        from adhocracy.lib.instance.discriminator import find_instance
+        instance = find_instance(tt_get_instance().key)
+        invalidate(instance)
+        with patch('adhocracy.model.Instance.find',
+                   wraps=model.Instance.find) as find:
+            find_instance(instance.key)
+            self.assertTrue(find.called)
+
+    def test_relations_are_not_remembered(self):
+        from adhocracy.lib.instance.discriminator import find_instance
+        instance = tt_get_instance()
+        find_instance(instance.key)
+        badge = model.InstanceBadge.create(u'registered', u'#ccc', True,
+                                           u'description')
+        badge.assign(instance, instance.creator)
+        model.meta.Session.expunge_all()
+
+        with patch('adhocracy.model.Instance.find') as find:
+            found = find_instance(instance.key)
+            self.assertFalse(find.called)
+        self.assertTrue(badge.id in [b.id for b in found.badges])
+
+    def test_instance_loaded_before_forgetting_is_not_registered(self):
+        from adhocracy.lib.instance import discriminator
+        instance = tt_get_instance()
+
+        def find(key):
+            discriminator.forget_instance(instance.id)
+            return instance
+
+        with patch('adhocracy.model.Instance.find', side_effect=find):
+            discriminator.find_instance(instance.key)
+        self.assertEqual(discriminator._registry, {})
+
+    def test_commit_forgets_changed_instance_again(self):
+        from adhocracy.lib.instance import discriminator
+        instance = tt_get_instance()
+        label = instance.label
+        instance.label = u'Changed label'
+        try:
+            with patch.object(discriminator, 'forget_instance') as forget:
+                model.meta.Session.commit()
+            self.assertEqual(forget.call_count, 2)
+            forget.assert_called_with(instance.id)
+        finally:
+            instance.label = label
+            model.meta.Session.commit()
+
+    def test_editing_requests_skip_the_registry(self):
+        from adhocracy.lib.instance.discriminator import _uses_registry
+        self.assertTrue(_uses_registry({'REQUEST_METHOD': 'GET',
+                                        'PATH_INFO': '/proposal'}))
+        self.assertFalse(_uses_registry({'REQUEST_METHOD': 'POST',
+                                         'PATH_INFO': '/proposal'}))
+        self.assertFalse(_uses_registry(
+            {'REQUEST_METHOD': 'GET',
+             'PATH_INFO': '/instance/test/settings/general'}))
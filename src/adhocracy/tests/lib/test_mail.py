@@ -0,0 +1,108 @@
+import asyncore
+import json
+import smtpd
+import smtplib
+import threading
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+
+class DebuggingServer(smtpd.SMTPServer):
+    '''
+    A local SMTP server that records the connections and messages it
+    receives.
+    '''
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('localhost', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+class TestMailDelivery(TestCase):
+
+    def setUp(self):
+        from adhocracy.lib.mail import SMTPPool
+        self.server = DebuggingServer()
+        self.thread = threading.Thread(target=asyncore.loop,
+                                       kwargs=dict(timeout=0.05))
+        self.thread.daemon = True
+        self.thread.start()
+        self.pool = SMTPPool('localhost', self.server.port, size=1)
+        self.patch = patch('adhocracy.lib.mail.get_pool',
+                           return_value=self.pool)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.pool.close()
+        self.server.close()
+        self.thread.join(5)
+
+    def test_deliver_reuses_connection(self):
+        from adhocracy.lib.mail import compose, deliver
+        messages = [compose(u'User %s' % i, u'user%s@example.com' % i,
+                            u'Subject', u'Body', email_from=u'a@example.com',
+                            name_from=u'Adhocracy')
+                    for i in range(5)]
+        with patch('adhocracy.lib.mail.aconfig.get_int', return_value=2):
+            deliver(messages)
+        self.assertEqual(len(self.server.messages), 5)
+        self.assertEqual(self.server.messages[0][1], [u'user0@example.com'])
+        self.assertEqual(self.server.connections, 1)
+
+    @patch('adhocracy.lib.mail.deliver_batch')
+    def test_deliver_in_batches(self, deliver_batch):
+        from adhocracy.lib.mail import deliver
+        messages = [('a@example.com', 'b@example.com', 'message')] * 5
+        with patch('adhocracy.lib.mail.aconfig.get_int', return_value=2):
+            deliver(messages + [None])
+        self.assertEqual([len(json.loads(c[0][0])) for c in
+                          deliver_batch.enqueue.call_args_list], [2, 2, 1])
+
+    def test_stats_are_published_to_redis(self):
+        from adhocracy.lib.mail import compose, deliver_batch, stats
+        redis = MagicMock()
+        rq_config = MagicMock(connection=redis, queue_name='test')
+        message = compose(u'User', u'user@example.com', u'Subject', u'Body',
+                          email_from=u'a@example.com', name_from=u'Adhocracy')
+        with patch('adhocracy.lib.queue.rq_config', rq_config):
+            deliver_batch.func(json.dumps([message]))
+            pipeline = redis.pipeline.return_value
+            pipeline.hincrby.assert_any_call('test.mail_stats', 'sent', 1)
+            self.assertTrue(pipeline.hincrbyfloat.called)
+
+            redis.hgetall.return_value = {'sent': '4', 'seconds': '2.0'}
+            result = stats()
+        self.assertEqual(result['sent'], 4)
+        self.assertEqual(result['failed'], 0)
+        self.assertEqual(result['rate'], 2.0)
+
+    @patch('adhocracy.lib.mail.time.sleep')
+    def test_retry_transient_errors(self, sleep):
+        from adhocracy.lib.mail import send
+        stale = self.pool.connect()
+        stale.close()
+        self.pool.idle.append(stale)
+        send('a@example.com', 'b@example.com', 'message')
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(sleep.call_count, 1)
+
+    @patch('adhocracy.lib.mail.time.sleep')
+    def test_permanent_errors_are_not_retried(self, sleep):
+        from adhocracy.lib.mail import send
+        with patch.object(self.pool, 'connect') as connect:
+            connect.return_value.sendmail.side_effect = \
+                smtplib.SMTPRecipientsRefused({})
+            self.assertRaises(smtplib.SMTPRecipientsRefused, send,
+                              'a@example.com', 'b@example.com', 'message')
+        self.assertFalse(sleep.called)
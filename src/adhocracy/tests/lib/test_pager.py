@@ -1,5 +1,8 @@
+from datetime import datetime
 from unittest import TestCase
 
+from adhocracy.tests import TestController
+
 
 class TestVisiblePages(TestCase):
     '''
@@ -114,3 +117,39 @@ class TestSolrTokenHelpers(TestCase):
         wrongtoken = "1A"
         self.assertEqual(solr_tokens_to_entities([wrongtoken], CategoryBadge),
                          [])
+
+
+class TestProposalPrefetch(TestController):
+
+    def test_prefetch_loads_tallies_and_decisions(self):
+        from pylons import tmpl_context as c
+        from adhocracy import model
+        from adhocracy.lib.democracy import Decision
+        from adhocracy.lib.pager import NamedPager
+        from adhocracy.lib.tiles.proposal_tiles import prefetch
+        from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
+        c.user = tt_make_user()
+        proposals = [tt_make_proposal(creator=c.user) for i in range(3)]
+        for proposal in proposals:
+            proposal.rate_poll = model.Poll.create(proposal, c.user,
+                                                   model.Poll.RATE)
+        Decision(c.user, proposals[0].rate_poll).make(model.Vote.YES)
+        model.Tally.create_from_poll(proposals[0].rate_poll)
+        # a newer row with an older time isn't the latest tally
+        old = model.Tally(proposals[1].rate_poll, 5, 0, 0)
+        old.create_time = datetime(2000, 1, 1)
+        model.meta.Session.add(old)
+        model.meta.Session.flush()
+        model.meta.Session.expire_all()
+
+        pager = NamedPager('proposals', proposals, None, size=2,
+                           prefetch=prefetch)
+        pager.prefetch_items()
+        first, second = [p.rate_poll for p in pager.items]
+        self.assertEqual(first._tally.num_for, 1)
+        self.assertEqual(second._tally.num_for, 0)
+        self.assertEqual(second._tally, second.tallies[0])
+        self.assertEqual(proposals[2].rate_poll._tally, None)
+        self.assertEqual(Decision.cached(c.user, first).result,
+                         model.Vote.YES)
+        self.assertEqual(Decision.cached(c.user, second).votes, [])
@@ -2,6 +2,10 @@ from unittest import TestCase
 
 from mock import MagicMock, patch
 
+from adhocracy import model
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_make_user
+
 
 @patch('adhocracy.lib.cli.AdhocracyTimer.setup_timer', return_value=None)
 @patch('adhocracy.lib.cli.AdhocracyTimer.get_lock', return_value=True)
@@ -40,3 +44,39 @@ class TimerTestCase(TestCase):
         self.assertFalse(run_periodicals_mock.called)
         # but it setups up the timer anyway
         self.assertTrue(setup_timer.called)
+
+
+class UpdateEntitiesTestCase(TestController):
+
+    def setUp(self):
+        from adhocracy.lib.queue import LISTENERS, BATCH_LISTENERS
+        super(UpdateEntitiesTestCase, self).setUp()
+        self.listener = MagicMock()
+        self.patches = [patch.dict(LISTENERS, clear=True),
+                        patch.dict(BATCH_LISTENERS, clear=True)]
+        for p in self.patches:
+            p.start()
+        LISTENERS[(model.User, model.UPDATE)].append(self.listener)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        super(UpdateEntitiesTestCase, self).tearDown()
+
+    def test_duplicates_are_coalesced(self):
+        from adhocracy.lib.queue import update_entities
+        user = tt_make_user()
+        update_entities([(user, model.UPDATE), (user, model.UPDATE),
+                         (user, model.INSERT)])
+        self.listener.assert_called_once_with(user)
+
+    def test_batch_listener_gets_all_entities(self):
+        from adhocracy.lib.queue import BATCH_LISTENERS, update_entities
+        batch_listener = MagicMock()
+        BATCH_LISTENERS[self.listener] = batch_listener
+        first = tt_make_user()
+        second = tt_make_user()
+        update_entities([(first, model.UPDATE), (second, model.UPDATE),
+                         (first, model.UPDATE)])
+        batch_listener.assert_called_once_with([first, second])
+        self.assertFalse(self.listener.called)
@@ -1,4 +1,11 @@
 
+import json
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
 from adhocracy.tests import TestController
 import adhocracy.lib.requestlog
 
@@ -25,3 +32,45 @@ class RequestLogTest(TestController):
                          u'2001:6f8:1377::')
         self.assertEqual(af(u'2001::1377:2a11:0:fe:1.2.3.4'), u'2001:0:1377::')
         self.assertEqual(af(u'::ffff:12.234.122.254'), u'::ffff:cea:7a00')
+
+    def _logger(self, **kwargs):
+        config = {'adhocracy.requestlog.flush_interval': '3600'}
+        config.update(kwargs)
+        return adhocracy.lib.requestlog.RequestLogger(None, config)
+
+    def _log(self, logger, url):
+        logger.log_request({'PATH_INFO': url, 'QUERY_STRING': 'a=b',
+                            'REMOTE_ADDR': '127.0.0.1',
+                            'HTTP_USER_AGENT': 'test'})
+
+    @patch('adhocracy.model.meta.engine')
+    def test_buffer_writes_in_bulk(self, engine):
+        logger = self._logger(**{'adhocracy.requestlog.buffer_size': '2'})
+        for url in ['/a', '/b', '/c']:
+            self._log(logger, url)
+        self.assertFalse(engine.execute.called)
+        self.assertEqual(logger.buffer.dropped, 1)
+
+        logger.buffer.flush()
+        entries = engine.execute.call_args[0][1]
+        self.assertEqual([e['request_url'] for e in entries],
+                         [u'/a?a=b', u'/b?a=b'])
+        self.assertEqual(entries[0]['user_agent'], u'test')
+        self.assertEqual(entries[0]['ip_address'], None)
+
+        logger.buffer.flush()
+        self.assertEqual(engine.execute.call_count, 1)
+
+    def test_buffer_writes_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'requestlog.jsonl')
+            logger = self._logger(**{'adhocracy.requestlog.file': path})
+            self._log(logger, '/a')
+            logger.buffer.flush()
+            with open(path) as f:
+                entries = [json.loads(line) for line in f]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]['request_url'], u'/a?a=b')
+        finally:
+            shutil.rmtree(tmpdir)
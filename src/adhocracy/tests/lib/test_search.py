@@ -1,9 +1,17 @@
+import os
+import tempfile
 from unittest import TestCase
 from StringIO import StringIO
 
+from mock import MagicMock, patch
+
 from sunburnt.schema import SolrSchema
 from sunburnt.search import SolrSearch
 
+from adhocracy import model
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_get_instance, tt_make_user
+
 
 # borrowed from sunburnt.test_search
 schema_string = \
@@ -63,3 +71,161 @@ class TestSolrSearch(TestCase):
         self.assertEqual(
             query.params(),
             [('q', '*:*')])
+
+
+index_schema_string = \
+    """<schema name="index" version="1.1">
+      <types>
+        <fieldType name="string" class="solr.StrField"/>
+      </types>
+      <fields>
+        <field name="id" type="string"/>
+        <field name="title" type="string"/>
+      </fields>
+      <uniqueKey>id</uniqueKey>
+    </schema>
+    """
+
+
+class TestIndexWriter(TestCase):
+
+    def setUp(self):
+        self.patch = patch('adhocracy.lib.search.index.'
+                           'get_sunburnt_connection')
+        get_connection = self.patch.start()
+        self.connection = get_connection.return_value = MagicMock()
+        self.connection.schema = SolrSchema(StringIO(index_schema_string))
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def _writer(self, **kwargs):
+        from adhocracy.lib.search.index import IndexWriter
+        return IndexWriter(**kwargs)
+
+    def _messages(self):
+        return [call[0][0] for call in
+                self.connection.conn.update.call_args_list]
+
+    def test_buffers_until_flush(self):
+        writer = self._writer()
+        writer.add({'id': 'a'})
+        writer.add({'id': 'b'})
+        writer.delete('c')
+        self.assertFalse(self.connection.conn.update.called)
+        writer.flush()
+        self.assertEqual(len(writer), 0)
+        add, delete = self._messages()
+        self.assertTrue(add.startswith('<add commitWithin="1000">'))
+        self.assertTrue(delete.startswith('<delete commitWithin="1000">'))
+        self.assertFalse(self.connection.commit.called)
+
+    def test_flushes_on_batch_size(self):
+        writer = self._writer(batch_size=2)
+        writer.add({'id': 'a'})
+        self.assertFalse(self.connection.conn.update.called)
+        writer.add({'id': 'b'})
+        self.assertEqual(self.connection.conn.update.call_count, 1)
+        self.assertEqual(len(writer), 0)
+
+    def test_latest_change_wins(self):
+        writer = self._writer()
+        writer.add({'id': 'a', 'title': 'old'})
+        writer.add({'id': 'a', 'title': 'new'})
+        writer.add({'id': 'b'})
+        writer.delete('b')
+        writer.flush()
+        add, delete = self._messages()
+        self.assertTrue('new' in add)
+        self.assertFalse('old' in add)
+        self.assertFalse('b' in add)
+        self.assertTrue('<id>b</id>' in delete)
+
+    def test_hard_commit_without_commit_within(self):
+        writer = self._writer(commit_within=0)
+        writer.delete('a')
+        writer.flush()
+        self.assertEqual(self._messages(), ['<delete><id>a</id></delete>'])
+        self.assertTrue(self.connection.commit.called)
+
+    @patch('adhocracy.lib.search.index.time')
+    def test_failed_batches_are_retried(self, time):
+        time.time.return_value = 100
+        self.connection.conn.update.side_effect = Exception('unavailable')
+        writer = self._writer(batch_size=2, batch_seconds=5)
+        writer.add({'id': 'a'})
+        writer.flush()
+        self.assertEqual(len(writer), 1)
+        # no retry before batch_seconds have passed
+        writer.add({'id': 'b'})
+        self.assertEqual(self.connection.conn.update.call_count, 1)
+        self.assertEqual(len(writer), 2)
+
+        time.time.return_value = 106
+        self.connection.conn.update.side_effect = None
+        writer.add({'id': 'c'})
+        self.assertEqual(len(writer), 0)
+        self.assertEqual(self._messages()[-1].count('<doc>'), 3)
+
+    def test_failed_batches_are_dropped_beyond_max_batches(self):
+        self.connection.conn.update.side_effect = Exception('unavailable')
+        writer = self._writer(batch_size=1, max_batches=2)
+        for id_ in 'abc':
+            writer.add({'id': id_})
+            writer.flush()
+        self.assertEqual(len(writer), 0)
+
+
+class TestRebuild(TestController):
+
+    def test_partition_ids(self):
+        from adhocracy.lib.search import partition_ids
+        users = [tt_make_user() for i in range(3)]
+        ids = sorted(model.meta.Session.query(model.User.id))
+        partitions = partition_ids(model.User, None, 2)
+        self.assertEqual(partitions[0], (ids[0][0], ids[1][0]))
+        self.assertEqual(partitions[-1][1], max(u.id for u in users))
+        self.assertEqual(len(partitions), (len(ids) + 1) // 2)
+
+    @patch('adhocracy.lib.search.index.make_connection')
+    def test_index_partition_with_eager_loads(self, make_connection):
+        from adhocracy.lib.search import index_partition
+        from adhocracy.tests.testtools import tt_make_proposal
+        proposal = tt_make_proposal()
+        proposal.rate_poll = model.Poll.create(proposal, proposal.creator,
+                                               model.Poll.RATE)
+        comment = model.Comment.create(u'text', proposal.creator, proposal)
+        model.meta.Session.flush()
+        for cls, entity in [(model.Proposal, proposal),
+                            (model.Comment, comment)]:
+            partition = (cls.__name__, entity.id, entity.id, None)
+            self.assertEqual(index_partition(partition), (partition, 1))
+
+    @patch('adhocracy.lib.search.index.make_connection')
+    def test_rebuild_resumes_from_checkpoint(self, make_connection):
+        from adhocracy.lib.search import rebuild, read_checkpoint
+        connection = make_connection.return_value = MagicMock()
+        tt_make_user()
+        fd, checkpoint = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            rebuild([model.User], partition_size=1, checkpoint=checkpoint)
+            done = read_checkpoint(checkpoint)
+            self.assertEqual(len(done),
+                             model.meta.Session.query(model.User).count())
+            self.assertTrue(connection.conn.update.called)
+
+            connection.reset_mock()
+            rebuild([model.User], partition_size=1, checkpoint=checkpoint)
+            self.assertFalse(connection.conn.update.called)
+            self.assertEqual(read_checkpoint(checkpoint), done)
+
+            # a different selection or new entities change the plan
+            self.assertRaises(ValueError, rebuild, [model.User],
+                              instances=[tt_get_instance()],
+                              partition_size=1, checkpoint=checkpoint)
+            tt_make_user()
+            self.assertRaises(ValueError, rebuild, [model.User],
+                              partition_size=1, checkpoint=checkpoint)
+        finally:
+            os.remove(checkpoint)
@@ -1,5 +1,11 @@
+import json
+import sys
+
+from mock import patch
+
+from adhocracy import model
 from adhocracy.tests import TestController
-from adhocracy.tests.testtools import tt_make_user
+from adhocracy.tests.testtools import tt_make_proposal, tt_make_user
 
 
 SANITIZE_TEST_STRING = """
@@ -70,3 +76,95 @@ class TestText(TestController):
         self.assertTrue('<embed' not in result)
         self.assertTrue('javascript' not in result)
         self.assertTrue('<iframe' in result)
+
+
+class TestRenderStore(TestController):
+
+    def test_renderings_are_stored(self):
+        from adhocracy import model
+        from adhocracy.lib.text.render import (render_key, render_options,
+                                               render_many)
+        text = u'A *stored* rendering'
+        key = render_key(text, *render_options())
+        # without a queue, requests don't store renderings
+        render_many([text])
+        self.assertEqual(model.RenderedText.find_all([key]), {})
+
+        module = sys.modules['adhocracy.lib.text.render']
+
+        def store(data):
+            # what the background job stores
+            model.RenderedText.store(json.loads(data))
+
+        with patch.object(module, '_store_in_background', return_value=True), \
+                patch.object(module.store_rendered, 'enqueue',
+                             side_effect=store):
+            self.assertEqual(render_many([text, None, text]),
+                             [u'<p>A <em>stored</em> rendering</p>', u'',
+                              u'<p>A <em>stored</em> rendering</p>'])
+        self.assertEqual(model.RenderedText.find_all([key]).keys(), [key])
+
+        with patch.object(module, 'render_markdown') as markdown:
+            render_many([text])
+        self.assertFalse(markdown.called)
+
+    def test_store_skips_stored_keys(self):
+        model.RenderedText.create(u'a' * 40, u'<p>a</p>')
+        model.RenderedText.store({u'a' * 40: u'<p>other</p>',
+                                  u'b' * 40: u'<p>b</p>'})
+        model.meta.Session.flush()
+        self.assertEqual(model.RenderedText.find_all([u'a' * 40, u'b' * 40]),
+                         {u'a' * 40: u'<p>a</p>', u'b' * 40: u'<p>b</p>'})
+
+    def test_store_job_retries_after_concurrent_store(self):
+        from sqlalchemy.exc import IntegrityError
+        from adhocracy.lib.text.render import store_rendered
+        calls = []
+
+        def store(rendered):
+            calls.append(rendered)
+            if len(calls) == 1:
+                # another job stored the rendering first
+                raise IntegrityError('INSERT', {}, Exception())
+
+        with patch('adhocracy.model.RenderedText.store', side_effect=store), \
+                patch.object(model.meta, 'Session') as session:
+            store_rendered.func('{"key": "<p>html</p>"}')
+        self.assertEqual(calls, [{u'key': u'<p>html</p>'}] * 2)
+        self.assertTrue(session.rollback.called)
+
+    def test_options_are_part_of_the_key(self):
+        from adhocracy.lib.text.render import render_key
+        self.assertNotEqual(render_key(u'text', 'escape', False),
+                            render_key(u'text', 'remove', False))
+        self.assertNotEqual(render_key(u'text', False, True),
+                            render_key(u'text', False, False))
+
+    def test_references_are_resolved_together(self):
+        from adhocracy.lib.text.render import render_many
+        tt_make_user('pudo')
+        tt_make_user('other')
+        with patch('adhocracy.model.User.find_all',
+                   wraps=model.User.find_all) as find_all:
+            results = render_many([u'@pudo', u'@other and @pudo',
+                                   u'[[unknown page]]'])
+        self.assertEqual(find_all.call_count, 1)
+        self.assertTrue(u'/user/pudo"' in results[0])
+        self.assertTrue(u'/user/other"' in results[1])
+        self.assertEqual(results[2], u'<p>unknown page</p>')
+
+    def test_new_texts_are_prerendered(self):
+        from adhocracy.lib.queue import LISTENERS
+        from adhocracy.lib.text.render import (prerender, prerender_many,
+                                               render_key, render_options)
+        self.assertTrue(prerender in LISTENERS[(model.Text, model.INSERT)])
+        self.assertTrue(prerender in LISTENERS[(model.Revision,
+                                                model.INSERT)])
+        proposal = tt_make_proposal(with_description=True)
+        text = proposal.description.head
+        module = sys.modules['adhocracy.lib.text.render']
+        with patch.object(module, '_store_in_background', return_value=True), \
+                patch.object(module.store_rendered, 'enqueue') as enqueue:
+            prerender_many([text])
+        key = render_key(text.text, *render_options())
+        self.assertEqual(json.loads(enqueue.call_args[0][0]).keys(), [key])
@@ -0,0 +1,43 @@
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import (tt_get_instance, tt_make_proposal,
+                                       tt_make_str, tt_make_user)
+
+
+class TestCategoryTree(TestController):
+
+    def _make_page(self, creator):
+        from adhocracy import model
+        return model.Page.create(tt_get_instance(), title=tt_make_str(),
+                                 text=tt_make_str(), creator=creator)
+
+    def setUp(self):
+        super(TestCategoryTree, self).setUp()
+        creator = tt_make_user()
+        self.top = self._make_page(creator)
+        self.middle = self._make_page(creator)
+        self.middle.parents.append(self.top)
+        self.proposal = tt_make_proposal(creator=creator, voting=True)
+        self.proposal.parents.append(self.middle)
+
+    def test_is_super(self):
+        self.assertTrue(self.top.is_super(self.middle))
+        self.assertTrue(self.top.is_super(self.proposal))
+        self.assertTrue(self.middle.is_super(self.proposal))
+        self.assertFalse(self.proposal.is_super(self.top))
+        self.assertFalse(self.top.is_super(self.top))
+        self.assertTrue(self.proposal.is_sub(self.top))
+
+    def test_tree_is_reloaded_on_changes(self):
+        other = self._make_page(tt_make_user())
+        self.assertFalse(other.is_super(self.proposal))
+        self.top.parents.append(other)
+        self.assertTrue(other.is_super(self.proposal))
+        self.top.parents.remove(other)
+        self.assertFalse(other.is_super(self.proposal))
+
+    def test_within_scope(self):
+        from adhocracy import model
+        polls = model.Poll.within_scope(self.top)
+        self.assertEqual(set(polls), set(self.proposal.polls))
+        self.assertEqual(set(model.Poll.within_scope(self.proposal)),
+                         set(self.proposal.polls))
@@ -0,0 +1,79 @@
+from unittest import TestCase
+
+from mock import patch
+
+from adhocracy.tests import TestController
+from adhocracy.tests.testtools import tt_get_instance, tt_make_user
+
+
+class TestDelta(TestCase):
+
+    def test_apply_delta_restores_text(self):
+        from adhocracy.model.delta import apply_delta, make_delta
+        base = u'first line\nsecond line\n\nthird line'
+        for text in [u'first line\nnew line\nsecond line\n\nthird line\n',
+                     u'second line', u'', base]:
+            self.assertEqual(apply_delta(base, make_delta(base, text)), text)
+
+
+@patch('adhocracy.model.delta.config.get_int', return_value=3)
+@patch('adhocracy.model.delta.config.get_bool', return_value=True)
+class TestDeltaStorage(TestController):
+
+    def _texts(self):
+        from adhocracy import model
+        page = model.Page.create(tt_get_instance(), u'Delta',
+                                 u'line\n' * 50, tt_make_user())
+        texts = [page.head]
+        for i in range(4):
+            texts.append(model.Text.create(
+                page, model.Text.HEAD, page.head.user, page.head.title,
+                texts[-1].text + u'line %s\n' % i, parent=texts[-1]))
+        model.meta.Session.flush()
+        return texts
+
+    def test_texts_are_stored_as_delta(self, get_bool, get_int):
+        from adhocracy import model
+        texts = self._texts()
+        expected = [t.text for t in texts]
+        model.meta.Session.expire_all()
+        stored = [(t.base_id, t._text is None) for t in texts]
+        self.assertEqual(stored, [(None, False), (texts[0].id, True),
+                                  (texts[0].id, True), (None, False),
+                                  (texts[3].id, False)])
+        self.assertEqual([t.text for t in texts], expected)
+        self.assertEqual(texts[0].page.head, texts[-1])
+
+    def test_comment_revisions_are_stored_as_delta(self, get_bool, get_int):
+        from adhocracy import model
+        user = tt_make_user()
+        page = model.Page.create(tt_get_instance(), u'Comments', u'text',
+                                 user)
+        comment = model.Comment.create(u'comment\n' * 20, user, page)
+        first = comment.latest
+        second = comment.create_revision(u'comment\n' * 21, user)
+        third = comment.create_revision(u'comment\n' * 22, user)
+        model.meta.Session.expire_all()
+        self.assertEqual(second.base_id, first.id)
+        self.assertEqual(second._text, None)
+        self.assertEqual(second.text, u'comment\n' * 21)
+        self.assertEqual(third.text, u'comment\n' * 22)
+
+    def test_purged_snapshot_keeps_dependents_readable(self, get_bool,
+                                                       get_int):
+        from adhocracy import model
+        user = tt_make_user()
+        page = model.Page.create(tt_get_instance(), u'Purge', u'text', user)
+        comment = model.Comment.create(u'comment\n' * 20, user, page)
+        first = comment.latest
+        second = comment.create_revision(u'comment\n' * 21, user)
+        comment.create_revision(u'comment\n' * 22, user)
+        model.meta.Session.flush()
+        self.assertEqual(second.base_id, first.id)
+
+        first.purge()
+        model.meta.Session.flush()
+        model.meta.Session.expunge_all()
+        second = model.Revision.find(second.id)
+        self.assertEqual(second.base_id, None)
+        self.assertEqual(second.text, u'comment\n' * 21)